@@ -0,0 +1,90 @@
+import torch
+import torch.nn.functional as F
+
+from core.preprocess import IMAGENET_MEAN, IMAGENET_STD
+
+
+class BatchAugment:
+    """
+    RobustDataset's training policy (RandomCrop, horizontal flip, RandomRotation,
+    ColorJitter brightness/contrast, normalize) on a whole collated batch.
+
+    Input: uint8 (or [0, 1] float) (B, 3, H, W), e.g. RobustDataset(raw=True) batches,
+    on any device. Every sample draws its own parameters. Crop, flip and rotation are
+    one affine grid_sample for the whole batch (nearest, zero fill outside the crop,
+    as torchvision does on the cropped image); jitter runs in a random order per sample.
+    """
+    def __init__(self, crop: int = 224, flip_p: float = 0.5, degrees: float = 15,
+                 brightness: float = 0.2, contrast: float = 0.2, mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        self.crop = crop
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.brightness = brightness
+        self.contrast = contrast
+        self.mean = torch.tensor(mean).view(1, 3, 1, 1)
+        self.std = torch.tensor(std).view(1, 3, 1, 1)
+
+    @staticmethod
+    def _uniform(n, low, high, device):
+        return torch.empty(n, device=device).uniform_(low, high)
+
+    def geometry(self, images):
+        """Random crop -> flip -> rotation of (B, 3, H, W) float images in one resampling pass."""
+        b, _, h, w = images.shape
+        device = images.device
+        c = self.crop
+
+        # Output pixel centres in the crop's normalized coords
+        axis = (torch.arange(c, device=device, dtype=torch.float32) + 0.5) / c * 2 - 1
+        y, x = torch.meshgrid(axis, axis, indexing="ij")
+
+        # Inverse mapping: rotate back, un-flip, then place inside the full image
+        angle = torch.deg2rad(self._uniform(b, -self.degrees, self.degrees, device)).view(b, 1, 1)
+        cos, sin = angle.cos(), angle.sin()
+        u = cos * x + sin * y
+        v = -sin * x + cos * y
+        flip = torch.rand(b, device=device) < self.flip_p
+        u = torch.where(flip.view(b, 1, 1), -u, u)
+
+        top = torch.randint(0, h - c + 1, (b, 1, 1), device=device)
+        left = torch.randint(0, w - c + 1, (b, 1, 1), device=device)
+        grid = torch.stack([
+            (u + 1) * c / w + left * 2 / w - 1,
+            (v + 1) * c / h + top * 2 / h - 1,
+        ], dim=-1)
+        out = F.grid_sample(images, grid, mode="nearest", padding_mode="zeros", align_corners=False)
+
+        # Pixels rotated in from outside the crop are fill (0), not neighbouring image content
+        inside = ((u.abs() <= 1) & (v.abs() <= 1)).unsqueeze(1)
+        return out.mul_(inside)
+
+    def jitter(self, images):
+        b = images.shape[0]
+        device = images.device
+        brightness = self._uniform(b, 1 - self.brightness, 1 + self.brightness, device).view(b, 1, 1, 1)
+        contrast = self._uniform(b, 1 - self.contrast, 1 + self.contrast, device).view(b, 1, 1, 1)
+
+        def adjust_brightness(x, rows):
+            return x.mul_(brightness[rows]).clamp_(0, 1)
+
+        def adjust_contrast(x, rows):
+            gray = (0.299 * x[:, 0] + 0.587 * x[:, 1] + 0.114 * x[:, 2]).mean(dim=(1, 2)).view(-1, 1, 1, 1)
+            return x.sub_(gray).mul_(contrast[rows]).add_(gray).clamp_(0, 1)
+
+        # ColorJitter shuffles the op order per call: split the batch by order, each op runs once per row
+        brightness_first = torch.rand(b, device=device) < 0.5
+        out = torch.empty_like(images)
+        for first, rows in ((True, brightness_first), (False, ~brightness_first)):
+            x = images[rows]
+            if first:
+                out[rows] = adjust_contrast(adjust_brightness(x, rows), rows)
+            else:
+                out[rows] = adjust_brightness(adjust_contrast(x, rows), rows)
+        return out
+
+    @torch.no_grad()
+    def __call__(self, images):
+        if images.dtype == torch.uint8:
+            images = images.float().div_(255)
+        images = self.jitter(self.geometry(images))
+        return images.sub_(self.mean.to(images.device)).div_(self.std.to(images.device))
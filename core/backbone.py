@@ -1,6 +1,288 @@
 import torch
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
 from transformers import AutoImageProcessor, ResNetForImageClassification
-from peft import LoraConfig, get_peft_model, TaskType
+from peft import LoraConfig, get_peft_model
+from peft.tuners.lora import LoraLayer
+
+from core.constants import BASE
+
+
+def resnet_stages(model):
+    """
+    HF ResNet split into its sequential stages: stem, layer1 ... layer4.
+    Accepts the raw model or its PEFT wrapper.
+    """
+    if hasattr(model, "get_base_model"):
+        model = model.get_base_model()
+    stages = [("stem", model.resnet.embedder)]
+    stages += [(f"layer{i + 1}", stage) for i, stage in enumerate(model.resnet.encoder.stages)]
+    return stages
+
+
+def first_adapted_stage(model, adapter_names=None):
+    """Index of the first stage holding a LoRA layer (of adapter_names, or any adapter); len(stages) if none."""
+    stages = resnet_stages(model)
+    for i, (_, stage) in enumerate(stages):
+        for module in stage.modules():
+            if isinstance(module, LoraLayer) and (
+                adapter_names is None or any(name in module.lora_A for name in adapter_names)
+            ):
+                return i
+    return len(stages)
+
+
+def resnet_head(model, hidden_state):
+    """Pooler + classifier: last stage activations -> logits."""
+    if hasattr(model, "get_base_model"):
+        model = model.get_base_model()
+    return model.classifier(model.resnet.pooler(hidden_state))
+
+
+def _adapter_delta(layer, adapter_name, x, base_result):
+    """
+    Extra output of one expert on top of the frozen conv.
+    LoRA: scaling * B(A(x)). DoRA: the magnitude-rescaled residual PEFT adds.
+    """
+    lora_A = layer.lora_A[adapter_name]
+    lora_B = layer.lora_B[adapter_name]
+    dropout = layer.lora_dropout[adapter_name]
+    scaling = layer.scaling[adapter_name]
+
+    if not layer.use_dora.get(adapter_name, False):
+        return lora_B(lora_A(dropout(x))) * scaling
+
+    # DoRA re-runs the frozen conv when dropout is live (mirrors PEFT's variant)
+    if isinstance(dropout, torch.nn.Identity) or not dropout.training:
+        dora_base = base_result
+    else:
+        x = dropout(x)
+        dora_base = None
+    return layer.lora_magnitude_vector[adapter_name](
+        x,
+        lora_A=lora_A,
+        lora_B=lora_B,
+        scaling=scaling,
+        base_layer=layer.get_base_layer(),
+        base_result=dora_base,
+        adapter_name=adapter_name,
+    )
+
+
+@contextmanager
+def _lora_bypassed(peft_model):
+    """
+    The LoRA layers fall back to their frozen conv, like disable_adapter(),
+    but without its side effect of switching requires_grad off on every adapter.
+    """
+    layers = [m for m in peft_model.modules() if isinstance(m, LoraLayer)]
+    previous = [m._disable_adapters for m in layers]
+    for m in layers:
+        m._disable_adapters = True
+    try:
+        yield
+    finally:
+        for m, flag in zip(layers, previous):
+            m._disable_adapters = flag
+
+
+@contextmanager
+def routed_adapters(peft_model, adapter_names, weights, trainable: bool = False):
+    """
+    Per-sample adapter routing inside a single forward.
+
+    weights: [batch, len(adapter_names)] tensor. Row i says how much of each
+    expert's delta sample i receives (one-hot = hard routing, all zeros = base).
+    Only the rows with a non-zero weight are pushed through an expert's branch.
+    trainable=True keeps the adapters' gradients (multi-expert training).
+    """
+    # Resolve sub-batches once, not once per conv layer
+    routes = []
+    for col, name in enumerate(adapter_names):
+        idx = torch.nonzero(weights[:, col], as_tuple=False).flatten()
+        if idx.numel() > 0:
+            routes.append((name, idx, weights[idx, col].view(-1, 1, 1, 1)))
+
+    def hook(layer, args, output):
+        x = args[0]
+        result = output
+        for name, idx, w in routes:
+            if name not in layer.lora_A:
+                continue
+            delta = _adapter_delta(layer, name, x[idx], output[idx])
+            result = result.index_add(0, idx, delta * w.to(delta.dtype))
+        return result
+
+    handles = [
+        m.register_forward_hook(hook)
+        for m in peft_model.modules()
+        if isinstance(m, LoraLayer)
+    ]
+    try:
+        # Conv layers fall back to the frozen weights; the hooks add the experts
+        with _lora_bypassed(peft_model) if trainable else peft_model.disable_adapter():
+            yield
+    finally:
+        for h in handles:
+            h.remove()
+
+
+def _stackable(layer, names):
+    """Plain conv LoRA (no DoRA, no lora bias) whose branches can be fused by stacking ranks."""
+    return all(
+        isinstance(layer.lora_A[n], torch.nn.Conv2d)
+        and layer.lora_B[n].bias is None
+        and not layer.use_dora.get(n, False)
+        for n in names
+    )
+
+
+@contextmanager
+def blended_adapters(peft_model, adapter_names, weights):
+    """
+    Soft mixing inside a single forward: sample i gets sum_j weights[i, j] * delta_j.
+
+    weights: [batch, len(adapter_names)], dense (every expert sees every row).
+    Plain LoRA experts are fused per layer by stacking their ranks: one
+    (sum of ranks) A conv, a per-sample scale, one B conv whose contraction does
+    the weighted sum. Cost ~ one expert branch of rank E*r, not E branches.
+    DoRA experts are blended one by one (their magnitude rescale is not linear).
+    Dropout on the LoRA branch is skipped (inference only).
+    """
+    fused = {}
+    for layer in peft_model.modules():
+        if not isinstance(layer, LoraLayer):
+            continue
+        present = [(j, n) for j, n in enumerate(adapter_names) if n in layer.lora_A]
+        if not present:
+            continue
+        stack = [(j, n) for j, n in present if _stackable(layer, [n])]
+        rest = [(j, n) for j, n in present if (j, n) not in stack]
+        entry = {"rest": rest, "A": None}
+        if stack:
+            entry["A"] = torch.cat([layer.lora_A[n].weight for _, n in stack])
+            entry["B"] = torch.cat([layer.lora_B[n].weight for _, n in stack], dim=1)
+            # Per-sample, per-rank-channel scale: weight of the expert x its LoRA scaling
+            entry["scale"] = torch.cat([
+                (weights[:, j] * layer.scaling[n]).unsqueeze(1).expand(-1, layer.lora_A[n].out_channels)
+                for j, n in stack
+            ], dim=1)[:, :, None, None]
+            entry["conv"] = layer.lora_A[stack[0][1]]
+        fused[layer] = entry
+
+    def hook(layer, args, output):
+        x = args[0]
+        entry = fused[layer]
+        result = output
+        if entry["A"] is not None:
+            conv = entry["conv"]
+            low = torch.nn.functional.conv2d(
+                x, entry["A"].to(x.dtype), None, conv.stride, conv.padding, conv.dilation, conv.groups
+            )
+            delta = torch.nn.functional.conv2d(low * entry["scale"].to(low.dtype), entry["B"].to(low.dtype))
+            result = result + delta
+        for j, name in entry["rest"]:
+            delta = _adapter_delta(layer, name, x, output)
+            result = result + delta * weights[:, j].view(-1, *[1] * (delta.dim() - 1)).to(delta.dtype)
+        return result
+
+    handles = [layer.register_forward_hook(hook) for layer in fused]
+    try:
+        with peft_model.disable_adapter():
+            yield
+    finally:
+        for h in handles:
+            h.remove()
+
+
+class MergedExpertCache:
+    """
+    Experts pre-merged into the conv weights (W + scaled BA, DoRA magnitude folded in).
+    Activating an expert is a weight swap; the cache is LRU-evicted under a memory budget.
+    """
+    def __init__(self, peft_model, budget_mb: float = 512):
+        self.peft_model = peft_model
+        self.budget_bytes = int(budget_mb * 1024 ** 2)
+        self.layers = {name: m for name, m in peft_model.named_modules() if isinstance(m, LoraLayer)}
+        self.base_weights = {name: m.get_base_layer().weight for name, m in self.layers.items()}
+        self.entries = OrderedDict()  # adapter -> {layer_name: merged Parameter}, oldest first
+        self.active = None
+
+    @property
+    def memory_mb(self):
+        return sum(self._nbytes(e) for e in self.entries.values()) / 1024 ** 2
+
+    @staticmethod
+    def _nbytes(entry):
+        return sum(p.numel() * p.element_size() for p in entry.values())
+
+    @torch.no_grad()
+    def _merge(self, adapter_name):
+        entry = {}
+        for name, layer in self.layers.items():
+            if adapter_name not in layer.lora_A:
+                continue
+            weight = self.base_weights[name]
+            merged = weight + layer.get_delta_weight(adapter_name)
+            if layer.use_dora.get(adapter_name, False):
+                # DoRA: rescale every output filter to its learned magnitude
+                norm = merged.norm(p=2, dim=tuple(range(1, merged.dim())), keepdim=True)
+                magnitude = layer.lora_magnitude_vector[adapter_name].weight.view_as(norm)
+                merged = (magnitude / norm) * merged
+            entry[name] = torch.nn.Parameter(merged.to(weight.dtype), requires_grad=False)
+        return entry
+
+    def get(self, adapter_name):
+        """Merged weights for an expert, building (and evicting LRU entries) on a miss."""
+        if adapter_name in self.entries:
+            self.entries.move_to_end(adapter_name)
+            return self.entries[adapter_name]
+
+        entry = self._merge(adapter_name)
+        if self._nbytes(entry) > self.budget_bytes:
+            print(f"⚠️ [MergeCache] '{adapter_name}' exceeds the {self.budget_bytes / 1024 ** 2:.0f} MB budget, not caching.")
+            return entry
+
+        self.entries[adapter_name] = entry
+        while sum(self._nbytes(e) for e in self.entries.values()) > self.budget_bytes:
+            evicted, _ = self.entries.popitem(last=False)
+            print(f"♻️ [MergeCache] Evicted '{evicted}'")
+        return entry
+
+    def _swap(self, weights):
+        for name, layer in self.layers.items():
+            layer.get_base_layer().weight = weights.get(name, self.base_weights[name])
+
+    def activate(self, adapter_name):
+        if adapter_name == self.active:
+            return
+        self._swap(self.get(adapter_name))
+        self.active = adapter_name
+
+    def restore_base(self):
+        self._swap(self.base_weights)
+        self.active = None
+
+    def invalidate(self, adapter_name=None):
+        """Drop stale merges after an adapter's weights change (None = everything)."""
+        for name in ([adapter_name] if adapter_name else list(self.entries)):
+            self.entries.pop(name, None)
+        if self.active is not None and (adapter_name is None or adapter_name == self.active):
+            current = self.active
+            self.restore_base()
+            self.activate(current)
+
+    @contextmanager
+    def frozen_weights(self):
+        """Temporarily put the frozen weights back (e.g. for routed/mixed forwards)."""
+        current = self.active
+        self.restore_base()
+        try:
+            yield
+        finally:
+            if current is not None:
+                self.activate(current)
+
 
 class AdaptiveVisionModel:
     """
@@ -19,6 +301,7 @@ class AdaptiveVisionModel:
             else:
                 self.device = "cpu"
                 print("⚠️ HARDWARE DETECTED: CPU Only (Slow)")
+                print("   Tip: scripts/export_cpu_experts.py builds merged channels_last / int8 CPU experts.")
         else:
             self.device = device
             
@@ -27,9 +310,8 @@ class AdaptiveVisionModel:
         self.processor = AutoImageProcessor.from_pretrained(model_id)
         self.base_model = ResNetForImageClassification.from_pretrained(model_id)
         
-        # 3. Define LoRA Config
+        # 3. Define LoRA Config (no task_type: peft has no image-classification TaskType)
         self.peft_config = LoraConfig(
-            task_type=TaskType.IMAGE_CLASSIFICATION, 
             inference_mode=True, 
             r=16,
             lora_alpha=32, 
@@ -40,14 +322,87 @@ class AdaptiveVisionModel:
         # 4. Inject LoRA Wrappers
         self.model = get_peft_model(self.base_model, self.peft_config)
         self.model.to(self.device)
+        self.merged_cache = None
         print("Model Loaded & Ready.")
 
+    @staticmethod
+    def _check_name(adapter_name: str):
+        if adapter_name == BASE:
+            raise ValueError(f"'{BASE}' is reserved for the base model; give the adapter another name")
+
     def add_adapter(self, adapter_name: str):
+        self._check_name(adapter_name)
         self.model.add_adapter(adapter_name, self.peft_config)
     
+    def load_adapter(self, adapter_path: str, adapter_name: str):
+        """Loads a trained expert (e.g. checkpoints/night/adapter_final) next to the others."""
+        self._check_name(adapter_name)
+        self.model.load_adapter(adapter_path, adapter_name=adapter_name)
+        if self.merged_cache is not None:
+            self.merged_cache.invalidate(adapter_name)
+
     def switch_adapter(self, adapter_name: str):
         self.model.set_adapter(adapter_name)
+        if self.merged_cache is not None:
+            self.merged_cache.activate(adapter_name)
+
+    def enable_merged_mode(self, budget_mb: float = 512):
+        """
+        Run experts from pre-merged weights instead of the live LoRA/DoRA branch.
+        budget_mb caps the merged-weight cache (one ResNet-50 expert is ~90 MB in fp32).
+        """
+        self.merged_cache = MergedExpertCache(self.model, budget_mb)
+        self.model.base_model.disable_adapter_layers()
+        self.merged_cache.activate(self.model.active_adapter)
+        print(f"🧩 [Backbone] Merged mode ON (budget: {budget_mb} MB)")
+
+    def disable_merged_mode(self):
+        if self.merged_cache is None:
+            return
+        self.merged_cache.restore_base()
+        self.merged_cache = None
+        self.model.base_model.enable_adapter_layers()
 
     def predict(self, image_tensor: torch.Tensor):
         with torch.no_grad():
             return self.model(image_tensor.to(self.device))
+
+    def predict_mixed(self, image_tensor: torch.Tensor, adapter_names: list):
+        """
+        One forward for a batch whose samples need different experts.
+        adapter_names[i] is the expert for sample i (BASE = no adapter).
+        """
+        if len(adapter_names) != image_tensor.shape[0]:
+            raise ValueError(f"Got {len(adapter_names)} adapter names for a batch of {image_tensor.shape[0]}")
+
+        experts = sorted(set(adapter_names) - {BASE})
+        unknown = [name for name in experts if name not in self.model.peft_config]
+        if unknown:
+            raise ValueError(f"Unknown adapter(s): {unknown}. Loaded: {list(self.model.peft_config)}")
+
+        # One-hot routing matrix: row = sample, column = expert
+        weights = torch.zeros(len(adapter_names), len(experts))
+        for i, name in enumerate(adapter_names):
+            if name != BASE:
+                weights[i, experts.index(name)] = 1.0
+
+        # Routing adds deltas on top of the frozen weights, so un-swap any merged expert
+        frozen = self.merged_cache.frozen_weights() if self.merged_cache is not None else nullcontext()
+        with torch.no_grad(), frozen, routed_adapters(self.model, experts, weights.to(self.device)):
+            return self.model(image_tensor.to(self.device))
+
+    def predict_soft(self, image_tensor: torch.Tensor, weights: torch.Tensor, adapter_names: list):
+        """
+        Soft mixing: sample i gets sum_j weights[i, j] * delta of adapter_names[j],
+        all in one forward (e.g. dusk = 0.6 sunny + 0.4 night).
+        Rows summing to less than 1 keep the rest as plain base model.
+        """
+        if weights.shape != (image_tensor.shape[0], len(adapter_names)):
+            raise ValueError(f"Expected weights of shape {(image_tensor.shape[0], len(adapter_names))}, got {tuple(weights.shape)}")
+        unknown = [name for name in adapter_names if name not in self.model.peft_config]
+        if unknown:
+            raise ValueError(f"Unknown adapter(s): {unknown}. Loaded: {list(self.model.peft_config)}")
+
+        frozen = self.merged_cache.frozen_weights() if self.merged_cache is not None else nullcontext()
+        with torch.no_grad(), frozen, blended_adapters(self.model, adapter_names, weights.to(self.device)):
+            return self.model(image_tensor.to(self.device))
@@ -0,0 +1,199 @@
+import errno
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+# BDD100K scene attribute -> class folder
+SCENE_MAPPING = {'city street': 'city', 'highway': 'highway', 'residential': 'residential'}
+DOMAINS = ['sunny', 'rain', 'night']
+LAYOUTS = ("flat", "hybrid", "ninja")
+MODES = ("copy", "hardlink", "symlink", "reflink")
+FICLONE = 0x40049409  # Linux ioctl: share the source's extents (btrfs, XFS, ...)
+
+
+def get_domain(weather, timeofday):
+    if weather == 'rainy': return 'rain'
+    if timeofday == 'night': return 'night'
+    if weather == 'clear' and timeofday == 'daytime': return 'sunny'
+    return None
+
+
+def target(attrs):
+    """(domain, class folder) of an image's attributes, or None if it is not used."""
+    domain = get_domain(attrs.get('weather'), attrs.get('timeofday'))
+    target_class = SCENE_MAPPING.get(attrs.get('scene'))
+    if not domain or not target_class:
+        return None
+    return domain, target_class
+
+
+def iter_json_array(path, chunk_size=1 << 20):
+    """
+    Elements of a top-level JSON array, decoded one at a time from chunked reads:
+    the 100k-entry BDD label file is never fully in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf, pos, eof = f.read(chunk_size).lstrip(), 0, False
+        if not buf.startswith('['):
+            raise ValueError(f"{path}: expected a JSON array")
+        pos = 1
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos == len(buf):
+                if eof:
+                    raise ValueError(f"{path}: unterminated JSON array")
+                buf, pos = f.read(chunk_size), 0
+                eof = not buf
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Element cut by the chunk boundary: keep its start, read more
+                more = f.read(chunk_size)
+                if not more:
+                    raise
+                buf, pos = buf[pos:] + more, 0
+                continue
+            yield obj
+            pos = end
+
+
+def _image_lookup(available, name):
+    """Label names sometimes omit the .jpg extension."""
+    return available.get(name) or available.get(name + ".jpg")
+
+
+def iter_official(label_path, image_dir, recursive=False):
+    """
+    (attributes, source path) for the official label file.
+    flat: images in one folder (BDD 10k / 100k zips). hybrid (recursive): any image
+    under image_dir, e.g. DatasetNinja's pixels matched with the official attributes.
+    """
+    if recursive:
+        available = {f: os.path.join(d, f) for d, _, files in os.walk(image_dir) for f in files if f.endswith('.jpg')}
+    else:
+        available = {f: os.path.join(image_dir, f) for f in os.listdir(image_dir)}
+    print(f"   ✅ Found {len(available)} images available.")
+    for entry in iter_json_array(label_path):
+        src = _image_lookup(available, entry['name'])
+        if src:
+            yield entry.get('attributes') or {}, src
+
+
+def iter_ninja(source_root, pool, chunk=1024):
+    """(attributes, source path) from DatasetNinja split folders (one small JSON per image)."""
+    def read(ann_path):
+        try:
+            with open(ann_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data.get('attributes') or data
+
+    for split in ['train', 'val']:
+        ann_dir = os.path.join(source_root, split, 'ann')
+        img_dir = os.path.join(source_root, split, 'img')
+        if not os.path.exists(ann_dir):
+            continue
+        print(f"🚀 Processing {split} set from {ann_dir}...")
+        files = sorted(f for f in os.listdir(ann_dir) if f.endswith('.json'))
+        for start in range(0, len(files), chunk):
+            batch = files[start:start + chunk]
+            for ann_file, attrs in zip(batch, pool.map(read, [os.path.join(ann_dir, f) for f in batch])):
+                if not attrs:
+                    continue
+                src = os.path.join(img_dir, ann_file[:-len('.json')])
+                if not os.path.exists(src):
+                    if not os.path.exists(src + ".jpg"):
+                        continue
+                    src += ".jpg"
+                yield attrs, src
+
+
+def place(src, dst, mode="copy"):
+    """
+    Puts src at dst. hardlink / symlink / reflink only write metadata (reflink falls
+    back to a copy where the filesystem cannot share extents). Re-runs overwrite.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+    if mode == "copy":
+        shutil.copyfile(src, dst)
+    elif mode == "hardlink":
+        try:
+            os.link(src, dst)
+        except OSError as e:
+            if e.errno == errno.EXDEV:
+                raise OSError(e.errno, f"Cannot hardlink across filesystems ({src} -> {dst}): use --mode symlink / reflink / copy")
+            raise
+    elif mode == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    elif mode == "reflink":
+        import fcntl  # POSIX only, like reflinks themselves
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            try:
+                fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            except OSError:
+                shutil.copyfileobj(s, d, 1 << 20)
+    else:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+
+
+def sort_images(entries, output_dir, limit=2000, mode="copy", pool=None):
+    """
+    Streams (attributes, source path) into output_dir/<domain>/<class>/<file name>,
+    up to `limit` images per domain / class. Selection runs in stream order (as the
+    per-layout scripts did); file placement runs on the thread pool.
+    """
+    counts = {d: {s: 0 for s in SCENE_MAPPING.values()} for d in DOMAINS}
+    for d in DOMAINS:
+        for s in SCENE_MAPPING.values():
+            os.makedirs(os.path.join(output_dir, d, s), exist_ok=True)
+
+    futures, submitted = [], 0
+    for attrs, src in entries:
+        chosen = target(attrs)
+        if not chosen:
+            continue
+        domain, target_class = chosen
+        if counts[domain][target_class] >= limit:
+            continue
+        counts[domain][target_class] += 1
+        dst = os.path.join(output_dir, domain, target_class, os.path.basename(src))
+        futures.append(pool.submit(place, src, dst, mode))
+        submitted += 1
+        if submitted % 4096 == 0:
+            pending = []
+            for f in futures:
+                if f.done():
+                    f.result()  # Surfaces a failed placement early
+                else:
+                    pending.append(f)
+            futures = pending
+    for f in futures:
+        f.result()
+    return counts
+
+
+def prepare(layout, output_dir, labels=None, images=None, source=None, limit=2000, mode="copy", workers=16):
+    """One entry point for every source layout: flat / hybrid (official labels) or ninja."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {LAYOUTS}")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if layout == "ninja":
+            entries = iter_ninja(source, pool)
+        else:
+            print(f"📖 Streaming labels from {labels}, images from {images}...")
+            entries = iter_official(labels, images, recursive=(layout == "hybrid"))
+        counts = sort_images(entries, output_dir, limit, mode, pool)
+
+    print(f"\n✅ Sorting Complete ({mode}).")
+    for d in counts:
+        print(f"--- {d.upper()} ---")
+        print(counts[d])
+    return counts
@@ -0,0 +1,213 @@
+import json
+import os
+import torch
+from contextlib import nullcontext
+
+from core.constants import BASE
+from core.preprocess import TensorPreprocessor
+
+MANIFEST = "manifest.json"
+EXPERT_MANIFEST = "expert.json"
+
+
+class _Head(torch.nn.Module):
+    """Pooler + classifier as a standalone graph."""
+    def __init__(self, model):
+        super().__init__()
+        self.pooler = model.resnet.pooler
+        self.classifier = model.classifier
+
+    def forward(self, hidden_state):
+        return self.classifier(self.pooler(hidden_state))
+
+
+def _export(module, example, path, opset):
+    torch.onnx.export(
+        module, (example,), path,
+        input_names=["input"], output_names=["output"],
+        dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+        opset_version=opset, dynamo=False,
+    )
+
+
+@torch.no_grad()
+def export_bundle(base_model_id: str, experts: dict, output_dir: str, opset: int = 17, tolerance: float = 1e-3):
+    """
+    Base model + merged experts -> per-stage ONNX graphs.
+
+    base/        stem.onnx, layer1..4.onnx, head.onnx  (frozen backbone)
+    <expert>/    only the stages that expert adapts, with LoRA/DoRA merged in
+    manifest.json: stage order, labels, preprocessing and verification results.
+
+    Every expert is re-run through onnxruntime and compared with its PyTorch
+    PEFT model; a bundle drifting more than 'tolerance' raises.
+    """
+    from peft import PeftModel
+    from peft.tuners.lora import LoraLayer
+    from transformers import AutoImageProcessor, ResNetForImageClassification
+    from core.backbone import resnet_stages
+
+    if BASE in experts:
+        raise ValueError(f"'{BASE}' is reserved for the base model; give the expert another name")
+    processor = AutoImageProcessor.from_pretrained(base_model_id)
+    preprocessor = TensorPreprocessor.from_processor(processor)
+    crop = preprocessor.shortest_edge
+    example = torch.randn(2, 3, crop, crop)
+
+    # 1. Frozen backbone, one graph per stage
+    base = ResNetForImageClassification.from_pretrained(base_model_id).eval()
+    os.makedirs(os.path.join(output_dir, "base"), exist_ok=True)
+    hidden = example
+    for name, stage in resnet_stages(base):
+        _export(stage, hidden, os.path.join(output_dir, "base", f"{name}.onnx"), opset)
+        hidden = stage(hidden)
+    _export(_Head(base), hidden, os.path.join(output_dir, "base", "head.onnx"), opset)
+    base_logits = base(example).logits
+
+    manifest = {
+        "base_model": base_model_id,
+        "stages": [name for name, _ in resnet_stages(base)],
+        "id2label": {str(k): v for k, v in base.config.id2label.items()},
+        "preprocess": {
+            "shortest_edge": preprocessor.shortest_edge,
+            "crop_pct": preprocessor.crop_pct,
+            "mean": list(processor.image_mean),
+            "std": list(processor.image_std),
+        },
+        "experts": {},
+        "verification": {},
+    }
+    _write_json(os.path.join(output_dir, MANIFEST), manifest)
+    runtime = OnnxBundleBackend(output_dir)
+    manifest["verification"][BASE] = _max_diff(runtime.run_full(example, BASE), base_logits)
+
+    # 2. Experts: merge, then export only the stages the adapter touches
+    for name, adapter_path in experts.items():
+        print(f"📦 [Bundle] Exporting '{name}' from {adapter_path}")
+        peft_model = PeftModel.from_pretrained(
+            ResNetForImageClassification.from_pretrained(base_model_id), adapter_path
+        ).eval()
+        ref_logits = peft_model(example).logits
+        adapted = [
+            stage_name for stage_name, stage in resnet_stages(peft_model)
+            if any(isinstance(m, LoraLayer) for m in stage.modules())
+        ]
+        merged = peft_model.merge_and_unload()
+
+        expert_dir = os.path.join(output_dir, name)
+        os.makedirs(expert_dir, exist_ok=True)
+        hidden = example
+        for stage_name, stage in resnet_stages(merged):
+            if stage_name in adapted:
+                _export(stage, hidden, os.path.join(expert_dir, f"{stage_name}.onnx"), opset)
+            hidden = stage(hidden)
+        _write_json(os.path.join(expert_dir, EXPERT_MANIFEST), {
+            "adapter_path": adapter_path,
+            "stages": {s: f"{s}.onnx" for s in adapted},
+        })
+
+        # 3. Same gating/switching semantics: check the bundle against PyTorch
+        runtime.load_adapter(expert_dir, name)
+        diff = _max_diff(runtime.run_full(example, name), ref_logits)
+        manifest["experts"][name] = name
+        manifest["verification"][name] = diff
+        print(f"   ✅ Stages: {adapted} | Max |diff| vs PyTorch: {diff:.2e}")
+
+    _write_json(os.path.join(output_dir, MANIFEST), manifest)
+    failed = {k: v for k, v in manifest["verification"].items() if v > tolerance}
+    if failed:
+        raise RuntimeError(f"Bundle outputs drift from PyTorch beyond {tolerance}: {failed}")
+    return manifest
+
+
+def _max_diff(a, b):
+    return (a - b).abs().max().item()
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+class OnnxBundleBackend:
+    """
+    onnxruntime backend for DynamicEdgeSystem.
+    Loads an exported bundle: no transformers / peft import, no from_pretrained.
+    Same interface as core.inference.TorchBackend, so gating and switching are unchanged.
+    """
+    def __init__(self, bundle_dir: str, providers=None):
+        import onnxruntime as ort
+
+        self._ort = ort
+        self.providers = providers or ["CPUExecutionProvider"]
+        self.bundle_dir = bundle_dir
+        with open(os.path.join(bundle_dir, MANIFEST), "r") as f:
+            self.manifest = json.load(f)
+
+        self.device = "cpu"
+        self.preprocessor = TensorPreprocessor(**self.manifest["preprocess"])
+        self.stage_names = self.manifest["stages"]
+        self.id2label = {int(k): v for k, v in self.manifest["id2label"].items()}
+        self.base_stages = [self._session(os.path.join(bundle_dir, "base", f"{s}.onnx")) for s in self.stage_names]
+        self.base_head = self._session(os.path.join(bundle_dir, "base", "head.onnx"))
+
+        self.expert_stages = {}  # expert -> {stage index: session}
+        self.experts = []
+        self.cut = len(self.stage_names)
+        self.running_expert = None
+        self.adapter_switches = 0
+
+    def _session(self, path):
+        return self._ort.InferenceSession(path, providers=self.providers)
+
+    @staticmethod
+    def _run(session, hidden):
+        out = session.run(None, {"input": hidden.detach().cpu().contiguous().numpy()})[0]
+        return torch.from_numpy(out)
+
+    def load_adapter(self, path: str, name: str) -> bool:
+        spec_path = os.path.join(path, EXPERT_MANIFEST)
+        if not os.path.exists(spec_path):
+            print(f"⚠️ [Engine] No exported expert in {path} (Skipping '{name}')")
+            return False
+        with open(spec_path, "r") as f:
+            spec = json.load(f)
+
+        self.expert_stages[name] = {
+            self.stage_names.index(stage): self._session(os.path.join(path, file))
+            for stage, file in spec["stages"].items()
+        }
+        if name not in self.experts:
+            self.experts.append(name)
+        adapted = [i for stages in self.expert_stages.values() for i in stages]
+        self.cut = min(adapted, default=len(self.stage_names))
+        return True
+
+    def frozen(self):
+        return nullcontext()
+
+    def run_stage(self, i, hidden):
+        return self._run(self.base_stages[i], hidden)
+
+    def head(self, hidden):
+        return self._run(self.base_head, hidden)
+
+    def run_tail(self, hidden, start, experts):
+        """Stages [start:] + head, row r under experts[r] (rows of the same expert share one run)."""
+        logits = [None] * len(experts)
+        for expert in dict.fromkeys(experts):
+            rows = [r for r, e in enumerate(experts) if e == expert]
+            h = hidden[rows]
+            overrides = self.expert_stages.get(expert, {})
+            for i in range(start, len(self.stage_names)):
+                h = self._run(overrides.get(i, self.base_stages[i]), h)
+            out = self.head(h)
+            for k, r in enumerate(rows):
+                logits[r] = out[k]
+        return torch.stack(logits)
+
+    def run_full(self, pixel_values, expert):
+        if expert != BASE and expert != self.running_expert:
+            self.running_expert = expert
+            self.adapter_switches += 1
+        return self.run_tail(pixel_values, 0, [expert] * pixel_values.shape[0])
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import torch
+
+FORMAT_VERSION = 2
+CHECKPOINT_FILES = ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin")
+
+
+def content_hash(path: str) -> str:
+    """Key of an image: its bytes, not its name (renames / copies still hit)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def checkpoint_fingerprint(adapter_path: str) -> str:
+    """Hash of an adapter's config + weights; changes whenever the checkpoint is retrained."""
+    h = hashlib.blake2b(digest_size=16)
+    for name in CHECKPOINT_FILES:
+        path = os.path.join(adapter_path, name)
+        if os.path.exists(path):
+            h.update(name.encode())
+            h.update(content_hash(path).encode())
+    return h.hexdigest()
+
+
+class CacheNamespace:
+    """
+    Logits + pooled penultimate features of one (base model, adapter checkpoint).
+    Each is ONE append-only float32 file (rows x dim), memory-mapped for reads;
+    index.json holds the row count, the widths and image hash -> row.
+    """
+    ARRAYS = ("logits", "features")
+
+    def __init__(self, directory: str):
+        self.dir = directory
+        self.index_path = os.path.join(directory, "index.json")
+        self.index = {"count": 0, "dims": None, "rows": {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+        self._maps = None  # (row count they cover, {array: memmap})
+
+    def __len__(self):
+        return len(self.index["rows"])
+
+    def __contains__(self, key):
+        return key in self.index["rows"]
+
+    def _path(self, array):
+        return os.path.join(self.dir, f"{array}.f32")
+
+    def _arrays(self):
+        """Copy-on-write memmaps over the committed rows, reopened only after appends."""
+        count = self.index["count"]
+        if self._maps is None or self._maps[0] != count:
+            self._maps = (count, {
+                name: np.memmap(self._path(name), dtype=np.float32, mode="c", shape=(count, dim))
+                for name, dim in zip(self.ARRAYS, self.index["dims"])
+            })
+        return self._maps[1]
+
+    def get(self, keys):
+        """
+        (logits, features) tensors for keys that are all cached, in order.
+        Keys stored as one consecutive run (the usual case: the same list that was put)
+        come back as zero-copy views of the map; otherwise as one gather.
+        """
+        if not keys:
+            return torch.empty(0), torch.empty(0)
+        rows = np.fromiter((self.index["rows"][key] for key in keys), dtype=np.int64, count=len(keys))
+        first = int(rows[0])
+        if np.array_equal(rows, np.arange(first, first + len(rows))):
+            picked = [a[first:first + len(rows)] for a in self._arrays().values()]
+        else:
+            picked = [a[rows] for a in self._arrays().values()]
+        return tuple(torch.from_numpy(a) for a in picked)
+
+    def put(self, keys, logits, features):
+        data = [t.detach().float().cpu().numpy() for t in (logits, features)]
+        dims = [a.shape[1] for a in data]
+        if self.index["dims"] is None:
+            self.index["dims"] = dims
+        elif self.index["dims"] != dims:
+            raise ValueError(f"Row widths {dims} do not match this namespace's {self.index['dims']}")
+
+        count = self.index["count"]
+        for name, array in zip(self.ARRAYS, data):
+            path = self._path(name)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Past the committed rows: bytes left by an interrupted put are overwritten
+                f.seek(count * array.shape[1] * array.itemsize)
+                f.write(np.ascontiguousarray(array).tobytes())
+                f.truncate()
+        for row, key in enumerate(keys):
+            self.index["rows"][key] = count + row
+        self.index["count"] = count + len(keys)
+
+        # Index written last and atomically: a crash leaves uncommitted bytes, never a bad row
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of logits and pooled features.
+    Namespaces are keyed by base model id + adapter checkpoint fingerprint, so
+    retraining an adapter invalidates (and deletes) its stale entries automatically.
+    """
+    def __init__(self, root: str = "./cache/features"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def namespace(self, model_id: str, adapter_path: str = None) -> CacheNamespace:
+        meta = {
+            "version": FORMAT_VERSION,
+            "model": model_id,
+            "adapter_path": os.path.abspath(adapter_path) if adapter_path else None,
+            "fingerprint": checkpoint_fingerprint(adapter_path) if adapter_path else "base",
+        }
+        name = hashlib.blake2b(json.dumps(meta, sort_keys=True).encode(), digest_size=8).hexdigest()
+        directory = os.path.join(self.root, name)
+
+        # Same model + adapter path under an older checkpoint / format: stale
+        for other in os.listdir(self.root):
+            meta_path = os.path.join(self.root, other, "meta.json")
+            if other == name or not os.path.exists(meta_path):
+                continue
+            with open(meta_path, 'r') as f:
+                old = json.load(f)
+            if old["model"] == meta["model"] and old["adapter_path"] == meta["adapter_path"]:
+                print(f"♻️ [Cache] Checkpoint changed, dropping stale entries: {adapter_path or model_id}")
+                shutil.rmtree(os.path.join(self.root, other))
+
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "meta.json"), 'w') as f:
+            json.dump(meta, f, indent=2)
+        return CacheNamespace(directory)
+
+    @staticmethod
+    def read_through(namespaces: dict, paths, compute, batch_size: int = 32):
+        """
+        {name: (logits, features)} for every path across several namespaces.
+        Only images missing from at least one namespace are computed, in batches:
+        compute(paths) -> {name: (logits, features)} for all namespaces at once.
+        """
+        keys = [content_hash(p) for p in paths]
+        missing = sorted({
+            i for i, key in enumerate(keys) for ns in namespaces.values() if key not in ns
+        })
+        if missing:
+            print(f"💾 [Cache] {len(paths) - len(missing)}/{len(paths)} cached, computing {len(missing)}")
+        for start in range(0, len(missing), batch_size):
+            idx = missing[start:start + batch_size]
+            outputs = compute([paths[i] for i in idx])
+            for name, ns in namespaces.items():
+                # Joint passes also recompute namespaces that were already warm: store only new rows
+                rows = [j for j, i in enumerate(idx) if keys[i] not in ns]
+                if rows:
+                    logits, features = outputs[name]
+                    ns.put([keys[idx[j]] for j in rows], logits[rows], features[rows])
+        return {name: ns.get(keys) for name, ns in namespaces.items()}
+
+
+class CachedActivations(torch.utils.data.Dataset):
+    """
+    Frozen-prefix activations of a training set (cache_activations()), memory-mapped.
+    With flip views, each access picks the original or the mirrored image's activations
+    at random: an exact horizontal-flip augmentation, computed by the real network.
+    random_flip=False always serves the original image (validation).
+    """
+    def __init__(self, directory: str, random_flip: bool = True):
+        with open(os.path.join(directory, "meta.json"), 'r') as f:
+            self.meta = json.load(f)
+        self.dir = directory
+        self.views = self.meta["views"]
+        self.random_flip = random_flip
+        self.activations = np.load(os.path.join(directory, "activations.npy"), mmap_mode="c")
+        self.labels = np.load(os.path.join(directory, "labels.npy")).tolist()
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        view = int(torch.randint(self.views, (1,))) if self.views > 1 and self.random_flip else 0
+        return torch.from_numpy(self.activations[idx * self.views + view]).float(), self.labels[idx]
+
+
+@torch.no_grad()
+def cache_activations(model, cut: int, dataset, root: str = "./cache/activations", batch_size: int = 32,
+                      device: str = "cpu", fp16: bool = True, flip: bool = True) -> CachedActivations:
+    """
+    Runs the frozen stages [0:cut] (no adapter in them) once over a deterministic dataset
+    (RobustDataset(is_training=False): resize + normalize, no random transforms)
+    and stores the activations entering stage `cut` in one memory-mapped .npy.
+    The prefix runs in eval mode (BatchNorm on running stats) so an image's
+    activations do not depend on its batch. Keyed by model, cut, dtype, views and
+    the images' content: a rerun on the same data reuses the cache.
+    """
+    from core.backbone import resnet_stages
+
+    if len(dataset) == 0:
+        raise ValueError("No images to cache activations for")
+    stages = resnet_stages(model)[:cut]
+    views = 2 if flip else 1
+    meta = {
+        "version": FORMAT_VERSION,
+        "model": model.get_base_model().config._name_or_path,
+        "cut": resnet_stages(model)[cut][0],
+        "fp16": fp16,
+        "views": views,
+        "images": [content_hash(p) for p in dataset.image_paths],
+        "labels": list(dataset.labels),
+    }
+    name = hashlib.blake2b(json.dumps(meta, sort_keys=True).encode(), digest_size=8).hexdigest()
+    directory = os.path.join(root, name)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        print(f"💾 [Cache] Reusing {len(dataset)} cached activations at '{meta['cut']}': {directory}")
+        return CachedActivations(directory)
+
+    os.makedirs(directory, exist_ok=True)
+    loader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=False)
+    out, row = None, 0
+    was_training = model.training
+    model.eval()
+    try:
+        for images, _ in loader:
+            hidden = images.to(device)
+            if flip:
+                # Row-major: image i -> rows 2i (original), 2i + 1 (mirrored)
+                hidden = torch.stack([hidden, hidden.flip(-1)], dim=1).flatten(0, 1)
+            for _, stage in stages:
+                hidden = stage(hidden)
+            if out is None:
+                out = np.lib.format.open_memmap(
+                    os.path.join(directory, "activations.npy"), mode="w+",
+                    dtype=np.float16 if fp16 else np.float32, shape=(len(dataset) * views, *hidden.shape[1:]),
+                )
+            out[row:row + hidden.shape[0]] = hidden.cpu().numpy()
+            row += hidden.shape[0]
+    finally:
+        model.train(was_training)
+
+    out.flush()
+    del out
+    np.save(os.path.join(directory, "labels.npy"), np.asarray(dataset.labels, dtype=np.int64))
+    mb = os.path.getsize(os.path.join(directory, "activations.npy")) / 1024 ** 2
+    # Meta last: a crash mid-build never leaves a cache that looks complete
+    with open(os.path.join(directory, "meta.json"), 'w') as f:
+        json.dump(meta, f)
+    print(f"💾 [Cache] {len(dataset)} images x {views} view(s) at '{meta['cut']}' -> {mb:.0f} MB ({'fp16' if fp16 else 'fp32'})")
+    return CachedActivations(directory)
+
+
+def read_through_engine(system, cache, model_id, expert_paths, paths, batch_size: int = 32):
+    """
+    {BASE or expert name: (logits, features)} for a DynamicEdgeSystem (PyTorch backend),
+    read through the cache. Misses run base and all experts together, sharing the frozen prefix.
+    """
+    from core.constants import BASE
+    from core.preprocess import load_image
+
+    backend = system.backend
+    experts = system.experts
+    namespaces = {BASE: cache.namespace(model_id)}
+    namespaces.update({name: cache.namespace(model_id, expert_paths[name]) for name in experts})
+
+    @torch.no_grad()
+    def forward(batch_paths):
+        pixel_values = system.preprocessor([load_image(p) for p in batch_paths])
+        b = pixel_values.shape[0]
+        with backend.frozen():
+            shared = backend.run_stages(pixel_values, 0, backend.cut)
+            pooled = backend.pool(backend.run_stages(shared, backend.cut))
+            outputs = {BASE: (backend.classify(pooled), pooled)}
+            if experts:
+                batch = shared.repeat_interleave(len(experts), dim=0)
+                pooled = backend.pool(backend.run_stages(batch, backend.cut, None, experts * b))
+                logits = backend.classify(pooled)
+        # Rows are image-major: image i, expert e -> row i * len(experts) + e
+        for e, name in enumerate(experts):
+            outputs[name] = (logits[e::len(experts)], pooled[e::len(experts)])
+        return outputs
+
+    return cache.read_through(namespaces, paths, forward, batch_size)
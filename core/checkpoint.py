@@ -0,0 +1,114 @@
+import copy
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from peft import get_peft_model_state_dict, set_peft_model_state_dict
+from safetensors.torch import load_file, save_file
+
+ADAPTER_FILE = "adapter_model.safetensors"
+ADAPTER_WEIGHTS = (ADAPTER_FILE, "adapter_model.bin")
+STATE_FILE = "trainer_state.pt"
+LATEST = "latest.json"
+BEST = "best"
+
+
+def has_adapter_weights(path: str) -> bool:
+    """True for a PEFT adapter dir holding trained weights, not just adapter_config.json (an unfinished run)."""
+    return any(os.path.exists(os.path.join(path, w)) for w in ADAPTER_WEIGHTS)
+
+
+def adapter_snapshot(model):
+    """CPU copy of the trainable adapter weights only (PEFT's save_pretrained keys)."""
+    return {k: v.detach().to("cpu", copy=True).contiguous() for k, v in get_peft_model_state_dict(model).items()}
+
+
+def restore_adapter(model, adapter: dict):
+    """Inverse of adapter_snapshot()."""
+    set_peft_model_state_dict(model, adapter)
+
+
+class AsyncCheckpointer:
+    """
+    Adapter-only training checkpoints written by one background thread.
+    The caller only pays for copying the adapter + optimizer state (small);
+    serialization and disk I/O overlap the next epoch. Each checkpoint is a
+    regular PEFT adapter directory (adapter_config.json + adapter_model.safetensors)
+    plus trainer_state.pt (optimizer, epoch, early-stopping counters), written to
+    a temp dir and renamed, then published in latest.json.
+    """
+    def __init__(self, directory: str, keep: int = 2):
+        self.dir = directory
+        self.keep = keep
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.pending = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _submit(self, fn, *args):
+        if self.pending is not None:
+            self.pending.result()  # One write in flight; re-raises a failed write here
+        self.pending = self.executor.submit(fn, *args)
+
+    def save(self, model, optimizer, state: dict):
+        """state: JSON-able trainer counters; must hold 'epoch' (completed epochs)."""
+        adapter = adapter_snapshot(model)
+        optim_state = copy.deepcopy(optimizer.state_dict())
+        config = model.peft_config[model.active_adapter]
+        self._submit(self._write_epoch, adapter, optim_state, config, dict(state))
+
+    def save_best(self, adapter: dict, model):
+        self._submit(self._write_adapter, adapter, model.peft_config[model.active_adapter], BEST, None)
+
+    def _write_adapter(self, adapter, config, name, extra):
+        tmp = os.path.join(self.dir, name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        save_file(adapter, os.path.join(tmp, ADAPTER_FILE))
+        config.save_pretrained(tmp)
+        if extra is not None:
+            torch.save(extra, os.path.join(tmp, STATE_FILE))
+        final = os.path.join(self.dir, name)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(tmp, final)
+        return final
+
+    def _write_epoch(self, adapter, optim_state, config, state):
+        name = f"epoch_{state['epoch']:04d}"
+        self._write_adapter(adapter, config, name, {"optimizer": optim_state, **state})
+        tmp = os.path.join(self.dir, LATEST + ".tmp")
+        with open(tmp, 'w') as f:
+            json.dump({"checkpoint": name, **state}, f)
+        os.replace(tmp, os.path.join(self.dir, LATEST))
+        epochs = sorted(d for d in os.listdir(self.dir) if d.startswith("epoch_") and not d.endswith(".tmp"))
+        for old in epochs[:-self.keep]:
+            shutil.rmtree(os.path.join(self.dir, old), ignore_errors=True)
+
+    def close(self):
+        """Waits for the last write (and surfaces its error)."""
+        if self.pending is not None:
+            self.pending.result()
+        self.executor.shutdown()
+
+
+def load_checkpoint(directory: str, model, optimizer=None):
+    """
+    Restores the latest checkpoint in `directory` into model (+ optimizer).
+    Returns its trainer state, plus the best adapter weights under 'best_adapter'
+    when saved; None if there is no checkpoint yet.
+    """
+    latest = os.path.join(directory, LATEST)
+    if not os.path.exists(latest):
+        return None
+    with open(latest, 'r') as f:
+        name = json.load(f)["checkpoint"]
+    path = os.path.join(directory, name)
+    restore_adapter(model, load_file(os.path.join(path, ADAPTER_FILE)))
+    state = torch.load(os.path.join(path, STATE_FILE), map_location="cpu", weights_only=False)
+    if optimizer is not None:
+        optimizer.load_state_dict(state.pop("optimizer"))
+    best = os.path.join(directory, BEST, ADAPTER_FILE)
+    if os.path.exists(best):
+        state["best_adapter"] = load_file(best)
+    return state
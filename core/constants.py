@@ -0,0 +1,4 @@
+# Name of the plain base model (no expert) wherever an expert name is expected:
+# engine results, gate decisions, caches, bundles and predict_mixed() rows.
+# It is also PEFT's own "no adapter" name in mixed batches, so no adapter may use it.
+BASE = "__base__"
@@ -1,21 +1,42 @@
 import os
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, Sampler
 from PIL import Image
 from torchvision import transforms
 
+from core.shards import ImageShards, is_shard_dir
+
 class RobustDataset(Dataset):
-    def __init__(self, root_dir, transform=None, is_training=True):
+    def __init__(self, root_dir, transform=None, is_training=True, recursive=False, raw=False):
         """
         Args:
-            root_dir (str): Path to the dataset (e.g., 'data/test_sunny').
-            transform (callable, optional): Custom transform.
+            root_dir (str): Path to the dataset (e.g., 'data/test_sunny'), or a directory
+                packed by scripts/pack_shards.py (pre-decoded, memory-mapped uint8 shards).
+            transform (callable, optional): Custom transform (gets a uint8 tensor in shard mode).
             is_training (bool): If True, applies heavy augmentation.
+            recursive (bool): If True, also collects images in nested folders
+                (e.g., 'data/bdd_scenes' labelled by domain: sunny/highway/*.jpg -> sunny).
+            raw (bool): If True, no per-sample augmentation: uint8 (3, 256, 256) tensors,
+                augmented after collation by core.augment.BatchAugment.
         """
         self.root_dir = root_dir
         self.image_paths = []
         self.labels = []
-        
+        self.shards = None
+        # JPEG draft decoding: the decoder downscales by 1/2, 1/4 or 1/8 while staying >= this size
+        self.draft_size = None if transform else ((256, 256) if is_training or raw else (224, 224))
+
+        if is_shard_dir(root_dir):
+            # Shard mode: decoding + resizing were done once at pack time
+            self.shards = ImageShards(root_dir)
+            self.classes = self.shards.classes
+            self.class_to_idx = {cls_name: i for i, cls_name in enumerate(self.classes)}
+            self.image_paths = self.shards.paths
+            self.labels = self.shards.labels
+            print(f"📦 [Dataset] Shard mode: {len(self.shards)} pre-decoded {self.shards.size}px images from {root_dir}")
+            self.transform = transform or (None if raw else self._shard_transform(is_training))
+            return
+
         # 1. Auto-Detect Classes (Sorted ensures consistency: Class A is always 0)
         self.classes = sorted([d for d in os.listdir(root_dir) if os.path.isdir(os.path.join(root_dir, d))])
         self.class_to_idx = {cls_name: i for i, cls_name in enumerate(self.classes)}
@@ -25,9 +46,13 @@ class RobustDataset(Dataset):
         # 2. Index Images
         for cls_name in self.classes:
             cls_folder = os.path.join(root_dir, cls_name)
-            for img_name in os.listdir(cls_folder):
-                if img_name.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    self.image_paths.append(os.path.join(cls_folder, img_name))
+            if recursive:
+                candidates = [os.path.join(d, f) for d, _, files in os.walk(cls_folder) for f in files]
+            else:
+                candidates = [os.path.join(cls_folder, f) for f in os.listdir(cls_folder)]
+            for img_path in candidates:
+                if img_path.lower().endswith(('.png', '.jpg', '.jpeg')):
+                    self.image_paths.append(img_path)
                     self.labels.append(self.class_to_idx[cls_name])
 
         print(f"📊 [Dataset] Loaded {len(self.image_paths)} images from {root_dir}")
@@ -35,6 +60,8 @@ class RobustDataset(Dataset):
         # 3. Define Default Transforms (The Augmentation Strategy)
         if transform:
             self.transform = transform
+        elif raw:
+            self.transform = transforms.Compose([transforms.Resize((256, 256)), transforms.PILToTensor()])
         else:
             if is_training:
                 # Heavy Augmentation for Training (The "Multiplier" Effect)
@@ -55,21 +82,104 @@ class RobustDataset(Dataset):
                     transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
                 ])
 
+    @staticmethod
+    def _shard_transform(is_training):
+        """Same recipes as above on uint8 tensors already resized at pack time (no decode, no Resize)."""
+        normalize = [
+            transforms.ConvertImageDtype(torch.float32),
+            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+        ]
+        if is_training:
+            return transforms.Compose([
+                transforms.RandomCrop(224),
+                transforms.RandomHorizontalFlip(),
+                transforms.RandomRotation(15),
+                transforms.ColorJitter(brightness=0.2, contrast=0.2),
+            ] + normalize)
+        return transforms.Compose([transforms.Resize((224, 224), antialias=True)] + normalize)
+
     def __len__(self):
         return len(self.image_paths)
 
     def __getitem__(self, idx):
         img_path = self.image_paths[idx]
         label = self.labels[idx]
-        
+
+        if self.shards is not None:
+            image = self.shards[idx]
+            return (self.transform(image) if self.transform else image), label
+
         # Open and convert to RGB (Fixes crash on PNGs with Alpha channel)
-        image = Image.open(img_path).convert("RGB")
+        image = Image.open(img_path)
+        if self.draft_size:
+            image.draft("RGB", self.draft_size)  # No-op for PNGs
+        image = image.convert("RGB")
         
         if self.transform:
             image = self.transform(image)
             
         return image, label
 
+class MultiDomainDataset(Dataset):
+    """
+    Several per-domain RobustDatasets behind one index (one loader, one worker pool).
+    Items are (image, label, domain index); labels stay per-domain, as in separate runs.
+    """
+    def __init__(self, datasets: dict):
+        self.domains = list(datasets)
+        self.datasets = [datasets[d] for d in self.domains]
+        self.offsets = [0]
+        for ds in self.datasets:
+            self.offsets.append(self.offsets[-1] + len(ds))
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, idx):
+        d = next(i for i in range(len(self.datasets)) if idx < self.offsets[i + 1])
+        image, label = self.datasets[d][idx - self.offsets[d]]
+        return image, label, d
+
+
+class DomainBatchSampler(Sampler):
+    """
+    Mixed batches for MultiDomainDataset: every step holds the next batch_sizes[d]
+    shuffled samples of each domain still training, grouped by domain.
+    Each domain runs its own epochs (last batch of an epoch may be short, like
+    DataLoader(shuffle=True)) and drops out once it has done epochs[d].
+    """
+    def __init__(self, dataset: MultiDomainDataset, batch_sizes, epochs, seed: int = 0):
+        self.dataset = dataset
+        self.batch_sizes = list(batch_sizes)
+        self.epochs = list(epochs)
+        self.seed = seed
+
+    def steps(self, d):
+        n = len(self.dataset.datasets[d])
+        return -(-n // self.batch_sizes[d]) * self.epochs[d]
+
+    def __len__(self):
+        return max(self.steps(d) for d in range(len(self.batch_sizes)))
+
+    def __iter__(self):
+        g = torch.Generator().manual_seed(self.seed)
+        n_domains = len(self.batch_sizes)
+        order = [torch.randperm(len(ds), generator=g).tolist() for ds in self.dataset.datasets]
+        cursor, epoch = [0] * n_domains, [0] * n_domains
+        for _ in range(len(self)):
+            batch = []
+            for d in range(n_domains):
+                if epoch[d] >= self.epochs[d] or not order[d]:
+                    continue
+                rows = order[d][cursor[d]:cursor[d] + self.batch_sizes[d]]
+                batch += [self.dataset.offsets[d] + r for r in rows]
+                cursor[d] += len(rows)
+                if cursor[d] >= len(order[d]):
+                    epoch[d], cursor[d] = epoch[d] + 1, 0
+                    order[d] = torch.randperm(len(order[d]), generator=g).tolist()
+            yield batch
+
+
 if __name__ == "__main__":
     # Quick Test
     import sys
@@ -79,4 +189,4 @@ if __name__ == "__main__":
         img, lbl = ds[0]
         print(f"✅ Sample Shape: {img.shape} | Label: {lbl}")
     else:
-        print("Usage: python core/dataset.py data/test_sunny")
+        print("Usage: python -m core.dataset data/test_sunny")
@@ -0,0 +1,85 @@
+import copy
+import glob
+import os
+import torch
+import torch.nn as nn
+from peft import PeftModel
+from transformers import ResNetForImageClassification
+
+
+class ExpertGraph(nn.Module):
+    """
+    pixel_values -> logits for one (merged) expert.
+    Calls the ResNet submodules directly so the graph has no HF control flow
+    and can be traced / FX-quantized.
+    """
+    def __init__(self, model: ResNetForImageClassification):
+        super().__init__()
+        resnet = model.resnet
+        self.stem = nn.Sequential(resnet.embedder.embedder, resnet.embedder.pooler)
+        self.stages = nn.Sequential(*resnet.encoder.stages)
+        self.pooler = resnet.pooler
+        self.classifier = model.classifier
+
+    def forward(self, pixel_values):
+        return self.classifier(self.pooler(self.stages(self.stem(pixel_values))))
+
+
+def load_expert(base_model_id: str, adapter_path: str = None):
+    """Fresh base model, optionally wrapped with one trained adapter (unmerged PEFT)."""
+    base = ResNetForImageClassification.from_pretrained(base_model_id)
+    if adapter_path is None:
+        return base.eval()
+    return PeftModel.from_pretrained(base, adapter_path).eval()
+
+
+def merge_expert(model):
+    """Folds LoRA/DoRA into the conv weights and drops the PEFT wrappers."""
+    return model.merge_and_unload() if isinstance(model, PeftModel) else model
+
+
+@torch.no_grad()
+def quantize_int8(graph: nn.Module, calibration, backend: str = "x86"):
+    """Post-training static int8 (FX graph mode), observers calibrated on real frames."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = backend
+    prepared = prepare_fx(copy.deepcopy(graph).eval(), get_default_qconfig_mapping(backend),
+                          example_inputs=(calibration[0],))
+    for batch in calibration:
+        prepared(batch)
+    return convert_fx(prepared)
+
+
+@torch.no_grad()
+def build_cpu_artifact(model, example, channels_last: bool = True, quantize: bool = False,
+                       calibration=None, backend: str = "x86"):
+    """Merged expert -> frozen TorchScript graph (optionally int8), ready for torch.jit.load."""
+    graph = ExpertGraph(merge_expert(model)).eval()
+    if quantize:
+        graph = quantize_int8(graph, calibration, backend)
+    if channels_last:
+        graph = graph.to(memory_format=torch.channels_last)
+        example = example.contiguous(memory_format=torch.channels_last)
+
+    # Freezing inlines the weights and folds conv+batchnorm
+    return torch.jit.freeze(torch.jit.trace(graph, example))
+
+
+def load_cpu_artifact(path: str):
+    return torch.jit.load(path, map_location="cpu").eval()
+
+
+def sample_domain_images(root: str, per_domain: int, offset: int = 0):
+    """First images (sorted, after 'offset') of every domain folder in e.g. data/bdd_scenes."""
+    samples = {}
+    for domain in sorted(os.listdir(root)):
+        if not os.path.isdir(os.path.join(root, domain)):
+            continue
+        paths = sorted(
+            p for p in glob.glob(os.path.join(root, domain, "**", "*"), recursive=True)
+            if p.lower().endswith(('.png', '.jpg', '.jpeg'))
+        )
+        samples[domain] = paths[offset:offset + per_domain]
+    return samples
@@ -0,0 +1,133 @@
+import os
+from contextlib import contextmanager
+
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+from torch.utils.data import Sampler
+
+
+def init_distributed(backend: str = "gloo"):
+    """
+    Joins the process group torchrun describes (RANK / WORLD_SIZE / MASTER_ADDR ...).
+    One box:   torchrun --nproc_per_node=4 scripts/train_modular.py ... --distributed
+    N nodes:   torchrun --nnodes=N --node_rank=i --master_addr=HOST --nproc_per_node=4 ...
+    Each process gets an equal share of the box's cores. Returns (rank, world_size).
+    """
+    dist.init_process_group(backend)
+    local_world = int(os.environ.get("LOCAL_WORLD_SIZE", dist.get_world_size()))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world))
+    return dist.get_rank(), dist.get_world_size()
+
+
+def is_main() -> bool:
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+
+class ShardedBatchSampler(Sampler):
+    """
+    The single-process DataLoader(shuffle=True) batches, split across ranks:
+    every rank draws the same seeded permutation per epoch and takes its contiguous
+    slice of each global batch. A rank's slice may be empty on a short last batch.
+    """
+    def __init__(self, n: int, batch_size: int, rank: int, world_size: int, seed: int = 0):
+        self.n = n
+        self.batch_size = batch_size
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self):
+        return -(-self.n // self.batch_size)
+
+    def global_size(self, step: int) -> int:
+        return min(self.batch_size, self.n - step * self.batch_size)
+
+    def __iter__(self):
+        g = torch.Generator().manual_seed(self.seed + self.epoch)
+        order = torch.randperm(self.n, generator=g)
+        for batch in order.split(self.batch_size):
+            yield batch.tensor_split(self.world_size)[self.rank].tolist()
+
+
+class _AllReduce(torch.autograd.Function):
+    """Differentiable sum over ranks: the gradient of a global sum is the global sum of gradients."""
+    @staticmethod
+    def forward(ctx, x):
+        x = x.clone()
+        dist.all_reduce(x)
+        return x
+
+    @staticmethod
+    def backward(ctx, grad):
+        grad = grad.clone()
+        dist.all_reduce(grad)
+        return grad
+
+
+def _synced_batch_norm(bn, x):
+    """Train-mode BatchNorm over the global batch: two all-reduces (sum, then squared deviations)."""
+    all_reduce = _AllReduce.apply
+    dims = [0] + list(range(2, x.dim()))
+    count = torch.tensor([x.numel() / x.shape[1]], dtype=x.dtype, device=x.device)
+    stats = all_reduce(torch.cat([x.sum(dims), count]))
+    n = stats[-1]
+    mean = stats[:-1] / n
+    shape = [1, -1] + [1] * (x.dim() - 2)
+    centered = x - mean.view(shape)
+    var = all_reduce((centered * centered).sum(dims)) / n
+
+    if bn.track_running_stats:
+        with torch.no_grad():
+            bn.num_batches_tracked.add_(1)
+            momentum = bn.momentum if bn.momentum is not None else 1.0 / bn.num_batches_tracked.item()
+            bn.running_mean.lerp_(mean.detach(), momentum)
+            bn.running_var.lerp_(var.detach() * n / (n - 1).clamp_min(1), momentum)
+
+    out = centered * torch.rsqrt(var + bn.eps).view(shape)
+    if bn.affine:
+        out = out * bn.weight.view(shape) + bn.bias.view(shape)
+    return out
+
+
+@contextmanager
+def synced_batch_norm(model):
+    """
+    BatchNorm statistics over the whole global batch (gloo, CPU), so a rank
+    normalizes its slice exactly as the single-process run would.
+    torch.nn.SyncBatchNorm refuses CPU tensors.
+    """
+    bns = [m for m in model.modules() if isinstance(m, nn.BatchNorm2d)]
+    for bn in bns:
+        bn.forward = lambda x, bn=bn, f=bn.forward: _synced_batch_norm(bn, x) if bn.training else f(x)
+    try:
+        yield
+    finally:
+        for bn in bns:
+            del bn.forward
+
+
+def all_reduce_adapter_grads(model, extra=None):
+    """
+    Sums the gradients of the trainable (adapter) parameters across ranks in one
+    flat buffer; the frozen backbone never touches the wire. `extra` (e.g. the
+    step's loss) rides along; its reduced value is returned.
+    """
+    params = [p for p in model.parameters() if p.requires_grad]
+    grads = [p.grad if p.grad is not None else torch.zeros_like(p) for p in params]
+    flat = torch.cat([g.flatten() for g in grads] + ([extra.detach().flatten()] if extra is not None else []))
+    dist.all_reduce(flat)
+    offset = 0
+    for p in params:
+        p.grad = flat[offset:offset + p.numel()].view_as(p)
+        offset += p.numel()
+    return flat[offset:] if extra is not None else None
+
+
+def cleanup():
+    if dist.is_initialized():
+        dist.destroy_process_group()
@@ -1,3 +1,4 @@
+import re
 import yaml
 import torch
 from transformers import AutoImageProcessor, ResNetForImageClassification
@@ -9,6 +10,59 @@ class AdapterFactory:
         with open(config_path, 'r') as f:
             return yaml.safe_load(f)
 
+    @staticmethod
+    def update_config(config_path, updates):
+        """
+        Writes values back into a YAML config in place, keeping comments and layout.
+        updates: {"section.key": value}; every key must already exist in the file.
+        """
+        with open(config_path, 'r') as f:
+            lines = f.readlines()
+
+        pending = dict(updates)
+        parents = []  # (indent, key) of the enclosing mappings
+        for i, line in enumerate(lines):
+            match = re.match(r"^(\s*)([\w\-]+):(\s*)([^#\n]*?)(\s*#.*)?$", line.rstrip("\n"))
+            if not match:
+                continue
+            indent, key, gap, value, comment = match.groups()
+            while parents and parents[-1][0] >= len(indent):
+                parents.pop()
+            dotted = ".".join([k for _, k in parents] + [key])
+            if dotted in pending:
+                rendered = yaml.safe_dump(pending.pop(dotted), default_flow_style=True, width=10**6)
+                rendered = rendered.replace("\n...\n", "").strip()
+                new = f"{indent}{key}: {rendered}"
+                if comment:
+                    # Keep the comment in its original column
+                    column = len(line.rstrip("\n")) - len(comment.lstrip())
+                    new += " " * max(column - len(new), 1) + comment.lstrip()
+                lines[i] = new + "\n"
+            elif not value:
+                parents.append((len(indent), key))
+
+        if pending:
+            raise KeyError(f"Keys not found in {config_path}: {list(pending)}")
+        with open(config_path, 'w') as f:
+            f.writelines(lines)
+
+    @staticmethod
+    def lora_config(cfg):
+        """LoraConfig from a config's 'adapter' section (method: lora / dora)."""
+        method = cfg['adapter']['method'].lower()
+        use_dora = (method == "dora")
+
+        print(f"🔧 [Factory] Injecting Adapter -> Type: {method.upper()} | Rank: {cfg['adapter']['r']}")
+
+        return LoraConfig(
+            inference_mode=False,
+            r=cfg['adapter']['r'],
+            lora_alpha=cfg['adapter']['lora_alpha'],
+            lora_dropout=cfg['adapter']['lora_dropout'],
+            target_modules=cfg['adapter']['target_modules'],
+            use_dora=use_dora  # This toggle enables Weight-Decomposed LoRA
+        )
+
     @staticmethod
     def create_model(config_path):
         """
@@ -28,19 +82,7 @@ class AdapterFactory:
         )
 
         # 2. Configure Adapter (The "Smart" Part)
-        method = cfg['adapter']['method'].lower()
-        use_dora = (method == "dora")
-        
-        print(f"🔧 [Factory] Injecting Adapter -> Type: {method.upper()} | Rank: {cfg['adapter']['r']}")
-
-        peft_config = LoraConfig(
-            inference_mode=False,
-            r=cfg['adapter']['r'],
-            lora_alpha=cfg['adapter']['lora_alpha'],
-            lora_dropout=cfg['adapter']['lora_dropout'],
-            target_modules=cfg['adapter']['target_modules'],
-            use_dora=use_dora  # This toggle enables Weight-Decomposed LoRA
-        )
+        peft_config = AdapterFactory.lora_config(cfg)
 
         # 3. Inject
         model = get_peft_model(model, peft_config)
@@ -48,6 +90,38 @@ class AdapterFactory:
         
         return model, cfg
 
+    @staticmethod
+    def create_multi_model(config_paths: dict):
+        """
+        One backbone, several experts: {adapter name: config path} -> (PEFT model, {name: cfg}).
+        Every adapter keeps its own rank / alpha / dropout / DoRA setting and is trainable.
+        The configs must agree on base_model and num_classes (they share the backbone).
+        """
+        cfgs = {name: AdapterFactory.load_config(path) for name, path in config_paths.items()}
+        shared = {(c['model']['base_model'], c['model']['num_classes']) for c in cfgs.values()}
+        if len(shared) > 1:
+            raise ValueError(f"Experts trained together must share base_model and num_classes, got {shared}")
+        model_id, num_classes = shared.pop()
+
+        print(f"🏭 [Factory] Loading Base Model once for {list(cfgs)}: {model_id}")
+        model = ResNetForImageClassification.from_pretrained(
+            model_id,
+            num_labels=num_classes,
+            ignore_mismatched_sizes=True
+        )
+
+        names = list(cfgs)
+        model = get_peft_model(model, AdapterFactory.lora_config(cfgs[names[0]]), adapter_name=names[0])
+        for name in names[1:]:
+            model.add_adapter(name, AdapterFactory.lora_config(cfgs[name]))
+
+        # PEFT only leaves the active adapter trainable
+        for param_name, param in model.named_parameters():
+            if any(f".{name}." in param_name for name in names):
+                param.requires_grad_(True)
+        model.print_trainable_parameters()
+        return model, cfgs
+
 if __name__ == "__main__":
     # Quick Smoke Test
     model, cfg = AdapterFactory.create_model("configs/master_template.yaml")
@@ -0,0 +1,63 @@
+import torch
+import torch.nn as nn
+
+from core.gate.entropy import shannon_entropy
+
+
+class ExitHead(nn.Module):
+    """Global-average-pool + linear probe on one intermediate ResNet stage."""
+    def __init__(self, in_channels: int, num_domains: int):
+        super().__init__()
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.fc = nn.Linear(in_channels, num_domains)
+
+    def forward(self, hidden_state):
+        return self.fc(torch.flatten(self.pool(hidden_state), 1))
+
+
+class EarlyExitGate(nn.Module):
+    """
+    The Early-Exit Gate.
+    Lightweight domain heads after intermediate stages (e.g., layer2/layer3).
+    A head whose entropy is under the threshold picks the expert right there,
+    so the remaining base stages never run.
+    """
+    def __init__(self, stage_channels: dict, domains: list, entropy_threshold: float = 0.3):
+        super().__init__()
+        self.domains = list(domains)
+        self.entropy_threshold = entropy_threshold
+        self.stage_channels = dict(stage_channels)
+        self.heads = nn.ModuleDict({
+            stage: ExitHead(channels, len(self.domains)) for stage, channels in self.stage_channels.items()
+        })
+
+    @staticmethod
+    def channels_for(config, exits):
+        """Output channels of HF ResNet stages ('layer1' -> hidden_sizes[0], ...)."""
+        return {name: config.hidden_sizes[int(name.replace("layer", "")) - 1] for name in exits}
+
+    def forward(self, stage_name, hidden_state):
+        return self.heads[stage_name](hidden_state)
+
+    def decide(self, stage_name, hidden_state):
+        """Returns (domain index, entropy, confident) per sample, all on-device."""
+        return self.decide_from_logits(self.heads[stage_name](hidden_state))
+
+    def decide_from_logits(self, logits):
+        entropy = shannon_entropy(logits)
+        return logits.argmax(dim=-1), entropy, entropy < self.entropy_threshold
+
+    def save(self, path):
+        torch.save({
+            "stage_channels": self.stage_channels,
+            "domains": self.domains,
+            "entropy_threshold": self.entropy_threshold,
+            "state_dict": self.state_dict(),
+        }, path)
+
+    @classmethod
+    def load(cls, path, map_location="cpu"):
+        ckpt = torch.load(path, map_location=map_location)
+        gate = cls(ckpt["stage_channels"], ckpt["domains"], ckpt["entropy_threshold"])
+        gate.load_state_dict(ckpt["state_dict"])
+        return gate.eval()
@@ -0,0 +1,23 @@
+import torch
+import torch.nn.functional as F
+
+from core.gate.scores import UncertaintyGate
+
+
+def shannon_entropy(logits: torch.Tensor) -> torch.Tensor:
+    """Shannon Entropy per sample: -sum(p * log(p)). Stays on-device."""
+    probs = F.softmax(logits, dim=-1)
+    return -torch.sum(probs * torch.log(probs + 1e-9), dim=-1)
+
+
+class EntropyGate(UncertaintyGate):
+    """
+    The Uncertainty Gate.
+    Entropy above the threshold means the base model is confused -> call an expert.
+    (Other scores: core.gate.scores.UncertaintyGate.)
+    """
+    def __init__(self, threshold: float = 1.0):
+        super().__init__("entropy", threshold)
+
+    def is_uncertain(self, logits: torch.Tensor) -> torch.Tensor:
+        return shannon_entropy(logits) > self.threshold
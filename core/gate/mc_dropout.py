@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+import torch
+import torch.nn.functional as F
+
+
+class MCDropout:
+    """
+    Single-trunk MC-dropout.
+    Naive MC-dropout runs the whole network N times. Here everything up to
+    `start_stage` runs once; only the LoRA branches from `start_stage` on
+    (their own lora_dropout) and/or a dropout on the pooled features feeding
+    the classifier are sampled. The N samples ride along the batch dimension,
+    so the sampled part is one forward of N x B rows.
+    """
+    def __init__(self, samples: int = 8, head_dropout: float = 0.1, sample_lora: bool = True,
+                 start_stage: str = "layer4"):
+        self.samples = samples
+        self.head_dropout = head_dropout
+        self.sample_lora = sample_lora
+        self.start_stage = start_stage
+
+    @classmethod
+    def from_config(cls, cfg):
+        mc = cfg['mc_dropout']
+        return cls(
+            samples=mc['samples'],
+            head_dropout=mc['head_dropout'],
+            sample_lora=mc['sample_lora'],
+            start_stage=mc['start_stage'],
+        )
+
+    @staticmethod
+    @contextmanager
+    def lora_dropout(stages):
+        """Puts only the lora_dropout modules inside `stages` in train mode."""
+        from peft.tuners.lora import LoraLayer
+
+        live = [
+            d for _, stage in stages for m in stage.modules() if isinstance(m, LoraLayer)
+            for d in m.lora_dropout.values() if not isinstance(d, torch.nn.Identity)
+        ]
+        for d in live:
+            d.train()
+        try:
+            yield
+        finally:
+            for d in live:
+                d.eval()
+
+    def _first_sampled_stage(self, backend, start):
+        if not self.sample_lora:
+            return len(backend.stages)
+        return max(start, backend.stage_names.index(self.start_stage))
+
+    def sample(self, backend, hidden, start, experts=None):
+        """
+        Logits (N, B, C) for activations `hidden` entering stage `start`
+        (start = len(stages): hidden is the last stage output, head-only sampling).
+        experts: expert per row as in TorchBackend.run_tail (None = frozen base).
+        """
+        n = hidden.shape[0]
+        stop = self._first_sampled_stage(backend, start)
+
+        # 1. Deterministic part, once
+        hidden = backend.run_stages(hidden, start, stop, experts)
+
+        # 2. Sampled LoRA stages: N copies stacked on the batch dim, independent dropout masks
+        if stop < len(backend.stages):
+            hidden = hidden.repeat(self.samples, 1, 1, 1)
+            with self.lora_dropout(backend.stages[stop:]):
+                hidden = backend.run_stages(hidden, stop, None, experts * self.samples if experts else None)
+            pooled = backend.pool(hidden)
+        else:
+            pooled = backend.pool(hidden).repeat(self.samples, 1)
+
+        # 3. Head dropout on the pooled features
+        if self.head_dropout > 0:
+            pooled = F.dropout(pooled, self.head_dropout, training=True)
+        return backend.classify(pooled).view(self.samples, n, -1)
@@ -0,0 +1,100 @@
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from core.preprocess import IMAGENET_MEAN, IMAGENET_STD
+
+
+def image_statistics(pixel_values, mean=IMAGENET_MEAN, std=IMAGENET_STD, bins: int = 16):
+    """
+    Cheap per-image descriptors of normalized pixel_values (B, 3, H, W), on a 4x
+    downsampled copy: channel mean/std, luminance + per-channel histograms,
+    saturation, dark/bright fractions and gradient energy. Fully batched.
+    """
+    mean = torch.tensor(mean, device=pixel_values.device).view(1, 3, 1, 1)
+    std = torch.tensor(std, device=pixel_values.device).view(1, 3, 1, 1)
+    rgb = (F.avg_pool2d(pixel_values.float(), 4) * std + mean).clamp(0, 1)
+    b = rgb.shape[0]
+    luma = (0.299 * rgb[:, 0] + 0.587 * rgb[:, 1] + 0.114 * rgb[:, 2]).flatten(1)
+
+    def histogram(x, n):
+        idx = (x * n).long().clamp_(max=n - 1)
+        return F.one_hot(idx, n).float().mean(dim=1)
+
+    channels = rgb.flatten(2)
+    sat = (channels.amax(dim=1) - channels.amin(dim=1)) / (channels.amax(dim=1) + 1e-6)
+    y = luma.view(b, *rgb.shape[-2:])
+    grad = torch.stack([
+        (y[:, :, 1:] - y[:, :, :-1]).abs().mean(dim=(1, 2)),
+        (y[:, 1:, :] - y[:, :-1, :]).abs().mean(dim=(1, 2)),
+    ], dim=1)
+
+    return torch.cat([
+        channels.mean(dim=2), channels.std(dim=2),
+        histogram(luma, bins),
+        histogram(channels.reshape(b * 3, -1), bins // 2).view(b, -1),
+        torch.stack([sat.mean(dim=1), sat.std(dim=1)], dim=1),
+        torch.stack([(luma < 0.15).float().mean(dim=1), (luma > 0.85).float().mean(dim=1)], dim=1),
+        grad,
+    ], dim=1)
+
+
+class DomainRouter(nn.Module):
+    """
+    Tiny MLP over image_statistics() that predicts the domain (sunny / rain / night)
+    before any ResNet stage runs. Confident rows go straight to their expert.
+    """
+    def __init__(self, domains, hidden: int = 32, min_confidence: float = 0.9, bins: int = 16,
+                 mean=IMAGENET_MEAN, std=IMAGENET_STD):
+        super().__init__()
+        self.domains = list(domains)
+        self.hidden = hidden
+        self.min_confidence = min_confidence
+        self.bins = bins
+        self.mean, self.std = tuple(mean), tuple(std)
+        n_features = 3 + 3 + bins + 3 * (bins // 2) + 2 + 2 + 2
+        # Feature standardization, fitted on the training set
+        self.register_buffer("feat_mean", torch.zeros(n_features))
+        self.register_buffer("feat_std", torch.ones(n_features))
+        self.mlp = nn.Sequential(
+            nn.Linear(n_features, hidden),
+            nn.ReLU(),
+            nn.Linear(hidden, len(self.domains)),
+        )
+
+    def features(self, pixel_values):
+        return image_statistics(pixel_values, self.mean, self.std, self.bins)
+
+    def fit_normalizer(self, features):
+        self.feat_mean.copy_(features.mean(dim=0))
+        self.feat_std.copy_(features.std(dim=0).clamp_min(1e-6))
+
+    def classify(self, features):
+        return self.mlp((features - self.feat_mean) / self.feat_std)
+
+    def forward(self, pixel_values):
+        return self.classify(self.features(pixel_values))
+
+    @torch.no_grad()
+    def decide(self, pixel_values):
+        """Returns (domain index, confidence, confident) per sample, all on-device."""
+        confidence, domain = F.softmax(self(pixel_values), dim=-1).max(dim=-1)
+        return domain, confidence, confidence >= self.min_confidence
+
+    def save(self, path):
+        torch.save({
+            "domains": self.domains,
+            "hidden": self.hidden,
+            "min_confidence": self.min_confidence,
+            "bins": self.bins,
+            "mean": self.mean,
+            "std": self.std,
+            "state_dict": self.state_dict(),
+        }, path)
+
+    @classmethod
+    def load(cls, path, map_location="cpu"):
+        ckpt = torch.load(path, map_location=map_location)
+        router = cls(ckpt["domains"], ckpt["hidden"], ckpt["min_confidence"], ckpt["bins"], ckpt["mean"], ckpt["std"])
+        router.load_state_dict(ckpt["state_dict"])
+        return router.eval()
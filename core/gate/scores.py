@@ -0,0 +1,69 @@
+import torch
+import torch.nn.functional as F
+
+# Score -> True if a higher value means "more uncertain"
+SCORES = {
+    "entropy": True,       # Shannon entropy of the softmax
+    "max_softmax": False,  # Top-1 probability (MSP)
+    "margin": False,       # Top-1 minus top-2 probability
+    "energy": True,        # -T * logsumexp(logits / T)
+    "mutual_info": True,   # MC-dropout only: predictive minus expected entropy (model uncertainty)
+}
+
+
+def uncertainty_scores(logits: torch.Tensor, temperature: float = 1.0) -> dict:
+    """
+    Every gate score for a batch of logits (..., C) in one pass: a single softmax
+    and a single top-2 shared by all scores. Results stay on-device, one tensor per score.
+    """
+    logits = logits.float()
+    probs = F.softmax(logits, dim=-1)
+    top2 = probs.topk(min(2, probs.shape[-1]), dim=-1).values
+    return {
+        # Same epsilon as shannon_entropy() so thresholds carry over unchanged
+        "entropy": -torch.sum(probs * torch.log(probs + 1e-9), dim=-1),
+        "max_softmax": top2[..., 0],
+        "margin": top2[..., 0] - top2[..., -1],
+        "energy": -temperature * torch.logsumexp(logits / temperature, dim=-1),
+    }
+
+
+def mc_scores(sample_logits: torch.Tensor, temperature: float = 1.0) -> dict:
+    """
+    Scores for MC-dropout samples (N, B, C). The usual scores are computed on the
+    mean predictive distribution; "logits" holds its log (a drop-in for single-pass logits).
+    """
+    probs = F.softmax(sample_logits.float(), dim=-1)
+    mean_logits = torch.log(probs.mean(dim=0) + 1e-9)
+    scores = uncertainty_scores(mean_logits, temperature)
+    # Energy is not defined on averaged probabilities; use the mean per-sample energy
+    scores["energy"] = (-temperature * torch.logsumexp(sample_logits.float() / temperature, dim=-1)).mean(dim=0)
+    scores["expected_entropy"] = -torch.sum(probs * torch.log(probs + 1e-9), dim=-1).mean(dim=0)
+    scores["mutual_info"] = (scores["entropy"] - scores["expected_entropy"]).clamp_min(0)
+    scores["logits"] = mean_logits
+    return scores
+
+
+class UncertaintyGate:
+    """
+    Threshold gate on any score in SCORES; is_uncertain() returns a bool mask for the batch.
+    entropy / energy / mutual_info: uncertain above the threshold. max_softmax / margin: below it.
+    """
+    def __init__(self, score: str = "entropy", threshold: float = 1.0, temperature: float = 1.0):
+        if score not in SCORES:
+            raise ValueError(f"Unknown gate score: {score} (options: {list(SCORES)})")
+        self.score = score
+        self.threshold = threshold
+        self.temperature = temperature
+
+    def scores(self, logits: torch.Tensor) -> dict:
+        return uncertainty_scores(logits, self.temperature)
+
+    def decide(self, scores: dict, threshold: float = None) -> torch.Tensor:
+        """Uncertain mask from precomputed scores (threshold overrides the configured one)."""
+        threshold = self.threshold if threshold is None else threshold
+        value = scores[self.score]
+        return value > threshold if SCORES[self.score] else value < threshold
+
+    def is_uncertain(self, logits: torch.Tensor) -> torch.Tensor:
+        return self.decide(self.scores(logits))
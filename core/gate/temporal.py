@@ -0,0 +1,119 @@
+import numpy as np
+
+from core.constants import BASE
+
+
+class SceneChangeDetector:
+    """
+    Cheap scene-change signal on raw RGB frames (uint8, H x W x 3).
+    Fires on luminance histogram drift since the last gate decision,
+    or on frame-difference energy between consecutive frames (hard cuts).
+    """
+    def __init__(self, hist_threshold: float = 0.25, diff_threshold: float = 25.0, bins: int = 32, stride: int = 8):
+        self.hist_threshold = hist_threshold
+        self.diff_threshold = diff_threshold
+        self.bins = bins
+        self.stride = stride
+        self.reference_hist = None
+        self.prev_luma = None
+
+    def _luma(self, frame):
+        small = frame[::self.stride, ::self.stride, :3].astype(np.float32)
+        return small @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    def _hist(self, luma):
+        hist, _ = np.histogram(luma, bins=self.bins, range=(0, 255))
+        return hist / max(luma.size, 1)
+
+    def update(self, frame) -> bool:
+        luma = self._luma(frame)
+        prev, self.prev_luma = self.prev_luma, luma
+        if self.reference_hist is None or prev is None:
+            return False
+
+        # Total-variation distance in [0, 1] vs the histogram at the last decision
+        drift = 0.5 * np.abs(self._hist(luma) - self.reference_hist).sum()
+        energy = np.abs(luma - prev).mean()
+        return drift > self.hist_threshold or energy > self.diff_threshold
+
+    def mark_reference(self, frame):
+        """Call when the gate has just decided on this frame."""
+        self.reference_hist = self._hist(self._luma(frame))
+
+
+class TemporalGate:
+    """
+    Stream-aware gating.
+    Keeps the current expert and only re-evaluates every N frames or on a scene change.
+    Hysteresis on the base entropy (enter > exit) plus a patience count stop adapter thrashing.
+    """
+    def __init__(
+        self,
+        reevaluate_every: int = 30,
+        enter_threshold: float = 1.2,
+        exit_threshold: float = 0.8,
+        switch_patience: int = 2,
+        detector: SceneChangeDetector = None,
+    ):
+        if exit_threshold > enter_threshold:
+            raise ValueError(f"exit_threshold ({exit_threshold}) must be <= enter_threshold ({enter_threshold})")
+        self.reevaluate_every = reevaluate_every
+        self.enter_threshold = enter_threshold
+        self.exit_threshold = exit_threshold
+        self.switch_patience = switch_patience
+        self.detector = detector
+
+        self.current = None
+        self.frames_since_eval = 0
+        self._pending = None
+        self._pending_count = 0
+        self.stats = {"frames": 0, "evaluations": 0, "scene_changes": 0, "switches": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict):
+        """Builds from the 'temporal' (+ optional 'scene_change') sections of configs/gate/temporal.yaml."""
+        scene = cfg.get('scene_change')
+        detector = SceneChangeDetector(**scene) if scene else None
+        return cls(detector=detector, **cfg['temporal'])
+
+    def should_evaluate(self, frame=None) -> bool:
+        self.stats["frames"] += 1
+        self.frames_since_eval += 1
+        scene_changed = self.detector is not None and frame is not None and self.detector.update(frame)
+        if scene_changed:
+            self.stats["scene_changes"] += 1
+        return self.current is None or scene_changed or self.frames_since_eval >= self.reevaluate_every
+
+    def update(self, proposed: str, base_entropy: float = None, frame=None) -> str:
+        """Feed one gate decision; returns the expert to keep running."""
+        self.stats["evaluations"] += 1
+        self.frames_since_eval = 0
+        if self.detector is not None and frame is not None:
+            self.detector.mark_reference(frame)
+
+        # First decision is taken as-is
+        if self.current is None:
+            self.current = proposed
+            return self.current
+
+        # Hysteresis: leave Base only above 'enter', return to Base only below 'exit'
+        if base_entropy is not None:
+            if self.current == BASE and base_entropy <= self.enter_threshold:
+                proposed = BASE
+            elif self.current != BASE and proposed == BASE and base_entropy >= self.exit_threshold:
+                proposed = self.current
+
+        if proposed == self.current:
+            self._pending, self._pending_count = None, 0
+            return self.current
+
+        # A different expert must win 'switch_patience' evaluations in a row
+        if proposed == self._pending:
+            self._pending_count += 1
+        else:
+            self._pending, self._pending_count = proposed, 1
+        if self._pending_count >= self.switch_patience:
+            self.current = proposed
+            self._pending, self._pending_count = None, 0
+            self.stats["switches"] += 1
+        return self.current
@@ -0,0 +1,87 @@
+import torch
+import torch.nn as nn
+
+from core.gate.scores import SCORES
+
+
+def stage_costs(backend, pixel_values):
+    """
+    Multiply-accumulates of each stage (+ 'head') for one image, counted with
+    hooks on a single base forward. Convs and linears only (the rest is noise).
+    """
+    costs = {}
+
+    def counter(name):
+        def hook(module, args, output):
+            if isinstance(module, nn.Conv2d):
+                k = module.in_channels // module.groups * module.kernel_size[0] * module.kernel_size[1]
+                macs = output[0].numel() * k
+            else:
+                macs = output[0].numel() * module.in_features
+            costs[name] = costs.get(name, 0) + macs
+        return hook
+
+    parts = list(backend.stages) + [("head", backend.model.get_base_model().classifier)]
+    handles = [
+        m.register_forward_hook(counter(name))
+        for name, part in parts for m in part.modules() if isinstance(m, (nn.Conv2d, nn.Linear))
+    ]
+    try:
+        with torch.no_grad(), backend.frozen():
+            backend.head(backend.run_stages(pixel_values[:1], 0))
+    finally:
+        for h in handles:
+            h.remove()
+    return {name: costs.get(name, 0) for name, _ in parts}
+
+
+def tail_fraction(costs, stage_names, cut):
+    """Share of a full base pass an expert re-runs (stages from the cut + head)."""
+    tail = sum(costs[name] for name in stage_names[cut:]) + costs["head"]
+    return tail / sum(costs.values())
+
+
+def candidate_thresholds(scores, n: int = 256, decimals: int = 4):
+    """
+    Quantiles of the observed scores plus a point just outside each end
+    (never / always call an expert), rounded so the written value is the one evaluated.
+    """
+    scores = scores.float()
+    step = 10.0 ** -decimals
+    q = torch.quantile(scores, torch.linspace(0, 1, n))
+    edges = torch.stack([scores.min() - step, scores.max() + step])
+    return torch.unique(torch.round(torch.cat([edges, q]), decimals=decimals))
+
+
+def sweep_thresholds(scores, base_correct, expert_correct, thresholds, score: str = "entropy",
+                     n_experts: int = 1, tail: float = 1.0):
+    """
+    Accuracy / expected compute / expert-call rate for every threshold at once.
+    All inputs are per-image tensors; the result is one (T,) tensor each, no network calls.
+    Compute is relative to one base pass: every uncertain image runs all experts on the tail.
+    """
+    if SCORES[score]:
+        uncertain = scores[None, :] > thresholds[:, None]
+    else:
+        uncertain = scores[None, :] < thresholds[:, None]
+    correct = torch.where(uncertain, expert_correct[None, :], base_correct[None, :])
+    rate = uncertain.float().mean(dim=1)
+    return correct.float().mean(dim=1), 1.0 + rate * n_experts * tail, rate
+
+
+def pareto_front(accuracy, compute):
+    """Indices of the non-dominated points (less compute, more accuracy), by increasing compute."""
+    order = sorted(range(len(compute)), key=lambda i: (compute[i].item(), -accuracy[i].item()))
+    front, best = [], float("-inf")
+    for i in order:
+        if accuracy[i].item() > best:
+            front.append(i)
+            best = accuracy[i].item()
+    return front
+
+
+def pick_threshold(accuracy, compute, budget: float):
+    """Most accurate point within the compute budget (cheapest on ties)."""
+    front = pareto_front(accuracy, compute)
+    affordable = [i for i in front if compute[i].item() <= budget]
+    return affordable[-1] if affordable else front[0]
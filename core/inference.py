@@ -0,0 +1,471 @@
+import os
+import torch
+
+from core.gate.entropy import EntropyGate, shannon_entropy
+from core.gate.scores import mc_scores, uncertainty_scores
+from core.gate.early_exit import EarlyExitGate
+from core.gate.router import DomainRouter
+from core.constants import BASE
+from core.gate.temporal import TemporalGate
+from core.preprocess import load_image
+
+
+class TorchBackend:
+    """
+    PyTorch + PEFT runtime: experts are live adapters on one shared backbone.
+    The split point ('cut') is the first ResNet stage any loaded expert adapts.
+    """
+    def __init__(self, base_model_name: str = "microsoft/resnet-50", device: str = None):
+        # Imported here so the ONNX runtime never pays for transformers + peft
+        from core.backbone import AdaptiveVisionModel, resnet_stages
+        from core.preprocess import TensorPreprocessor
+
+        self.backbone = AdaptiveVisionModel(base_model_name, device=device)
+        self.device = self.backbone.device
+        self.model = self.backbone.model
+        self.model.eval()
+
+        self.preprocessor = TensorPreprocessor.from_processor(self.backbone.processor, self.device)
+        self.stages = resnet_stages(self.model)
+        self.stage_names = [name for name, _ in self.stages]
+        self.id2label = self.model.get_base_model().config.id2label
+        self.experts = []
+        self.cut = len(self.stages)
+        self.running_expert = None
+        self.adapter_switches = 0
+
+    def load_adapter(self, path: str, name: str) -> bool:
+        from core.checkpoint import has_adapter_weights
+
+        if not has_adapter_weights(path):
+            print(f"⚠️ [Engine] No adapter weights in {path} (Skipping '{name}')")
+            return False
+
+        self.backbone.load_adapter(path, name)
+        self.experts.append(name)
+        self.cut = self._first_adapted_stage()
+        return True
+
+    def _first_adapted_stage(self):
+        from core.backbone import first_adapted_stage
+        return first_adapted_stage(self.model, self.experts)
+
+    def frozen(self):
+        """Context for base-model stages (adapters off)."""
+        return self.model.disable_adapter()
+
+    def run_stage(self, i, hidden):
+        return self.stages[i][1](hidden)
+
+    def head(self, hidden):
+        from core.backbone import resnet_head
+        return resnet_head(self.model, hidden)
+
+    def pool(self, hidden):
+        """Head split in two for MC-dropout: pooled features (B, D) ..."""
+        return self.model.get_base_model().resnet.pooler(hidden).flatten(1)
+
+    def classify(self, pooled):
+        """... and the classifier on them."""
+        return self.model.get_base_model().classifier(pooled)
+
+    def run_stages(self, hidden, start, stop=None, experts=None):
+        """Stages [start:stop], row r routed to experts[r] (None = current context, e.g. frozen)."""
+        from core.backbone import routed_adapters
+
+        stages = self.stages[start:stop]
+        if experts is None or not stages:
+            for _, stage in stages:
+                hidden = stage(hidden)
+            return hidden
+
+        names = sorted(set(experts))
+        routing = torch.zeros(len(experts), len(names), device=self.device)
+        for row, expert in enumerate(experts):
+            routing[row, names.index(expert)] = 1.0
+        with routed_adapters(self.model, names, routing):
+            for _, stage in stages:
+                hidden = stage(hidden)
+        return hidden
+
+    def run_tail(self, hidden, start, experts):
+        """Stages [start:] + head, row r routed to experts[r], all in one forward."""
+        return self.head(self.run_stages(hidden, start, None, experts))
+
+    def run_mixed(self, hidden, start, weights):
+        """Stages [start:] + head with row r getting sum_j weights[r, j] * delta of self.experts[j]."""
+        from core.backbone import blended_adapters
+
+        with blended_adapters(self.model, self.experts, weights):
+            for _, stage in self.stages[start:]:
+                hidden = stage(hidden)
+        return self.head(hidden)
+
+    def run_full(self, pixel_values, expert):
+        """Whole network under one expert (stream steady state)."""
+        if expert == BASE:
+            with self.model.disable_adapter():
+                return self.model(pixel_values).logits
+        if expert != self.running_expert:
+            self.backbone.switch_adapter(expert)
+            self.running_expert = expert
+            self.adapter_switches += 1
+        return self.model(pixel_values).logits
+
+
+class DynamicEdgeSystem:
+    """
+    Phase 4 Engine: Uncertainty-Gated expert selection.
+
+    The base pass is split at the first ResNet stage any expert adapts.
+    Everything before that cut is computed once and shared with the expert
+    pass, so only the adapted tail is ever run twice.
+    (Adapters targeting every "convolution" have no shared prefix;
+    restrict target_modules to layer3/layer4 to get one.)
+    An uncertain row runs ONE expert, picked by the router or the exit head
+    at the cut; with neither attached, every expert's tail runs and the
+    lowest-entropy one answers.
+    With an early-exit gate attached, a confident intermediate head picks the
+    expert and the rest of the base network is skipped. A learned router
+    (load_router) goes further: it picks the expert from cheap image
+    statistics before the base pass even starts. With soft mixing
+    (enable_soft_mixing) uncertain rows blend the experts in one tail instead.
+
+    The gating logic is backend-agnostic: TorchBackend (PEFT) by default,
+    or an exported ONNX bundle via DynamicEdgeSystem.from_bundle().
+    The gate is an EntropyGate unless another UncertaintyGate (max_softmax,
+    margin, energy) is passed in.
+    """
+    def __init__(self, base_model_name: str = "microsoft/resnet-50", entropy_threshold: float = 1.0,
+                 device: str = None, backend=None, gate=None):
+        self.backend = backend if backend is not None else TorchBackend(base_model_name, device)
+        self.device = self.backend.device
+        self.preprocessor = self.backend.preprocessor
+        self.id2label = self.backend.id2label
+
+        self.gate = gate if gate is not None else EntropyGate(entropy_threshold)
+        self.exit_gate = None
+        self.domain_to_expert = {}
+        self.router = None
+        self.router_routes = {}
+        self.temporal = None
+        self.mc = None
+        self.mix_min_weight = None
+
+    @classmethod
+    def from_bundle(cls, bundle_dir: str, entropy_threshold: float = 1.0, providers=None, gate=None):
+        """Engine on an exported ONNX bundle (scripts/export_onnx_bundle.py); loads every expert in it."""
+        from core.bundle import OnnxBundleBackend
+
+        system = cls(entropy_threshold=entropy_threshold, backend=OnnxBundleBackend(bundle_dir, providers), gate=gate)
+        for name, expert_dir in system.backend.manifest["experts"].items():
+            system.load_adapter(os.path.join(bundle_dir, expert_dir), name)
+        return system
+
+    @property
+    def experts(self):
+        return self.backend.experts
+
+    @property
+    def adapter_switches(self):
+        return self.backend.adapter_switches
+
+    def load_adapter(self, path: str, name: str) -> bool:
+        if name == BASE:
+            raise ValueError(f"'{BASE}' is reserved for the base model; give the expert another name")
+        if not self.backend.load_adapter(path, name):
+            return False
+        shared = self.backend.stage_names[:self.backend.cut]
+        print(f"🧠 [Engine] Expert '{name}' loaded | Shared prefix: {shared or 'none'}")
+        if not shared:
+            print(f"⚠️ [Engine] '{name}' adapts the stem: each expert tail is a full network pass. Without a router "
+                  f"(load_router), an uncertain frame costs 1 + {len(self.experts)} full passes; "
+                  f"restrict target_modules to layer3/layer4 for a shared prefix.")
+        return True
+
+    def load_exit_gate(self, path: str, domain_to_expert: dict = None):
+        """
+        Attach trained early-exit heads (scripts/train_exit_heads.py).
+        domain_to_expert maps head domains to loaded experts; by default an
+        expert is matched when its name contains the domain ('night' -> 'Night-DoRA').
+        """
+        self.exit_gate = EarlyExitGate.load(path, map_location=self.device).to(self.device)
+        if domain_to_expert is None:
+            domain_to_expert = {
+                d: e for d in self.exit_gate.domains for e in self.experts if d.lower() in e.lower()
+            }
+        self.domain_to_expert = domain_to_expert
+        print(f"🚪 [Engine] Early-exit gate on {list(self.exit_gate.heads)} | Routes: {self.domain_to_expert}")
+
+    def _early_exit(self, stage_name, hidden):
+        """Per-row expert picked by a confident exit head after this stage (None = keep going)."""
+        if self.exit_gate is None or stage_name not in self.exit_gate.heads:
+            return None
+        domain, _, confident = self.exit_gate.decide(stage_name, hidden)
+        return [
+            self.domain_to_expert.get(self.exit_gate.domains[d]) if c else None
+            for d, c in zip(domain.tolist(), confident.tolist())
+        ]
+
+    def load_router(self, path: str, domain_to_expert: dict = None):
+        """
+        Attach a learned domain router (scripts/train_router.py). Rows it is confident
+        about skip the base pass; the rest fall back to the entropy gate
+        (router min_confidence 0 = the router replaces the gate).
+        domain_to_expert is matched by name as in load_exit_gate(); BASE is a valid target.
+        """
+        self.router = DomainRouter.load(path, map_location=self.device).to(self.device)
+        if domain_to_expert is None:
+            domain_to_expert = {
+                d: e for d in self.router.domains for e in self.experts if d.lower() in e.lower()
+            }
+        self.router_routes = domain_to_expert
+        print(f"🧭 [Engine] Router over {self.router.domains} (min confidence {self.router.min_confidence}) "
+              f"| Routes: {self.router_routes}")
+
+    def _route(self, pixel_values):
+        """Per-row expert picked by a confident router (None = use the gate)."""
+        if self.router is None:
+            return None
+        domain, _, confident = self.router.decide(pixel_values)
+        return [
+            self.router_routes.get(self.router.domains[d]) if c else None
+            for d, c in zip(domain.tolist(), confident.tolist())
+        ]
+
+    def preprocess(self, img_path: str) -> torch.Tensor:
+        return self.preprocessor(load_image(img_path))
+
+    def enable_mc_mode(self, mc):
+        """
+        Gate and expert selection on MC-dropout scores (core.gate.mc_dropout.MCDropout)
+        instead of single-pass entropy; base_entropy becomes the predictive entropy.
+        PyTorch backend only (exported bundles carry no dropout).
+        """
+        if mc is not None and not hasattr(self.backend, "pool"):
+            raise ValueError(f"{type(self.backend).__name__} does not support MC-dropout")
+        self.mc = mc
+
+    def enable_soft_mixing(self, min_weight: float = 0.05):
+        """
+        Uncertain rows run ONE tail with the experts' LoRA deltas blended by domain
+        probabilities, instead of every expert's tail + lowest-entropy pick.
+        Probabilities come from the router (load_router) or, without one, from the
+        early-exit head at the cut. Weights below min_weight are dropped (rows renormalized);
+        domains routed to BASE / no expert keep their share as plain base model.
+        PyTorch backend only (exported bundles hold merged, unblendable experts).
+        """
+        if not hasattr(self.backend, "run_mixed"):
+            raise ValueError(f"{type(self.backend).__name__} does not support soft mixing")
+        if self.router is None and self._cut_exit_stage() is None:
+            if self.backend.cut == 0:
+                raise ValueError("Soft mixing without a router needs a shared prefix, but the experts adapt the stem "
+                                 "(no exit head sees the cut): load_router() first, or restrict target_modules")
+            cut_stage = self.backend.stage_names[self.backend.cut - 1]
+            raise ValueError(f"Soft mixing needs a router or an exit head on '{cut_stage}' (load them first)")
+        self.mix_min_weight = min_weight
+        print(f"🎛️ [Engine] Soft mixing ON over {self.experts} (min weight {min_weight})")
+
+    def _cut_exit_stage(self):
+        """Stage whose exit head reads the activations at the cut; None without one (or with no shared prefix, cut 0)."""
+        cut = self.backend.cut
+        if self.exit_gate is None or cut == 0:
+            return None
+        stage = self.backend.stage_names[cut - 1]
+        return stage if stage in self.exit_gate.heads else None
+
+    def _domain_probs(self, pixel_values, shared):
+        """(B, domains) probabilities, domain names and routes from the router, or the exit head at the cut; None without either."""
+        if self.router is not None:
+            return torch.softmax(self.router(pixel_values), dim=-1), self.router.domains, self.router_routes
+        cut_stage = self._cut_exit_stage()
+        if cut_stage is None:
+            return None
+        return torch.softmax(self.exit_gate(cut_stage, shared), dim=-1), self.exit_gate.domains, self.domain_to_expert
+
+    def _select_experts(self, pixel_values, shared):
+        """One expert (or BASE / None) per row: the route of its most likely domain. None = no selector attached."""
+        domain_probs = self._domain_probs(pixel_values, shared)
+        if domain_probs is None:
+            return None
+        probs, domains, routes = domain_probs
+        return [routes.get(domains[d]) for d in probs.argmax(dim=-1).tolist()]
+
+    def _mixing_weights(self, pixel_values, shared):
+        """(B, len(experts)) blend weights from the router, or the exit head at the cut."""
+        domain_probs = self._domain_probs(pixel_values, shared)
+        if domain_probs is None:
+            raise ValueError("No router and no exit head at the cut to weight the experts (see enable_soft_mixing)")
+        probs, domains, routes = domain_probs
+
+        weights = torch.zeros(probs.shape[0], len(self.experts), device=probs.device)
+        for d, domain in enumerate(domains):
+            expert = routes.get(domain)
+            if expert in self.experts:
+                weights[:, self.experts.index(expert)] += probs[:, d]
+        base = 1.0 - weights.sum(dim=-1)
+        weights = torch.where(weights >= self.mix_min_weight, weights, torch.zeros_like(weights))
+        base = torch.where(base >= self.mix_min_weight, base, torch.zeros_like(base))
+        return weights / (weights.sum(dim=-1) + base).clamp_min(1e-6).unsqueeze(-1)
+
+    def enable_stream_mode(self, temporal_gate: TemporalGate):
+        """Video mode for predict_frame(): keep the current expert, re-gate only every N frames / on scene change."""
+        self.temporal = temporal_gate
+
+    def predict(self, img_path: str) -> dict:
+        return self._gated_predict(self.preprocess(img_path))
+
+    @torch.no_grad()
+    def predict_frame(self, frame) -> dict:
+        """Stream entry point. frame: RGB uint8 array (H, W, 3), e.g. a converted cv2 frame."""
+        pixel_values = self.preprocessor(frame)
+        if self.temporal is None:
+            return self._gated_predict(pixel_values)
+
+        if self.temporal.should_evaluate(frame):
+            # The gate runs with the lower (exit) threshold; TemporalGate applies the hysteresis
+            result = self._gated_predict(pixel_values, threshold=self.temporal.exit_threshold)
+            expert = self.temporal.update(result["expert"], result["base_entropy"], frame)
+            if expert == result["expert"]:
+                return result
+
+        # Steady state: no gate compute, no set_adapter unless the expert changed
+        expert = self.temporal.current
+        logits = self.backend.run_full(pixel_values, expert)
+        return self._format(logits, [expert])[0]
+
+    def _format(self, logits, experts, base_entropy=None, mixes=None):
+        """
+        Result dicts for a batch of final logits; one host sync for the whole batch.
+        'mix' is {expert: weight} for soft-mixed rows ('expert' is then the heaviest one).
+        """
+        scores = uncertainty_scores(logits)
+        pred = logits.argmax(dim=-1)
+        pred, confidence, entropy = (
+            torch.stack([pred.float(), scores["max_softmax"], scores["entropy"]]).cpu().tolist()
+        )
+        base_entropy = base_entropy or [None] * len(experts)
+        mixes = mixes or [None] * len(experts)
+        return [
+            {
+                "prediction": self.id2label.get(int(p), str(int(p))),
+                "confidence": c,
+                "entropy": e,
+                "base_entropy": b,
+                "expert": x,
+                "mix": m,
+            }
+            for p, c, e, b, x, m in zip(pred, confidence, entropy, base_entropy, experts, mixes)
+        ]
+
+    def _gated_predict(self, pixel_values, threshold: float = None) -> dict:
+        return self.predict_batch(pixel_values, threshold)[0]
+
+    @torch.no_grad()
+    def predict_batch(self, pixel_values, threshold: float = None) -> list:
+        """
+        Gated prediction for a whole batch; one result dict per row.
+        Rows that leave early or need experts are finished together, each
+        expert's rows as one sub-batch of the same routed tail forward.
+        """
+        backend = self.backend
+        cut = backend.cut
+        n = pixel_values.shape[0]
+        logits_out = [None] * n
+        experts_out = [BASE] * n
+        base_entropy = [None] * n
+        mixes = [None] * n
+        tails = []  # (row ids, start stage, resume activations, expert per row)
+
+        with backend.frozen():
+            hidden, shared, rows = pixel_values, None, list(range(n))
+
+            # 0. Learned router: confident rows go straight to their expert, no base pass
+            picks = self._route(pixel_values)
+            if picks and any(p is not None for p in picks):
+                out = [k for k, p in enumerate(picks) if p is not None]
+                rows = [k for k, p in enumerate(picks) if p is None]
+                tails.append((out, 0, pixel_values[out], [picks[k] for k in out]))
+                hidden = pixel_values[rows]
+
+            # 1. Frozen base stages. Activations at the cut are kept for the experts;
+            #    rows whose early-exit head is confident leave the base pass right there.
+            for i, name in enumerate(backend.stage_names):
+                if not rows:
+                    break
+                if i == cut:
+                    shared = hidden
+                hidden = backend.run_stage(i, hidden)
+                picks = self._early_exit(name, hidden)
+                if not picks or all(p is None for p in picks):
+                    continue
+
+                out = [k for k, p in enumerate(picks) if p is not None]
+                keep = [k for k, p in enumerate(picks) if p is None]
+                # The expert resumes from the cut (or from here if the cut is later)
+                start, resume = (cut, shared) if shared is not None else (i + 1, hidden)
+                tails.append(([rows[k] for k in out], start, resume[out], [picks[k] for k in out]))
+                rows, hidden = [rows[k] for k in keep], hidden[keep]
+                shared = shared[keep] if shared is not None else None
+
+            if rows:
+                # 2. Full base pass -> gate decision (scores stay on-device, one sync below)
+                if self.mc is None:
+                    logits = backend.head(hidden)
+                    scores = self.gate.scores(logits)
+                else:
+                    scores = mc_scores(self.mc.sample(backend, hidden, len(backend.stages)))
+                    logits = scores["logits"]
+                uncertain = self.gate.decide(scores, threshold)
+                flags, entropy = torch.stack([uncertain.float(), scores["entropy"]]).cpu().tolist()
+                for k, row in enumerate(rows):
+                    logits_out[row] = logits[k]
+                    base_entropy[row] = entropy[k]
+
+                # 3. Uncertain: the router / cut exit head picks one expert, which runs only the tail.
+                #    Without a selector every expert runs the tail and the most confident (lowest entropy) wins.
+                #    Soft mixing instead runs a single tail with the experts' deltas blended.
+                unsure = [k for k, u in enumerate(flags) if u] if self.experts else []
+                if unsure and self.mix_min_weight is not None:
+                    weights = self._mixing_weights(pixel_values[[rows[k] for k in unsure]], shared[unsure])
+                    mixed_logits = backend.run_mixed(shared[unsure], cut, weights)
+                    for j, (k, w) in enumerate(zip(unsure, weights.cpu().tolist())):
+                        logits_out[rows[k]] = mixed_logits[j]
+                        mixes[rows[k]] = {e: round(x, 3) for e, x in zip(self.experts, w) if x > 0}
+                        if mixes[rows[k]]:
+                            experts_out[rows[k]] = max(mixes[rows[k]], key=mixes[rows[k]].get)
+                elif unsure and (picks := self._select_experts(pixel_values[[rows[k] for k in unsure]],
+                                                                shared[unsure])):
+                    # Rows whose domain routes to BASE / no expert keep the base answer
+                    chosen = [(k, p) for k, p in zip(unsure, picks) if p in self.experts]
+                    if chosen:
+                        ks, names = [k for k, _ in chosen], [p for _, p in chosen]
+                        if self.mc is None:
+                            expert_logits = backend.run_tail(shared[ks], cut, names)
+                        else:
+                            expert_logits = mc_scores(self.mc.sample(backend, shared[ks], cut, names))["logits"]
+                        for j, (k, p) in enumerate(chosen):
+                            logits_out[rows[k]] = expert_logits[j]
+                            experts_out[rows[k]] = p
+                elif unsure:
+                    n_exp = len(self.experts)
+                    batch = shared[unsure].repeat_interleave(n_exp, dim=0)
+                    if self.mc is None:
+                        expert_logits = backend.run_tail(batch, cut, self.experts * len(unsure))
+                    else:
+                        samples = self.mc.sample(backend, batch, cut, self.experts * len(unsure))
+                        expert_logits = mc_scores(samples)["logits"]
+                    expert_logits = expert_logits.view(len(unsure), n_exp, -1)
+                    best = shannon_entropy(expert_logits).argmin(dim=-1).tolist()
+                    for j, (k, b) in enumerate(zip(unsure, best)):
+                        logits_out[rows[k]] = expert_logits[j, b]
+                        experts_out[rows[k]] = self.experts[b]
+
+            # 4. Routed / early-exit rows: one routed tail per exit point
+            for row_ids, start, resume, experts in tails:
+                logits = backend.run_tail(resume, start, experts)
+                for k, row in enumerate(row_ids):
+                    logits_out[row] = logits[k]
+                    experts_out[row] = experts[k]
+
+        return self._format(torch.stack(logits_out), experts_out, base_entropy, mixes)
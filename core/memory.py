@@ -0,0 +1,170 @@
+import re
+import resource
+from contextlib import contextmanager, nullcontext
+
+import torch
+from torch.multiprocessing.reductions import StorageWeakRef
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_flatten
+from torch.utils.checkpoint import checkpoint
+
+MB = 1024 ** 2
+# Extrapolation target (tensor bytes only); the measured check below uses the full budget
+HEADROOM = 0.9
+
+
+def static_bytes(model):
+    """Weights + buffers, plus grad and the two AdamW moments for every trainable parameter."""
+    weights = sum(t.numel() * t.element_size() for t in list(model.parameters()) + list(model.buffers()))
+    trainable = sum(p.numel() * p.element_size() for p in model.parameters() if p.requires_grad)
+    return weights + 3 * trainable
+
+
+@contextmanager
+def checkpointed(stages):
+    """
+    Activation checkpointing per ResNet stage: only each stage's input is kept,
+    its internals are recomputed during backward (one stage at a time).
+    """
+    for _, stage in stages:
+        stage.forward = lambda *a, f=stage.forward: checkpoint(f, *a, use_reentrant=False)
+    try:
+        yield
+    finally:
+        for _, stage in stages:
+            del stage.forward
+
+
+def autocast(device, bf16: bool):
+    return torch.autocast(torch.device(device).type, dtype=torch.bfloat16) if bf16 else nullcontext()
+
+
+def _proc_status_mb(field):
+    with open("/proc/self/status") as f:
+        return int(re.search(rf"{field}:\s+(\d+)", f.read()).group(1)) / 1024
+
+
+def reset_peak_memory(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    else:
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")  # Linux: resets the RSS high-water mark
+        except OSError:
+            pass
+
+
+def peak_memory_mb(device):
+    """CUDA: peak allocated since reset_peak_memory. CPU: the process' peak RSS (since reset on Linux)."""
+    if torch.device(device).type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / MB
+    try:
+        return _proc_status_mb("VmHWM")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux, never resets
+
+
+def _memory_mb(device):
+    if torch.device(device).type == "cuda":
+        return torch.cuda.memory_allocated(device) / MB
+    try:
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _PeakTracker(TorchDispatchMode):
+    """
+    Peak bytes of live tensors (unique storages) created while active, forward and backward,
+    on any device: every op's outputs are tracked until their storage is freed.
+    """
+    def __init__(self):
+        super().__init__()
+        self.live = {}
+        self.current = 0
+        self.peak = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        for key in [k for k, (ref, _) in self.live.items() if ref.expired()]:
+            self.current -= self.live.pop(key)[1]
+        for t in tree_flatten(out)[0]:
+            if isinstance(t, torch.Tensor):
+                storage = t.untyped_storage()
+                if storage.nbytes() and storage.data_ptr() not in self.live:
+                    self.live[storage.data_ptr()] = (StorageWeakRef(storage), storage.nbytes())
+                    self.current += storage.nbytes()
+        self.peak = max(self.peak, self.current)
+        return out
+
+
+def _probe_step(model, forward, x, bf16: bool, checkpoint_stages):
+    """One forward + backward, no optimizer step; grads are cleared afterwards."""
+    with checkpointed(checkpoint_stages) if checkpoint_stages else nullcontext(), autocast(x.device, bf16):
+        out = forward(x)
+    out.float().sum().backward()
+    for p in model.parameters():
+        p.grad = None
+
+
+def plan_micro_batch(model, forward, sample, batch_size: int, budget_mb: float, stages, device):
+    """
+    Largest micro-batch (<= batch_size) whose training step fits budget_mb
+    (weights + optimizer state + the step's tensors; the interpreter itself is not counted).
+    Tries fp32, then checkpointing, then checkpointing + bf16 autocast, and stops at the
+    first that fits the whole batch. Step memory is linear in the batch: tensor bytes are
+    tracked over probe steps at 1 and 2 samples, extrapolated, then one real step at that
+    size is measured (CUDA allocator / process RSS) and the micro-batch shrunk until it fits.
+    No optimizer step is taken and BatchNorm stats are restored.
+    stages: the trainable stages checkpointing would wrap.
+    """
+    buffers = {k: v.clone() for k, v in model.state_dict().items() if "running" in k or "num_batches" in k}
+    was_training = model.training
+    model.train()
+    static = static_bytes(model)
+
+    def batch(n):
+        return sample.expand(n, *sample.shape).float().to(device)
+
+    def measured(n, bf16, ckpt):
+        x = batch(n)
+        reset_peak_memory(device)
+        before = _memory_mb(device)
+        _probe_step(model, forward, x, bf16, ckpt)
+        return static / MB + x.numel() * x.element_size() / MB + peak_memory_mb(device) - before
+
+    best = None
+    try:
+        for bf16, checkpointing in ((False, False), (False, True), (True, True)):
+            ckpt = stages if checkpointing else None
+            used = []
+            for n in (1, 2):
+                tracker = _PeakTracker()
+                x = batch(n)
+                with tracker:
+                    _probe_step(model, forward, x, bf16, ckpt)
+                used.append(tracker.peak + x.numel() * x.element_size())
+            per_sample = max(used[1] - used[0], 1)
+            fixed = used[0] - per_sample
+            micro = min(batch_size, int((budget_mb * MB * HEADROOM - static - fixed) // per_sample))
+
+            mb = None
+            while micro >= 1:
+                # RSS misses heap already retained by earlier probes: never below the tracked tensors
+                mb = max(measured(micro, bf16, ckpt), (static + fixed + per_sample * micro) / MB)
+                if mb <= budget_mb:
+                    break
+                micro = min(micro - 1, int(micro * budget_mb / mb))
+            plan = {"micro_batch": max(micro, 0), "bf16": bf16, "checkpointing": checkpointing, "measured_mb": mb}
+            if best is None or plan["micro_batch"] > best["micro_batch"]:
+                best = plan
+            if micro >= batch_size:
+                break
+    finally:
+        model.load_state_dict(buffers, strict=False)
+        model.train(was_training)
+    if best["micro_batch"] < 1:
+        need = (static + fixed + per_sample) / MB
+        raise ValueError(f"memory_budget_mb={budget_mb} is too small: one sample needs ~{need:.0f} MB")
+    return best
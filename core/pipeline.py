@@ -0,0 +1,172 @@
+import queue
+import threading
+import time
+
+_STOP = object()  # Sentinel pushed through the queues on shutdown
+
+
+class FrameQueue:
+    """
+    Bounded queue between two stages.
+    policy="drop_oldest": a full queue discards its oldest item so latency stays bounded.
+    policy="block": the producer waits (no frame is ever lost).
+    """
+    def __init__(self, maxsize: int = 2, policy: str = "drop_oldest", abort: threading.Event = None):
+        if policy not in ("drop_oldest", "block"):
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.q = queue.Queue(maxsize=maxsize)
+        self.policy = policy
+        self.abort = abort or threading.Event()
+        self.dropped = 0
+
+    def put(self, item):
+        if item is _STOP or self.policy == "block":
+            # Blocking put that gives up once the pipeline is shutting down
+            while not self.abort.is_set():
+                try:
+                    self.q.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            return
+        while True:
+            try:
+                self.q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float = 0.1):
+        return self.q.get(timeout=timeout)
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self.started = time.perf_counter()
+
+    def record(self, seconds):
+        self.items += 1
+        self.busy_s += seconds
+
+    def summary(self):
+        wall = time.perf_counter() - self.started
+        fps = self.items / wall if wall > 0 else 0.0
+        ms = self.busy_s / self.items * 1000 if self.items else 0.0
+        return f"{self.name:<12} {self.items:>6} items | {fps:6.1f} items/s | {ms:7.2f} ms/item"
+
+
+class FramePipeline:
+    """
+    Capture -> [stage threads] -> sink, connected by bounded FrameQueues.
+    FPS is bounded by the slowest stage instead of the sum of all stages.
+    The sink runs in the caller's thread (cv2.imshow must stay on the main thread).
+    An exception in the source or a stage stops the whole pipeline and is re-raised by run().
+    """
+    def __init__(self, source, stages, queue_size: int = 2, drop_policy: str = "drop_oldest"):
+        """
+        source: callable returning the next item, or None when the stream ends.
+        stages: list of (name, fn) run in order, each in its own thread.
+        """
+        self.source = source
+        self.stages = stages
+        self.stop_event = threading.Event()
+        self.queues = [FrameQueue(queue_size, drop_policy, self.stop_event) for _ in range(len(stages) + 1)]
+        self.stats = [StageStats("capture")] + [StageStats(name) for name, _ in stages] + [StageStats("sink")]
+        self.threads = []
+        self.error = None
+
+    def _fail(self, error):
+        """Called from a dying thread: keep the first error and shut every other thread down."""
+        if self.error is None:
+            self.error = error
+            print(f"❌ [Pipeline] '{threading.current_thread().name}' failed: {type(error).__name__}: {error}")
+        self.stop_event.set()
+
+    def _capture_loop(self):
+        out, stats = self.queues[0], self.stats[0]
+        while not self.stop_event.is_set():
+            t0 = time.perf_counter()
+            try:
+                item = self.source()
+            except Exception as e:
+                self._fail(e)
+                break
+            if item is None:
+                break
+            stats.record(time.perf_counter() - t0)
+            out.put(item)
+        out.put(_STOP)
+
+    def _stage_loop(self, idx, fn):
+        inp, out, stats = self.queues[idx], self.queues[idx + 1], self.stats[idx + 1]
+        while True:
+            try:
+                item = inp.get()
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    break
+                continue
+            if item is _STOP:
+                break
+            t0 = time.perf_counter()
+            try:
+                result = fn(item)
+            except Exception as e:
+                self._fail(e)
+                break
+            stats.record(time.perf_counter() - t0)
+            out.put(result)
+        out.put(_STOP)
+
+    def start(self):
+        self.threads = [threading.Thread(target=self._capture_loop, name="capture", daemon=True)]
+        for idx, (name, fn) in enumerate(self.stages):
+            self.threads.append(threading.Thread(target=self._stage_loop, args=(idx, fn), name=name, daemon=True))
+        for t in self.threads:
+            t.start()
+
+    def run(self, sink):
+        """
+        Blocks, feeding results to sink(item). sink returns False to stop the pipeline.
+        Re-raises the first exception of the source or a stage.
+        """
+        self.start()
+        inp, stats = self.queues[-1], self.stats[-1]
+        try:
+            while True:
+                try:
+                    item = inp.get()
+                except queue.Empty:
+                    if self.stop_event.is_set() and not any(t.is_alive() for t in self.threads):
+                        break
+                    continue
+                if item is _STOP:
+                    break
+                t0 = time.perf_counter()
+                keep_going = sink(item)
+                stats.record(time.perf_counter() - t0)
+                if keep_going is False:
+                    break
+        finally:
+            self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join(timeout=1.0)
+
+    def report(self):
+        print("\n--- PIPELINE THROUGHPUT ---")
+        for s in self.stats:
+            print(s.summary())
+        drops = {name: q.dropped for name, q in zip([s.name for s in self.stats[1:]], self.queues)}
+        print(f"Dropped (drop-oldest) before stage: {drops}")
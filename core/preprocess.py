@@ -0,0 +1,99 @@
+import torch
+import torch.nn.functional as F
+from torchvision.io import ImageReadMode, decode_image, read_file
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def load_image(path: str) -> torch.Tensor:
+    """Decodes straight to a uint8 (3, H, W) RGB tensor (no PIL)."""
+    return decode_image(read_file(path), mode=ImageReadMode.RGB)
+
+
+def decode_bytes(data: bytes) -> torch.Tensor:
+    """Same as load_image() for an encoded JPEG/PNG already in memory (e.g. a request body)."""
+    return decode_image(torch.frombuffer(bytearray(data), dtype=torch.uint8), mode=ImageReadMode.RGB)
+
+
+class TensorPreprocessor:
+    """
+    Vectorized replacement for the ResNet-50 AutoImageProcessor.
+    Same recipe (shortest edge -> 224 / crop_pct, bicubic, center crop, normalize)
+    done with tensor ops on whole batches, on any device.
+
+    Accepts uint8 arrays or tensors: HWC, BHWC, CHW, BCHW, or a list of them
+    (same-size images are processed as one batch).
+    """
+    def __init__(self, shortest_edge: int = 224, crop_pct: float = 0.875,
+                 mean=IMAGENET_MEAN, std=IMAGENET_STD, device: str = "cpu"):
+        self.shortest_edge = shortest_edge
+        self.crop_pct = crop_pct
+        self.device = device
+        std = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        # (x / 255 - mean) / std folded into one multiply-add
+        self.offset = (torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1) * 255).to(device)
+        self.scale = (1.0 / (255.0 * std)).to(device)
+
+    @classmethod
+    def from_processor(cls, processor, device: str = "cpu"):
+        """Reads size/crop/mean/std from a HF image processor so both paths stay in sync."""
+        return cls(
+            shortest_edge=processor.size["shortest_edge"],
+            crop_pct=processor.crop_pct if processor.crop_pct is not None else 0.875,
+            mean=processor.image_mean,
+            std=processor.image_std,
+            device=device,
+        )
+
+    @staticmethod
+    def _to_bchw(image):
+        t = image if isinstance(image, torch.Tensor) else torch.from_numpy(image)
+        if t.dim() == 3:
+            t = t.unsqueeze(0)
+        if t.shape[1] not in (1, 3, 4) and t.shape[-1] in (1, 3, 4):
+            t = t.permute(0, 3, 1, 2)  # BHWC -> BCHW (a view, no copy)
+        if t.shape[1] == 1:
+            t = t.expand(-1, 3, -1, -1)
+        return t[:, :3]
+
+    def _resize_crop(self, t):
+        h, w = t.shape[-2:]
+        if self.shortest_edge >= 384:
+            # The processor warps large sizes straight to a square, no crop
+            return F.interpolate(t, size=(self.shortest_edge, self.shortest_edge),
+                                 mode="bicubic", align_corners=False, antialias=True)
+
+        resize_short = int(self.shortest_edge / self.crop_pct)
+        if h <= w:
+            size = (resize_short, int(resize_short * w / h))
+        else:
+            size = (int(resize_short * h / w), resize_short)
+        t = F.interpolate(t, size=size, mode="bicubic", align_corners=False, antialias=True)
+
+        top = (size[0] - self.shortest_edge) // 2
+        left = (size[1] - self.shortest_edge) // 2
+        return t[..., top:top + self.shortest_edge, left:left + self.shortest_edge]
+
+    def _process(self, t, bgr):
+        t = t.to(self.device, non_blocking=True)
+        if t.dtype == torch.uint8 and t.device.type == "cpu":
+            # uint8 channels_last has a fast SIMD resize path and rounds like the PIL reference
+            t = self._resize_crop(t.contiguous(memory_format=torch.channels_last)).float()
+        else:
+            # The reference path resizes uint8 images, so quantize the same way
+            t = self._resize_crop(t.float()).round_().clamp_(0, 255)
+        if bgr:
+            t = t.flip(1)
+        return (t - self.offset) * self.scale
+
+    @torch.no_grad()
+    def __call__(self, images, bgr: bool = False) -> torch.Tensor:
+        """Returns pixel_values (B, 3, crop, crop). bgr=True takes raw cv2 frames."""
+        if not isinstance(images, (list, tuple)):
+            return self._process(self._to_bchw(images), bgr)
+
+        batches = [self._to_bchw(img) for img in images]
+        if all(b.shape[-2:] == batches[0].shape[-2:] for b in batches):
+            return self._process(torch.cat(batches), bgr)
+        return torch.cat([self._process(b, bgr) for b in batches])
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.preprocess import decode_bytes
+
+
+class UndecodableImage(ValueError):
+    """A request body that is not a decodable image (the client's fault: 422, not 500)."""
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into micro-batches for one gated forward.
+    A batch closes at max_batch_size requests or max_wait_ms after its first
+    request, whichever comes first. Decode, preprocessing and the model run on
+    a single worker thread so the event loop keeps accepting connections.
+    """
+    def __init__(self, system, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        self.system = system
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine")
+        self.stats = {"requests": 0, "batches": 0, "errors": 0}
+
+    async def submit(self, image_bytes: bytes) -> dict:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image_bytes, time.perf_counter(), future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _infer(self, payloads):
+        """One result per payload: a result dict, or the exception for an undecodable image."""
+        results, images = [], []
+        for payload in payloads:
+            try:
+                images.append(decode_bytes(payload))
+                results.append(None)
+            except RuntimeError as e:
+                results.append(UndecodableImage(f"could not decode image: {e}"))
+        if images:
+            predictions = iter(self.system.predict_batch(self.system.preprocessor(images)))
+            results = [next(predictions) if r is None else r for r in results]
+        return results
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            try:
+                results = await loop.run_in_executor(self.executor, self._infer, [b[0] for b in batch])
+            except Exception as e:
+                # Model failure: every client in the batch gets the error, the server keeps going
+                self.stats["errors"] += len(batch)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            done = time.perf_counter()
+            for (_, queued, future), result in zip(batch, results):
+                if future.done():  # Client went away
+                    continue
+                if isinstance(result, Exception):
+                    self.stats["errors"] += 1
+                    future.set_exception(result)
+                    continue
+                result["batch_size"] = len(batch)
+                result["latency_ms"] = (done - queued) * 1000
+                future.set_result(result)
+
+    def summary(self):
+        batches = max(self.stats["batches"], 1)
+        return {**self.stats, "avg_batch_size": self.stats["requests"] / batches}
+
+
+class InferenceServer:
+    """
+    Minimal HTTP/1.1 front end (no web framework) over TCP or a Unix socket.
+      POST /predict   body = encoded image -> prediction, confidence, entropy, expert, ...
+      GET  /health    loaded experts + batching stats
+    Connections are keep-alive, so one client can pipeline many requests.
+    """
+    def __init__(self, system, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        self.system = system
+        self.batcher = MicroBatcher(system, max_batch_size, max_wait_ms)
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    @staticmethod
+    def _response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+
+    async def _route(self, method, path, body):
+        if method == "POST" and path == "/predict":
+            if not body:
+                return "400 Bad Request", {"error": "empty body, expected an encoded image"}
+            try:
+                return "200 OK", await self.batcher.submit(body)
+            except UndecodableImage as e:
+                return "422 Unprocessable Entity", {"error": str(e)}
+            except Exception as e:
+                # Engine failure (OOM, shape bug, ...): a server error, not bad input
+                print(f"❌ [Server] Inference failed: {type(e).__name__}: {e}")
+                return "500 Internal Server Error", {"error": f"inference failed: {type(e).__name__}: {e}"}
+        if method == "GET" and path == "/health":
+            return "200 OK", {"status": "ok", "experts": self.system.experts, **self.batcher.summary()}
+        return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    self._response(writer, "400 Bad Request", {"error": "malformed request"}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "keep-alive").lower() != "close"
+                status, payload = await self._route(method, path, body)
+                self._response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080, unix_socket: str = None):
+        worker = asyncio.create_task(self.batcher.run())
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+            where = unix_socket
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"🌐 [Server] Listening on {where} | Batch <= {self.batcher.max_batch_size}, "
+              f"wait <= {self.batcher.max_wait * 1000:.0f} ms")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            worker.cancel()
+            self.batcher.executor.shutdown(wait=False)
@@ -0,0 +1,110 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from core.preprocess import load_image
+
+MANIFEST = "shards.json"
+
+
+def is_shard_dir(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST))
+
+
+def decode_resized(path: str, size: int = 256) -> torch.Tensor:
+    """JPEG -> uint8 (3, size, size), same squash as transforms.Resize((size, size)) (bilinear, antialiased)."""
+    image = load_image(path).unsqueeze(0).float()
+    image = F.interpolate(image, size=(size, size), mode="bilinear", align_corners=False, antialias=True)
+    return image.round_().clamp_(0, 255).to(torch.uint8)[0]
+
+
+def pack_shards(paths, labels, classes, out_dir: str, size: int = 256, shard_size: int = 2048, workers: int = 8):
+    """
+    One-time packing: decode + resize every image once and write uint8 (N, 3, size, size)
+    .npy shards plus labels.npy. Shards are filled through open_memmap (constant memory);
+    the manifest is written last, so a half-packed directory is never picked up.
+    Unreadable images are skipped (listed in the manifest).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    kept_paths, kept_labels, skipped, shards = [], [], [], []
+
+    def decode(path):
+        try:
+            return decode_resized(path, size)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(paths), shard_size):
+            chunk = list(range(start, min(start + shard_size, len(paths))))
+            images = list(pool.map(decode, [paths[i] for i in chunk]))
+            good = [(i, img) for i, img in zip(chunk, images) if isinstance(img, torch.Tensor)]
+            for i, img in zip(chunk, images):
+                if not isinstance(img, torch.Tensor):
+                    print(f"⚠️ [Shards] Skipping unreadable image {paths[i]}: {img}")
+                    skipped.append(paths[i])
+            if not good:
+                continue
+
+            name = f"shard_{len(shards):05d}.npy"
+            out = np.lib.format.open_memmap(
+                os.path.join(out_dir, name), mode="w+", dtype=np.uint8, shape=(len(good), 3, size, size)
+            )
+            for row, (i, img) in enumerate(good):
+                out[row] = img.numpy()
+                kept_paths.append(paths[i])
+                kept_labels.append(labels[i])
+            out.flush()
+            del out
+            shards.append({"file": name, "count": len(good)})
+            print(f"📦 [Shards] {name}: {len(good)} images")
+
+    np.save(os.path.join(out_dir, "labels.npy"), np.asarray(kept_labels, dtype=np.int64))
+    manifest = {
+        "size": size,
+        "classes": list(classes),
+        "shards": shards,
+        "paths": kept_paths,
+        "skipped": skipped,
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+class ImageShards:
+    """
+    Read side of pack_shards(): shards opened memory-mapped (copy-on-write),
+    so an image is a zero-copy (3, size, size) uint8 view; pages load on first touch.
+    """
+    def __init__(self, shard_dir: str):
+        with open(os.path.join(shard_dir, MANIFEST), 'r') as f:
+            self.manifest = json.load(f)
+        self.dir = shard_dir
+        self.size = self.manifest["size"]
+        self.classes = self.manifest["classes"]
+        self.paths = self.manifest["paths"]
+        self.labels = np.load(os.path.join(shard_dir, "labels.npy")).tolist()
+        counts = [s["count"] for s in self.manifest["shards"]]
+        self.offsets = np.cumsum([0] + counts)
+        self._open = {}
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _shard(self, s):
+        # Opened lazily: DataLoader workers each map their own view after fork
+        if s not in self._open:
+            path = os.path.join(self.dir, self.manifest["shards"][s]["file"])
+            self._open[s] = np.load(path, mmap_mode="c")
+        return self._open[s]
+
+    def __getitem__(self, idx):
+        s = int(np.searchsorted(self.offsets, idx, side="right")) - 1
+        return torch.from_numpy(self._shard(s)[idx - self.offsets[s]])
@@ -8,6 +8,7 @@ import sys
 # Try to import Phase 4 brain (Handle missing module gracefully)
 try:
     from core.inference import DynamicEdgeSystem
+    from core.gate.temporal import TemporalGate
 except ImportError:
     DynamicEdgeSystem = None
 
@@ -36,10 +37,10 @@ def auto_detect_bdd_path(root="data"):
     print("❌ [System] Could not find BDD100K images. Please place them in 'data/'")
     return None
 
-def run_simulation(image_dir):
-    if DynamicEdgeSystem is None:
-        print("\n⚠️  [System] Core Inference engine not found. Phase 4 pending.")
-        return
+def build_system(bundle=None):
+    if bundle:
+        # Exported ONNX bundle: no transformers / peft cold start
+        return DynamicEdgeSystem.from_bundle(bundle)
 
     system = DynamicEdgeSystem(base_model_name="microsoft/resnet-50")
     
@@ -53,6 +54,45 @@ def run_simulation(image_dir):
     for name, path in experts.items():
         if os.path.exists(path):
             system.load_adapter(path, name)
+    return system
+
+def run_video(video_path, config_path="configs/gate/temporal.yaml", bundle=None):
+    """Stream mode: the gate re-evaluates every N frames or on a scene change."""
+    if DynamicEdgeSystem is None:
+        print("\n⚠️  [System] Core Inference engine not found. Phase 4 pending.")
+        return
+
+    import cv2
+    import yaml
+
+    system = build_system(bundle)
+    with open(config_path, 'r') as f:
+        gate = TemporalGate.from_config(yaml.safe_load(f))
+    system.enable_stream_mode(gate)
+
+    cap = cv2.VideoCapture(video_path)
+    print(f"\n🎥 [Demo] Streaming: {video_path}")
+    start = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret: break
+        result = system.predict_frame(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if gate.stats["frames"] % 30 == 0:
+            print(f"🎞️ Frame {gate.stats['frames']} -> {result['prediction']} ({result['confidence']:.2f}) | {result['expert']}")
+    cap.release()
+
+    elapsed = time.perf_counter() - start
+    stats = gate.stats
+    print(f"\n✅ {stats['frames']} frames in {elapsed:.1f}s ({stats['frames'] / max(elapsed, 1e-9):.1f} FPS)")
+    print(f"   Gate evaluations: {stats['evaluations']} | Scene changes: {stats['scene_changes']} | "
+          f"Expert switches: {stats['switches']} | set_adapter calls: {system.adapter_switches}")
+
+def run_simulation(image_dir, bundle=None):
+    if DynamicEdgeSystem is None:
+        print("\n⚠️  [System] Core Inference engine not found. Phase 4 pending.")
+        return
+
+    system = build_system(bundle)
 
     print(f"\n🚗 [Demo] Starting Simulation using images from: {image_dir}")
     images = random.sample(glob.glob(os.path.join(image_dir, "*.jpg")), 5)
@@ -65,10 +105,16 @@ def run_simulation(image_dir):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_root", default="data", help="Root folder to scan")
+    parser.add_argument("--video", default=None, help="Video file to run in stream mode instead")
+    parser.add_argument("--bundle", default=None, help="Exported ONNX bundle dir (e.g. deploy/onnx)")
     args = parser.parse_args()
+
+    if args.video:
+        run_video(args.video, bundle=args.bundle)
+        sys.exit(0)
     
     # Auto-detect logic
     img_path = auto_detect_bdd_path(args.data_root)
     
     if img_path:
-        run_simulation(img_path)
+        run_simulation(img_path, args.bundle)
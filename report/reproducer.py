@@ -1,40 +1,62 @@
 import torch
-import torch.nn.functional as F
 from transformers import AutoImageProcessor, ResNetForImageClassification
-from PIL import Image
-import numpy as np
+import sys
 import os
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.preprocess import TensorPreprocessor, load_image
+from core.gate.scores import uncertainty_scores
+from core.factory import AdapterFactory
+from core.cache import FeatureCache
+
 # Setup
 device = "cuda" if torch.cuda.is_available() else "cpu"
 model_id = "microsoft/resnet-50"
 processor = AutoImageProcessor.from_pretrained(model_id)
+preprocessor = TensorPreprocessor.from_processor(processor, device)
 model = ResNetForImageClassification.from_pretrained(model_id).to(device)
 model.eval()
 
 DOMAINS = ["test_sunny", "test_rain", "test_night"]
 COLORS = ['#2ecc71', '#e74c3c', '#e67e22'] # Green, Red, Orange
 
+BATCH_SIZE = 32
+# Tuned by scripts/tune_gate.py
+THRESHOLD = AdapterFactory.load_config("configs/gate/thresholds.yaml")['gate']['threshold']
+# Regenerating the report reads logits from the content-addressed cache
+cache = FeatureCache()
+base_cache = cache.namespace(model_id)
+
+def forward(paths):
+    """Corrupt images get NaN rows (cached too, so they are not decoded again)."""
+    images, ok = [], []
+    for p in paths:
+        try:
+            images.append(load_image(p))
+            ok.append(True)
+        except Exception as e:
+            print(f"Skipping corrupt image: {os.path.basename(p)}")
+            ok.append(False)
+    logits = torch.full((len(paths), model.config.num_labels), float("nan"))
+    pooled = torch.full((len(paths), model.config.hidden_sizes[-1]), float("nan"))
+    if images:
+        with torch.no_grad():
+            features = model.resnet(preprocessor(images)).pooler_output.flatten(1)
+            rows = torch.tensor(ok)
+            logits[rows] = model.classifier(features).cpu()
+            pooled[rows] = features.cpu()
+    return {"base": (logits, pooled)}
+
+
 def get_avg_entropy(folder_name):
     path = f"data/{folder_name}"
     if not os.path.exists(path): return 0.0
     
-    entropies = []
-    for img_name in os.listdir(path):
-        if img_name.lower().endswith(('.jpg', '.png')):
-            try:
-                img = Image.open(os.path.join(path, img_name)).convert("RGB")
-                inputs = processor(img, return_tensors="pt").to(device)
-                with torch.no_grad():
-                    logits = model(**inputs).logits
-                probs = F.softmax(logits, dim=-1)
-                ent = -torch.sum(probs * torch.log(probs + 1e-9), dim=-1).item()
-                entropies.append(ent)
-            except Exception as e:
-                print(f"Skipping corrupt image: {img_name}")
-            
-    return np.mean(entropies) if entropies else 0.0
+    files = [os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(('.jpg', '.png'))]
+    logits, _ = cache.read_through({"base": base_cache}, files, forward, BATCH_SIZE)["base"]
+    logits = logits[~logits.isnan().any(dim=-1)]
+    return uncertainty_scores(logits)["entropy"].mean().item() if len(logits) else 0.0
 
 
 def visualize():
@@ -46,7 +68,7 @@ def visualize():
     bars = plt.bar(labels, results, color=COLORS, alpha=0.8, edgecolor='black')
     
     # Add Threshold Line
-    plt.axhline(y=1.0, color='gray', linestyle='--', linewidth=2, label='Uncertainty Threshold (1.0)')
+    plt.axhline(y=THRESHOLD, color='gray', linestyle='--', linewidth=2, label=f'Uncertainty Threshold ({THRESHOLD:.2f})')
     
     plt.ylabel("Shannon Entropy (Uncertainty)")
     plt.title("ResNet-50 Failure Analysis: Domain Shift")
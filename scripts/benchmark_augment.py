@@ -0,0 +1,57 @@
+import argparse
+import time
+import sys
+import os
+import torch
+from torch.utils.data import DataLoader
+
+# Fix path to allow importing from 'core'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.dataset import RobustDataset
+from core.augment import BatchAugment
+
+def samples_per_sec(dataset, args, augment=None, max_batches=20):
+    """Training input pipeline only: load + augment, up to the device, no model."""
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=True, num_workers=args.workers)
+    start, n = time.perf_counter(), 0
+    for i, (images, _) in enumerate(loader):
+        images = images.to(args.device)
+        if augment is not None:
+            images = augment(images)
+        n += images.shape[0]
+        if i + 1 >= max_batches:
+            break
+    if args.device == "cuda":
+        torch.cuda.synchronize()
+    return n / (time.perf_counter() - start)
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_dir", type=str, required=True, help="Class folders of JPEGs (e.g. data/bdd_scenes)")
+    parser.add_argument("--shard_dir", type=str, default=None, help="Same data packed by scripts/pack_shards.py")
+    parser.add_argument("--recursive", action="store_true")
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    args = parser.parse_args()
+
+    legacy = RobustDataset(args.data_dir, is_training=True, recursive=args.recursive)
+    legacy.draft_size = None
+    runs = [
+        ("Per-sample PIL (full decode)", legacy, None),
+        ("Per-sample PIL (draft decode)", RobustDataset(args.data_dir, is_training=True, recursive=args.recursive), None),
+        ("Draft decode + BatchAugment", RobustDataset(args.data_dir, recursive=args.recursive, raw=True), BatchAugment()),
+    ]
+    if args.shard_dir:
+        runs.append(("Shards + BatchAugment", RobustDataset(args.shard_dir, raw=True), BatchAugment()))
+
+    print(f"\n--- INPUT PIPELINE ({args.device.upper()}, batch {args.batch_size}, {args.workers} workers) ---")
+    baseline = None
+    for label, dataset, augment in runs:
+        rate = samples_per_sec(dataset, args, augment)
+        baseline = baseline or rate
+        print(f"{label:<32} {rate:>7.0f} img/s ({rate / baseline:.1f}x)")
+
+if __name__ == "__main__":
+    run_benchmark()
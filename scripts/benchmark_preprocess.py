@@ -0,0 +1,66 @@
+import argparse
+import glob
+import sys
+import os
+import time
+import numpy as np
+import torch
+from PIL import Image
+from transformers import AutoImageProcessor
+
+# Fix path to allow importing from 'core'
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.preprocess import TensorPreprocessor, load_image
+
+def time_per_image(fn, n_images, repeats):
+    fn()  # Pre-warm
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / (repeats * n_images) * 1000
+
+def run_benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", default=None, help="Folder of .jpg frames (default: synthetic 1280x720 BDD-sized frames)")
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--model_id", default="microsoft/resnet-50")
+    args = parser.parse_args()
+
+    processor = AutoImageProcessor.from_pretrained(args.model_id)
+    preprocessor = TensorPreprocessor.from_processor(processor)
+
+    # 1. Frames as uint8 RGB arrays (what a camera / decoder hands us)
+    if args.images:
+        paths = sorted(glob.glob(os.path.join(args.images, "*.jpg")))[:args.batch]
+        frames = [load_image(p).permute(1, 2, 0).numpy() for p in paths]
+    else:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8) for _ in range(args.batch)]
+    if not frames:
+        print("❌ Error: No images found.")
+        return
+    print(f"📸 {len(frames)} frames of {frames[0].shape}")
+
+    # 2. Numerical equivalence with the HF processor
+    reference = torch.cat([processor(Image.fromarray(f), return_tensors="pt")["pixel_values"] for f in frames])
+    ours = preprocessor(frames)
+    max_diff = (reference - ours).abs().max().item()
+    print(f"Max |diff| vs AutoImageProcessor: {max_diff:.4f} (one uint8 level = {1 / 255 / 0.225:.4f})")
+
+    # 3. Speed
+    results = {
+        "AutoImageProcessor (PIL, per image)": lambda: [processor(Image.fromarray(f), return_tensors="pt") for f in frames],
+        "TensorPreprocessor (per image)": lambda: [preprocessor(f) for f in frames],
+        "TensorPreprocessor (batched)": lambda: preprocessor(frames),
+    }
+    print("\n--- PREPROCESSING LATENCY ---")
+    baseline = None
+    for label, fn in results.items():
+        ms = time_per_image(fn, len(frames), args.repeats)
+        baseline = baseline or ms
+        print(f"{label:<38} {ms:7.2f} ms/image | {baseline / ms:5.2f}x")
+
+if __name__ == "__main__":
+    run_benchmark()
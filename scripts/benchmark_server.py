@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+async def client(host, port, images, n_requests, latencies, experts):
+    """One keep-alive connection sending requests back to back."""
+    reader, writer = await asyncio.open_connection(host, port)
+    for i in range(n_requests):
+        body = images[i % len(images)]
+        start = time.perf_counter()
+        writer.write(
+            f"POST /predict HTTP/1.1\r\nHost: {host}\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+        headers = {}
+        status = await reader.readline()
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+        payload = json.loads(await reader.readexactly(int(headers["content-length"])))
+        latencies.append((time.perf_counter() - start) * 1000)
+        if b"200" in status:
+            experts[payload["expert"]] += 1
+    writer.close()
+
+async def run_load(host, port, images, clients, per_client):
+    latencies, experts = [], Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*[client(host, port, images, per_client, latencies, experts) for _ in range(clients)])
+    wall = time.perf_counter() - start
+    return latencies, experts, wall
+
+def benchmark():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image_dir", type=str, default="data/bdd_scenes", help="Images to send (searched recursively)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="Concurrency levels to test")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per client")
+    args = parser.parse_args()
+
+    # 1. Encoded images, read once (the server does the decoding)
+    paths = sorted(glob.glob(os.path.join(args.image_dir, "**", "*.jpg"), recursive=True))[:64]
+    if not paths:
+        print(f"❌ [Load] No .jpg images under {args.image_dir}")
+        return
+    images = []
+    for p in paths:
+        with open(p, "rb") as f:
+            images.append(f.read())
+
+    # 2. Sweep concurrency
+    print(f"🚀 [Load] {len(images)} images -> http://{args.host}:{args.port}/predict")
+    for clients in args.clients:
+        latencies, experts, wall = asyncio.run(run_load(args.host, args.port, images, clients, args.requests))
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"   {clients:3d} clients | {len(latencies) / wall:7.1f} req/s | "
+              f"p50 {p50:6.1f} ms | p95 {p95:6.1f} ms | experts {dict(experts)}")
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,10 +1,14 @@
 import torch
-import torch.nn.functional as F
 from transformers import AutoImageProcessor, ResNetForImageClassification
-from PIL import Image
-import numpy as np
+import sys
 import os
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.preprocess import TensorPreprocessor, load_image
+from core.gate.scores import uncertainty_scores
+from core.factory import AdapterFactory
+from core.cache import FeatureCache
+
 # 1. SETUP
 device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
 print(f"Running Baseline Evaluation on: {device.upper()}")
@@ -13,15 +17,25 @@ print(f"Running Baseline Evaluation on: {device.upper()}")
 print("Loading standard ResNet-50 (ImageNet Pre-trained)...")
 model_id = "microsoft/resnet-50"
 processor = AutoImageProcessor.from_pretrained(model_id)
+preprocessor = TensorPreprocessor.from_processor(processor, device)
 model = ResNetForImageClassification.from_pretrained(model_id).to(device)
 model.eval()
+BATCH_SIZE = 32
+# Tuned by scripts/tune_gate.py
+THRESHOLD = AdapterFactory.load_config("configs/gate/thresholds.yaml")['gate']['threshold']
+# Logits + features keyed by image content: reruns skip the network entirely
+cache = FeatureCache()
+base_cache = cache.namespace(model_id)
+
+def get_scores(logits):
+    """How confused is the model? Entropy, max-softmax, margin, energy per image (on-device)."""
+    return uncertainty_scores(logits)
 
-def get_entropy(logits):
-    """Calculates Shannon Entropy: How confused is the model?"""
-    probs = F.softmax(logits, dim=-1)
-    # Entropy = -sum(p * log(p))
-    entropy = -torch.sum(probs * torch.log(probs + 1e-9), dim=-1)
-    return entropy.item()
+def forward(paths):
+    pixel_values = preprocessor([load_image(p) for p in paths])
+    with torch.no_grad():
+        pooled = model.resnet(pixel_values).pooler_output.flatten(1)
+        return {"base": (model.classifier(pooled), pooled)}
 
 def evaluate_folder(folder_path, description):
     """Runs the model on a folder of images and tracks 'Confusion'."""
@@ -30,32 +44,25 @@ def evaluate_folder(folder_path, description):
         print(f"⚠️ Folder not found: {folder_path} (Skipping)")
         return
 
-    entropies = []
     image_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.jpg', '.png'))]
     
     if len(image_files) == 0:
         print("No images found.")
         return
 
-    for img_name in image_files:
-        img_path = os.path.join(folder_path, img_name)
-        image = Image.open(img_path).convert("RGB")
-        
-        inputs = processor(image, return_tensors="pt").to(device)
-        
-        with torch.no_grad():
-            logits = model(**inputs).logits
-            
-        # We don't care about the *class* (Cat vs Dog).
-        # We care about the *CONFIDENCE* (Entropy).
-        ent = get_entropy(logits)
-        entropies.append(ent)
+    paths = [os.path.join(folder_path, f) for f in image_files]
+    logits, _ = cache.read_through({"base": base_cache}, paths, forward, BATCH_SIZE)["base"]
         
-    avg_entropy = np.mean(entropies)
+    # We don't care about the *class* (Cat vs Dog).
+    # We care about the *CONFIDENCE* (Entropy).
+    scores = get_scores(logits)
+    means = dict(zip(scores, torch.stack([v.mean() for v in scores.values()]).tolist()))
+    avg_entropy = means["entropy"]
     print(f"Processed {len(image_files)} images.")
     print(f"Average Model Entropy (Confusion): {avg_entropy:.4f}")
+    print(f"Max-Softmax: {means['max_softmax']:.4f} | Margin: {means['margin']:.4f} | Energy: {means['energy']:.4f}")
     
-    if avg_entropy < 1.0:
+    if avg_entropy < THRESHOLD:
         print("✅ Verdict: Model is Confident.")
     else:
         print("❌ Verdict: Model is CONFUSED (Domain Shift Detected).")
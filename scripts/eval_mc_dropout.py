@@ -0,0 +1,101 @@
+import argparse
+import sys
+import os
+import time
+import torch
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.inference import DynamicEdgeSystem
+from core.cache import FeatureCache, read_through_engine
+from core.deploy import sample_domain_images
+from core.constants import BASE
+from core.gate.mc_dropout import MCDropout
+from core.gate.scores import mc_scores, uncertainty_scores
+from core.preprocess import load_image
+
+def timed(fn, iterations=5):
+    with torch.no_grad():
+        fn()  # Pre-warm
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def mc_domain_scores(backend, mc, pixel_values, expert):
+    """(MC predictive entropy, MC mutual information) per image."""
+    with torch.no_grad(), backend.frozen():
+        if expert is None:
+            # Base model: nothing adapted, so only the head is sampled
+            hidden = backend.run_stages(pixel_values, 0)
+            samples = mc.sample(backend, hidden, len(backend.stages))
+        else:
+            samples = mc.sample(backend, pixel_values, 0, [expert] * pixel_values.shape[0])
+    sampled = mc_scores(samples)
+    return torch.stack([sampled["entropy"], sampled["mutual_info"]])
+
+def evaluate():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/gate/mc_dropout.yaml", help="Path to YAML config")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    ecfg = cfg['eval']
+    mc = MCDropout.from_config(cfg)
+    # Naive MC-dropout: N separate full forwards with every adapter's dropout live
+    naive = MCDropout(samples=1, head_dropout=mc.head_dropout, sample_lora=True, start_stage="stem")
+
+    # 1. Engine + experts
+    system = DynamicEdgeSystem(cfg['model']['base_model'])
+    for name, path in cfg['experts'].items():
+        system.load_adapter(path, name)
+    backend = system.backend
+
+    # 2. Per domain: single-pass entropy vs MC predictive entropy / mutual information
+    print(f"\n🎲 [MC] {mc.samples} samples | head dropout {mc.head_dropout} | "
+          f"LoRA dropout from {mc.start_stage if mc.sample_lora else 'off'}")
+    cache = FeatureCache(ecfg['cache_dir'])
+    last_batch = None
+    for domain, paths in sample_domain_images(ecfg['image_dir'], ecfg['per_domain']).items():
+        if not paths:
+            continue
+        # Single-pass logits come from the cache; only the stochastic MC part is recomputed
+        single = read_through_engine(system, cache, cfg['model']['base_model'], cfg['experts'], paths, ecfg['batch_size'])
+        rows = {name: [] for name in [BASE] + system.experts}
+        for i in range(0, len(paths), ecfg['batch_size']):
+            last_batch = system.preprocessor([load_image(p) for p in paths[i:i + ecfg['batch_size']]])
+            for expert in rows:
+                rows[expert].append(mc_domain_scores(backend, mc, last_batch, None if expert == BASE else expert))
+
+        print(f"\n--- Domain: {domain.upper()} ({len(paths)} images) ---")
+        for expert, stats in rows.items():
+            entropy = uncertainty_scores(single[expert][0])["entropy"].mean()
+            pred, mi = torch.cat(stats, dim=1).mean(dim=1).tolist()
+            print(f"   {expert:<14} single-pass H: {entropy.item():.4f} | MC H: {pred:.4f} | MI: {mi:.4f}")
+
+    # 3. Cost: single-trunk vs naive N x full forward (one batch, first expert)
+    if last_batch is not None and system.experts:
+        experts = [system.experts[0]] * last_batch.shape[0]
+
+        def single_trunk():
+            with backend.frozen():
+                mc.sample(backend, last_batch, 0, experts)
+
+        def naive_mc():
+            with backend.frozen():
+                for _ in range(mc.samples):
+                    naive.sample(backend, last_batch, 0, experts)
+
+        def one_pass():
+            with backend.frozen():
+                backend.run_tail(last_batch, 0, experts)
+
+        base_ms = timed(one_pass)
+        naive_ms, fast_ms = timed(naive_mc), timed(single_trunk)
+        print(f"\n⏱️  [MC] Batch of {last_batch.shape[0]} | Single pass: {base_ms:.1f} ms | "
+              f"Naive {mc.samples}x: {naive_ms:.1f} ms ({naive_ms / base_ms:.1f}x) | "
+              f"Single-trunk: {fast_ms:.1f} ms ({fast_ms / base_ms:.1f}x)")
+
+if __name__ == "__main__":
+    evaluate()
@@ -0,0 +1,108 @@
+import argparse
+import sys
+import os
+import time
+import torch
+from transformers import AutoImageProcessor
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.checkpoint import has_adapter_weights
+from core.deploy import build_cpu_artifact, load_cpu_artifact, load_expert, sample_domain_images
+from core.preprocess import TensorPreprocessor, load_image
+
+def latency_ms(fn, x, iterations=20):
+    with torch.no_grad():
+        fn(x)  # Pre-warm (also triggers TorchScript profiling passes)
+        fn(x)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn(x)
+    return (time.perf_counter() - start) / iterations * 1000
+
+def load_batch(paths, preprocessor):
+    return preprocessor([load_image(p) for p in paths])
+
+def export():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/deploy/cpu.yaml", help="Path to YAML config")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    dcfg = cfg['deploy']
+    if dcfg.get('threads'):
+        torch.set_num_threads(dcfg['threads'])
+    os.makedirs(dcfg['output_dir'], exist_ok=True)
+
+    model_id = cfg['model']['base_model']
+    preprocessor = TensorPreprocessor.from_processor(AutoImageProcessor.from_pretrained(model_id))
+
+    # 1. Calibration + held-out evaluation frames, a few per domain
+    calib = sample_domain_images(dcfg['calibration_dir'], dcfg['calibration_per_domain'])
+    held_out = sample_domain_images(dcfg['calibration_dir'], dcfg['eval_per_domain'], offset=dcfg['calibration_per_domain'])
+    calibration = [load_batch(paths, preprocessor) for paths in calib.values() if paths]
+    eval_paths = [p for paths in held_out.values() for p in paths]
+    if not calibration or not eval_paths:
+        print(f"❌ Error: Need images in {dcfg['calibration_dir']}/<domain>/ for calibration and evaluation.")
+        return
+    eval_batch = load_batch(eval_paths, preprocessor)
+    single = eval_batch[:1]
+    print(f"📸 [Deploy] Calibration: { {d: len(p) for d, p in calib.items()} } | Eval: {len(eval_paths)} images")
+
+    rows = []
+    for name, adapter_path in cfg['experts'].items():
+        if adapter_path is not None and not has_adapter_weights(adapter_path):
+            print(f"⚠️ [Deploy] No adapter weights in {adapter_path} (Skipping '{name}')")
+            continue
+        print(f"\n🏗️ [Deploy] Building '{name}'...")
+
+        # 2. Reference: the fp32 eager PEFT model we ship today
+        model = load_expert(model_id, adapter_path)
+        with torch.no_grad():
+            ref_logits = model(eval_batch).logits
+        ref_ms = latency_ms(lambda x: model(x), single)
+
+        # 3. Merge -> channels_last -> (int8) -> frozen TorchScript
+        artifact = build_cpu_artifact(
+            model, single,
+            channels_last=dcfg['channels_last'],
+            quantize=dcfg['quantize'],
+            calibration=calibration,
+            backend=dcfg['quant_backend'],
+        )
+        suffix = "int8" if dcfg['quantize'] else "fp32"
+        path = os.path.join(dcfg['output_dir'], f"{name}_{suffix}.pt")
+        torch.jit.save(artifact, path)
+        artifact = load_cpu_artifact(path)
+
+        # 4. Accuracy delta vs the fp32 expert + latency gain
+        to_input = (lambda x: x.contiguous(memory_format=torch.channels_last)) if dcfg['channels_last'] else (lambda x: x)
+        with torch.no_grad():
+            logits = artifact(to_input(eval_batch))
+        agreement = (logits.argmax(-1) == ref_logits.argmax(-1)).float().mean().item()
+        max_diff = (logits - ref_logits).abs().max().item()
+        art_ms = latency_ms(artifact, to_input(single))
+        size_mb = os.path.getsize(path) / 1024 ** 2
+
+        rows.append((name, suffix, ref_ms, art_ms, agreement, max_diff, size_mb, path))
+        print(f"   ✅ {path} | {ref_ms:.1f} -> {art_ms:.1f} ms | Top-1 agreement: {agreement * 100:.1f}%")
+
+    # 5. Report
+    lines = [
+        "| Expert | Mode | Eager PEFT (ms) | Artifact (ms) | Speedup | Top-1 agreement | Max abs logit diff | Size (MB) |",
+        "| :--- | :--- | ---: | ---: | ---: | ---: | ---: | ---: |",
+    ]
+    for name, suffix, ref_ms, art_ms, agreement, max_diff, size_mb, _ in rows:
+        lines.append(f"| {name} | {suffix} | {ref_ms:.2f} | {art_ms:.2f} | {ref_ms / art_ms:.2f}x | "
+                     f"{agreement * 100:.1f}% | {max_diff:.4f} | {size_mb:.1f} |")
+    report_path = os.path.join(dcfg['output_dir'], "report.md")
+    with open(report_path, "w") as f:
+        f.write(f"# CPU Deployment Report ({suffix if rows else '-'})\n")
+        f.write("Accuracy delta = agreement with the fp32 eager PEFT expert on held-out frames (batch 1 latency).\n\n")
+        f.write("\n".join(lines) + "\n")
+    print("\n" + "\n".join(lines))
+    print(f"\n📑 Report saved to: {report_path}")
+
+if __name__ == "__main__":
+    export()
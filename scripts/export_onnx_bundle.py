@@ -0,0 +1,36 @@
+import argparse
+import sys
+import os
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.bundle import export_bundle
+from core.checkpoint import has_adapter_weights
+
+def export():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/deploy/onnx.yaml", help="Path to YAML config")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    experts = {}
+    for name, path in cfg['experts'].items():
+        if has_adapter_weights(path):
+            experts[name] = path
+        else:
+            print(f"⚠️ [Bundle] No adapter weights in {path} (Skipping '{name}')")
+
+    bcfg = cfg['bundle']
+    manifest = export_bundle(
+        cfg['model']['base_model'],
+        experts,
+        bcfg['output_dir'],
+        opset=bcfg['opset'],
+        tolerance=bcfg['tolerance'],
+    )
+    print(f"\n✅ Bundle ready at {bcfg['output_dir']} | Verified max |diff|: {manifest['verification']}")
+    print(f"   Run it with: DynamicEdgeSystem.from_bundle('{bcfg['output_dir']}')")
+
+if __name__ == "__main__":
+    export()
@@ -1,16 +1,19 @@
+import argparse
+import time
 import cv2
 import torch
 import sys
 import os
 import numpy as np
-from PIL import Image
 from transformers import AutoImageProcessor
 
 # Add root to path so we can import 'core'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.factory import AdapterFactory
+from core.pipeline import FramePipeline
+from core.preprocess import TensorPreprocessor
 
-def live_inference():
+def live_inference(source=0, queue_size=2, drop_policy="drop_oldest"):
     # 1. Load the Phase 2 Engine (Untrained Adapter)
     print("Loading Model...")
     # Use the master template we created earlier
@@ -26,9 +29,10 @@ def live_inference():
 
     # 2. Setup Preprocessor (Must match ResNet-50)
     processor = AutoImageProcessor.from_pretrained(cfg['model']['base_model'])
+    preprocessor = TensorPreprocessor.from_processor(processor, device)
 
-    # 3. Open Webcam (0 is usually the default cam)
-    cap = cv2.VideoCapture(0)
+    # 3. Open Webcam (0 is usually the default cam) or a video file
+    cap = cv2.VideoCapture(source)
     
     if not cap.isOpened():
         print("❌ Error: Could not open webcam.")
@@ -37,30 +41,38 @@ def live_inference():
 
     print("✅ Camera Active. Press 'q' to quit.")
 
-    while True:
+    # 4. Pipeline stages: capture -> preprocess -> inference -> display (each bounded by a queue)
+    def capture():
         ret, frame = cap.read()
-        if not ret: break
+        if not ret:
+            return None
+        return {"frame": frame, "t_capture": time.perf_counter()}
 
-        # 4. Preprocess Frame for ResNet
-        # OpenCV uses BGR, PIL uses RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(rgb_frame)
-        
-        inputs = processor(pil_image, return_tensors="pt").to(device)
+    def preprocess(packet):
+        # OpenCV uses BGR; the channel flip happens inside the tensor ops
+        packet["pixel_values"] = preprocessor(packet["frame"], bgr=True)
+        return packet
 
+    def infer(packet):
         # 5. Run Inference (The Engine at work!)
         with torch.no_grad():
-            logits = model(**inputs).logits
+            logits = model(packet.pop("pixel_values")).logits
         
         # Get prediction (It will be random since we haven't trained!)
         probs = torch.nn.functional.softmax(logits, dim=-1)
         conf, pred_class = torch.max(probs, dim=-1)
+        packet["conf"], packet["pred"] = conf.item(), pred_class.item()
+        return packet
+
+    latencies = []
 
+    def display(packet):
         # 6. Draw on Screen
-        label = f"Class: {pred_class.item()} | Conf: {conf.item():.2f}"
+        frame = packet["frame"]
+        label = f"Class: {packet['pred']} | Conf: {packet['conf']:.2f}"
         
         # Red box if low confidence, Green if high
-        color = (0, 255, 0) if conf.item() > 0.5 else (0, 0, 255)
+        color = (0, 255, 0) if packet["conf"] > 0.5 else (0, 0, 255)
         
         cv2.putText(frame, "PHASE 2 ENGINE ACTIVE", (10, 30), 
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
@@ -68,12 +80,33 @@ def live_inference():
                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
 
         cv2.imshow('Uncertainty Gated LoRA - Live Test', frame)
+        latencies.append((time.perf_counter() - packet["t_capture"]) * 1000)
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+        return not (cv2.waitKey(1) & 0xFF == ord('q'))
 
-    cap.release()
-    cv2.destroyAllWindows()
+    pipeline = FramePipeline(
+        capture,
+        [("preprocess", preprocess), ("inference", infer)],
+        queue_size=queue_size,
+        drop_policy=drop_policy,
+    )
+    try:
+        pipeline.run(display)  # Re-raises a failed stage
+    finally:
+        cap.release()
+        cv2.destroyAllWindows()
+
+    pipeline.report()
+    if latencies:
+        print(f"End-to-end latency: mean {np.mean(latencies):.1f} ms | p95 {np.percentile(latencies, 95):.1f} ms")
 
 if __name__ == "__main__":
-    live_inference()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="0", help="Camera index or video file")
+    parser.add_argument("--queue_size", type=int, default=2, help="Max frames waiting between stages")
+    parser.add_argument("--drop_policy", default="drop_oldest", choices=["drop_oldest", "block"],
+                        help="drop_oldest keeps latency bounded; block never skips a frame")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    live_inference(source, args.queue_size, args.drop_policy)
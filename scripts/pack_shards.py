@@ -0,0 +1,59 @@
+import argparse
+import time
+import sys
+import os
+from torch.utils.data import DataLoader
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.dataset import RobustDataset
+from core.shards import pack_shards
+
+def samples_per_sec(dataset, batch_size, workers, max_batches=20):
+    """Loader throughput only (decode/augment), no model."""
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=workers)
+    start, n = time.perf_counter(), 0
+    for i, (images, _) in enumerate(loader):
+        n += images.shape[0]
+        if i + 1 >= max_batches:
+            break
+    return n / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a RobustDataset folder into pre-decoded uint8 shards")
+    parser.add_argument("--data_dir", type=str, required=True, help="Class folders, e.g. data/bdd_scenes")
+    parser.add_argument("--out_dir", type=str, required=True, help="Shard directory (pass it as --data_dir to training)")
+    parser.add_argument("--recursive", action="store_true", help="Collect images in nested folders too")
+    parser.add_argument("--size", type=int, default=256, help="Stored resolution (training crops 224 from 256)")
+    parser.add_argument("--shard_size", type=int, default=2048, help="Images per shard file")
+    parser.add_argument("--workers", type=int, default=8, help="Decode threads")
+    parser.add_argument("--benchmark", action="store_true", help="Compare loader throughput: JPEG vs shards")
+    parser.add_argument("--batch_size", type=int, default=32)
+    args = parser.parse_args()
+
+    # 1. Index with the same class/label logic as training
+    source = RobustDataset(args.data_dir, is_training=True, recursive=args.recursive)
+    if len(source) == 0:
+        print("❌ Error: No images found. Check your folder structure.")
+        return
+
+    # 2. Decode + resize once
+    start = time.perf_counter()
+    manifest = pack_shards(source.image_paths, source.labels, source.classes, args.out_dir,
+                           size=args.size, shard_size=args.shard_size, workers=args.workers)
+    n = sum(s["count"] for s in manifest["shards"])
+    mb = n * 3 * args.size * args.size / 1024 ** 2
+    print(f"\n✅ Packed {n} images ({mb:.0f} MB) into {len(manifest['shards'])} shard(s) "
+          f"in {time.perf_counter() - start:.1f}s | Skipped: {len(manifest['skipped'])}")
+    print(f"   Train on it with: --data_dir {args.out_dir}")
+
+    # 3. Optional: what the training loader gains
+    if args.benchmark:
+        shards = RobustDataset(args.out_dir, is_training=True)
+        for workers in sorted({0, min(4, os.cpu_count() or 1)}):
+            jpeg = samples_per_sec(source, args.batch_size, workers)
+            packed = samples_per_sec(shards, args.batch_size, workers)
+            print(f"⏱️  [Loader] workers={workers}: JPEG {jpeg:.0f} img/s | Shards {packed:.0f} img/s ({packed / jpeg:.1f}x)")
+
+if __name__ == "__main__":
+    main()
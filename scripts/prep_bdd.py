@@ -0,0 +1,36 @@
+import argparse
+import sys
+import os
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.bdd import LAYOUTS, MODES, prepare
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Sort BDD100K into data/bdd_scenes/<domain>/<scene>/ from any source layout",
+        epilog="flat:   --labels bdd100k_labels_images_train.json --images bdd100k/images/100k/train\n"
+               "hybrid: --labels <official json> --images <DatasetNinja root> (images found recursively)\n"
+               "ninja:  --source <DatasetNinja root> (train|val/{ann,img})",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--layout", choices=LAYOUTS, required=True, help="Source layout (see below)")
+    parser.add_argument("--labels", help="Official label JSON (flat / hybrid); streamed, never fully loaded")
+    parser.add_argument("--images", help="Image folder (flat) or root searched recursively (hybrid)")
+    parser.add_argument("--source", help="DatasetNinja root (ninja)")
+    parser.add_argument("--dest", default="./data/bdd_scenes", help="Output folder")
+    parser.add_argument("--limit", type=int, default=2000, help="Max images per class")
+    parser.add_argument("--mode", choices=MODES, default="copy",
+                        help="copy, or metadata-only hardlink (same filesystem) / symlink / reflink (CoW filesystems)")
+    parser.add_argument("--workers", type=int, default=16, help="File placement threads")
+    args = parser.parse_args()
+
+    required = ["source"] if args.layout == "ninja" else ["labels", "images"]
+    for name in required:
+        path = getattr(args, name)
+        if not path or not os.path.exists(path):
+            print(f"❌ Error: --{name} missing or not found for layout '{args.layout}': {path}")
+            sys.exit(1)
+
+    prepare(args.layout, args.dest, labels=args.labels, images=args.images, source=args.source,
+            limit=args.limit, mode=args.mode, workers=args.workers)
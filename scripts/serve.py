@@ -0,0 +1,49 @@
+import argparse
+import asyncio
+import sys
+import os
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.inference import DynamicEdgeSystem
+from core.server import InferenceServer
+
+def build_system(cfg):
+    mcfg = cfg['model']
+    if mcfg.get('bundle'):
+        system = DynamicEdgeSystem.from_bundle(mcfg['bundle'], entropy_threshold=mcfg['entropy_threshold'])
+    else:
+        system = DynamicEdgeSystem(mcfg['base_model'], entropy_threshold=mcfg['entropy_threshold'])
+        for name, path in cfg['experts'].items():
+            system.load_adapter(path, name)
+    if mcfg.get('exit_gate'):
+        system.load_exit_gate(mcfg['exit_gate'])
+    if mcfg.get('router'):
+        system.load_router(mcfg['router'])
+    if mcfg.get('soft_mixing') is not None:
+        system.enable_soft_mixing(mcfg['soft_mixing'])
+    return system
+
+def serve():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/deploy/serve.yaml", help="Path to YAML config")
+    parser.add_argument("--port", type=int, default=None, help="Override server.port")
+    parser.add_argument("--max_batch_size", type=int, default=None, help="Override server.max_batch_size")
+    parser.add_argument("--max_wait_ms", type=float, default=None, help="Override server.max_wait_ms")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    scfg = cfg['server']
+    for key in ("port", "max_batch_size", "max_wait_ms"):
+        if getattr(args, key) is not None:
+            scfg[key] = getattr(args, key)
+
+    server = InferenceServer(build_system(cfg), scfg['max_batch_size'], scfg['max_wait_ms'])
+    try:
+        asyncio.run(server.serve(scfg['host'], scfg['port'], scfg.get('unix_socket')))
+    except KeyboardInterrupt:
+        print(f"\n🛑 [Server] Stopped | {server.batcher.summary()}")
+
+if __name__ == "__main__":
+    serve()
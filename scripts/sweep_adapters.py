@@ -0,0 +1,236 @@
+import argparse
+import copy
+import itertools
+import json
+import math
+import queue
+import random
+import time
+import torch
+import torch.nn as nn
+import torch.multiprocessing as mp
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import os
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.dataset import RobustDataset
+from core.augment import BatchAugment
+from core.shards import decode_resized
+from core.checkpoint import ADAPTER_FILE, adapter_snapshot, restore_adapter
+
+def expand_space(search):
+    """Trial overrides ({dotted key: value}) for a grid or a random search."""
+    space = search['space']
+    for key in space:
+        if key.split(".")[0] not in ("adapter", "training"):
+            raise ValueError(f"Sweep keys must be in the adapter / training sections, got '{key}'")
+    keys = list(space)
+    if search.get('mode', "grid") == "grid":
+        return [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+
+    rng = random.Random(search.get('seed', 0))
+    trials = search.get('trials', 8)
+    if all(isinstance(v, list) for v in space.values()):
+        # Discrete space: distinct points, without replacement
+        grid = list(itertools.product(*space.values()))
+        return [dict(zip(keys, values)) for values in rng.sample(grid, min(trials, len(grid)))]
+
+    def draw(values):
+        if isinstance(values, list):
+            return rng.choice(values)
+        low, high = values['low'], values['high']
+        if values.get('log'):
+            return math.exp(rng.uniform(math.log(low), math.log(high)))
+        return rng.uniform(low, high)
+    return [{key: draw(values) for key, values in space.items()} for _ in range(trials)]
+
+def trial_config(base, overrides, output_dir):
+    cfg = copy.deepcopy(base)
+    for dotted, value in overrides.items():
+        section, key = dotted.split(".", 1)
+        cfg[section][key] = value
+    cfg['project']['output_dir'] = output_dir
+    return cfg
+
+def load_shared(dataset, workers=8):
+    """Every image decoded once to uint8 (N, 3, size, size) in shared memory (what RobustDataset(raw=True) yields)."""
+    size = dataset.shards.size if dataset.shards is not None else 256
+    images = torch.empty((len(dataset), 3, size, size), dtype=torch.uint8).share_memory_()
+
+    def fill(i):
+        images[i] = dataset.shards[i] if dataset.shards is not None else decode_resized(dataset.image_paths[i], size)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(fill, range(len(dataset))))
+    return images, torch.tensor(dataset.labels).share_memory_()
+
+def run_trial(trial, images, labels, train_idx, val_idx):
+    """One training run on the shared images: BatchAugment batches, early stopping, best epoch kept."""
+    # Adapter init and augmentation draw from the global RNG: seed it per trial, so a result
+    # does not depend on which worker ran the trial or what it ran before
+    torch.manual_seed(trial['seed'])
+    model, cfg = AdapterFactory.create_model(trial['config'])
+    tcfg = cfg['training']
+    device = tcfg['device'] if torch.cuda.is_available() else "cpu"
+    model.to(device)
+    augment = BatchAugment()
+    clean = RobustDataset._shard_transform(is_training=False)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=tcfg['learning_rate'])
+    criterion = nn.CrossEntropyLoss()
+    stop_cfg = tcfg.get('early_stopping') or {}
+    patience, min_delta = stop_cfg.get('patience'), stop_cfg.get('min_delta', 0.0)
+    generator = torch.Generator().manual_seed(trial['seed'])
+
+    best = {"val_acc": -1.0, "val_loss": float("inf"), "best_epoch": 0}
+    best_adapter, bad_epochs, epochs_run, val_loss = None, 0, 0, None
+    start = time.perf_counter()
+    for epoch in range(tcfg['epochs']):
+        epochs_run = epoch + 1
+        model.train()
+        order = train_idx[torch.randperm(len(train_idx), generator=generator)]
+        for rows in order.split(tcfg['batch_size']):
+            optimizer.zero_grad()
+            loss = criterion(model(augment(images[rows].to(device))).logits, labels[rows].to(device))
+            loss.backward()
+            optimizer.step()
+
+        model.eval()
+        with torch.inference_mode():
+            logits = torch.cat([model(clean(images[rows]).to(device)).logits.float().cpu()
+                                for rows in val_idx.split(2 * tcfg['batch_size'])])
+        val_loss = criterion(logits, labels[val_idx]).item()
+        val_acc = (logits.argmax(dim=1) == labels[val_idx]).float().mean().item()
+        if val_loss < best['val_loss'] - min_delta:  # Same rule as train_modular.py
+            best = {"val_acc": val_acc, "val_loss": val_loss, "best_epoch": epoch + 1}
+            best_adapter, bad_epochs = adapter_snapshot(model), 0
+        else:
+            bad_epochs += 1
+            if patience is not None and bad_epochs >= patience:
+                break
+    train_time = time.perf_counter() - start
+    if best_adapter is None:
+        # No epochs, or a val loss that never became finite (e.g. NaN): nothing worth saving
+        return {"error": f"no epoch improved the val loss ({epochs_run} epochs run, last val loss {val_loss})",
+                "epochs_run": epochs_run, "train_time_s": train_time}
+
+    restore_adapter(model, best_adapter)
+    save_path = os.path.join(cfg['project']['output_dir'], "adapter_final")
+    model.save_pretrained(save_path)
+    return {
+        **best,
+        "epochs_run": epochs_run,
+        "train_time_s": train_time,
+        "adapter_mb": os.path.getsize(os.path.join(save_path, ADAPTER_FILE)) / 1024 ** 2,
+        "adapter": save_path,
+    }
+
+def worker(tasks, results, images, labels, train_idx, val_idx, threads):
+    torch.set_num_threads(threads)
+    while (trial := tasks.get()) is not None:
+        try:
+            result = run_trial(trial, images, labels, train_idx, val_idx)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        results.put({"trial": trial['name'], "params": trial['params'], **result})
+
+def collect(results, procs, trials, poll=5.0):
+    """
+    Yields each trial's result as it arrives. Trials still unreported once every
+    worker has exited (a worker killed mid-trial, e.g. by the OOM killer) yield as failed.
+    """
+    pending = {trial['name']: trial for trial in trials}
+    while pending:
+        try:
+            result = results.get(timeout=poll)
+        except queue.Empty:
+            if any(p.is_alive() for p in procs):
+                continue
+            try:
+                result = results.get(timeout=poll)  # Last results flushed by exiting workers
+            except queue.Empty:
+                codes = [p.exitcode for p in procs]
+                for trial in pending.values():
+                    yield {"trial": trial['name'], "params": trial['params'],
+                           "error": f"worker died without a result (exit codes {codes})"}
+                return
+        pending.pop(result['trial'], None)
+        yield result
+
+def sweep():
+    parser = argparse.ArgumentParser(description="Parallel LoRA / DoRA hyperparameter sweep on one shared, pre-decoded dataset")
+    parser.add_argument("--config", type=str, default="configs/sweep/adapters.yaml", help="Path to YAML config")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    base = AdapterFactory.load_config(cfg['base_config'])
+    out_dir = cfg['output_dir']
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 1. Trials: one full config each, kept next to its adapter
+    trials = []
+    for i, params in enumerate(expand_space(cfg['search'])):
+        name = f"trial_{i:03d}"
+        trial_dir = os.path.join(out_dir, name)
+        os.makedirs(trial_dir, exist_ok=True)
+        config_path = os.path.join(trial_dir, "config.yaml")
+        with open(config_path, 'w') as f:
+            yaml.safe_dump(trial_config(base, params, trial_dir), f, sort_keys=False)
+        trials.append({"name": name, "params": params, "config": config_path, "seed": cfg['search'].get('seed', 0) + i})
+    print(f"🧪 [Sweep] {len(trials)} trials ({cfg['search'].get('mode', 'grid')}) over {list(cfg['search']['space'])}")
+
+    # 2. Decode once into shared memory; workers map it instead of re-decoding
+    dataset = RobustDataset(cfg['data_dir'], is_training=False)
+    if len(dataset) == 0:
+        print("❌ Error: No images found. Check your folder structure.")
+        return
+    start = time.perf_counter()
+    images, labels = load_shared(dataset)
+    print(f"📦 [Sweep] {len(dataset)} images decoded once in {time.perf_counter() - start:.1f}s "
+          f"-> {images.numel() / 1024 ** 2:.0f} MB shared")
+    order = torch.randperm(len(dataset), generator=torch.Generator().manual_seed(cfg['search'].get('seed', 0)))
+    n_val = max(1, int(len(dataset) * cfg.get('val_split', 0.2)))
+    val_idx, train_idx = order[:n_val].sort().values, order[n_val:]
+
+    # 3. Worker processes pull trials from a queue
+    n_workers = max(1, min(cfg.get('workers', 1), len(trials)))
+    threads = max(1, (os.cpu_count() or 1) // n_workers)
+    ctx = mp.get_context("spawn")
+    tasks, results = ctx.Queue(), ctx.Queue()
+    for trial in trials:
+        tasks.put(trial)
+    for _ in range(n_workers):
+        tasks.put(None)
+    procs = [ctx.Process(target=worker, args=(tasks, results, images, labels, train_idx, val_idx, threads))
+             for _ in range(n_workers)]
+    for p in procs:
+        p.start()
+    print(f"🚀 [Sweep] {n_workers} workers x {threads} threads")
+
+    # 4. Ranked summary, rewritten as trials finish
+    summary = []
+    summary_path = os.path.join(out_dir, "summary.json")
+    for result in collect(results, procs, trials):
+        summary.append(result)
+        status = result.get('error') or f"val acc {result['val_acc']:.2%} | {result['train_time_s']:.0f}s"
+        print(f"   {'❌' if 'error' in result else '✅'} {result['trial']} {result['params']} -> {status}")
+        summary.sort(key=lambda r: ("error" in r, -r.get('val_acc', 0), r.get('val_loss', 0), r.get('train_time_s', 0)))
+        with open(summary_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+    for p in procs:
+        p.join()
+
+    print(f"\n--- Ranked trials ({summary_path}) ---")
+    print(f"{'rank':>4} | {'trial':>9} | {'val acc':>7} | {'val loss':>8} | {'time':>6} | {'adapter':>8} | params")
+    for rank, r in enumerate(summary, 1):
+        if "error" in r:
+            print(f"{rank:>4} | {r['trial']:>9} | failed: {r['error']}")
+            continue
+        print(f"{rank:>4} | {r['trial']:>9} | {r['val_acc']:>7.2%} | {r['val_loss']:>8.4f} | "
+              f"{r['train_time_s']:>5.0f}s | {r['adapter_mb']:>6.2f}MB | {r['params']}")
+
+if __name__ == "__main__":
+    sweep()
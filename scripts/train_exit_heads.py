@@ -0,0 +1,101 @@
+import argparse
+import math
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+import sys
+import os
+from tqdm import tqdm
+from transformers import ResNetForImageClassification
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.dataset import RobustDataset
+from core.backbone import resnet_stages
+from core.gate.early_exit import EarlyExitGate
+
+def collect_features(model, loader, exits, device):
+    """One frozen pass: pooled activations at every exit stage (nothing past the last exit)."""
+    stages = resnet_stages(model)
+    last = max(i for i, (name, _) in enumerate(stages) if name in exits)
+    feats = {name: [] for name in exits}
+    labels = []
+    with torch.no_grad():
+        for images, lbls in tqdm(loader, desc="Caching stage features"):
+            hidden = images.to(device)
+            for name, stage in stages[:last + 1]:
+                hidden = stage(hidden)
+                if name in exits:
+                    feats[name].append(hidden.mean(dim=(2, 3)).cpu())
+            labels.append(lbls)
+    return {name: torch.cat(f) for name, f in feats.items()}, torch.cat(labels)
+
+def train():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/gate/early_exit.yaml", help="Path to YAML config")
+    parser.add_argument("--data_dir", type=str, default="data/bdd_scenes", help="Domain folders: sunny/ rain/ night/")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    device = cfg['training']['device'] if torch.cuda.is_available() else "cpu"
+    exits = cfg['gate']['exits']
+
+    # 1. Frozen base model (the gate never sees adapters)
+    model = ResNetForImageClassification.from_pretrained(cfg['model']['base_model']).to(device).eval()
+
+    # 2. Domain labels come from the top-level folders
+    dataset = RobustDataset(args.data_dir, is_training=False, recursive=True)
+    if len(dataset) == 0:
+        print("❌ Error: No images found. Check your folder structure.")
+        return
+    loader = DataLoader(dataset, batch_size=cfg['training']['batch_size'], shuffle=False)
+    feats, labels = collect_features(model, loader, exits, device)
+
+    # 3. Seeded train / val split: accuracy + exit rate (what entropy_threshold is chosen on) are held-out numbers
+    tcfg = cfg['training']
+    order = torch.randperm(len(labels), generator=torch.Generator().manual_seed(tcfg.get('seed', 42)))
+    n_val = math.ceil(tcfg.get('val_fraction', 0.2) * len(labels))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+    if n_val == 0:
+        print("⚠️ [Gate] val_fraction 0: accuracy / exit rate below are on the TRAINING rows (optimistic)")
+        val_idx = train_idx
+    print(f"📊 [Gate] {len(train_idx)} train / {n_val} val images")
+
+    # 4. Train one linear probe per exit on the cached features
+    gate = EarlyExitGate(
+        EarlyExitGate.channels_for(model.config, exits),
+        dataset.classes,
+        cfg['gate']['entropy_threshold'],
+    )
+    criterion = nn.CrossEntropyLoss()
+    for name in exits:
+        head = gate.heads[name].fc
+        optimizer = optim.AdamW(head.parameters(), lr=cfg['training']['learning_rate'])
+        head_loader = DataLoader(TensorDataset(feats[name][train_idx], labels[train_idx]),
+                                 batch_size=cfg['training']['batch_size'], shuffle=True)
+        for epoch in range(cfg['training']['epochs']):
+            total_loss = 0
+            for x, y in head_loader:
+                optimizer.zero_grad()
+                loss = criterion(head(x), y)
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item()
+
+        with torch.no_grad():
+            logits = head(feats[name][val_idx])
+            acc = (logits.argmax(-1) == labels[val_idx]).float().mean().item()
+            exit_rate = gate.decide_from_logits(logits)[2].float().mean().item()
+        print(f"   ✅ Exit '{name}' | Loss: {total_loss / len(head_loader):.4f} | Val acc: {acc * 100:.1f}% | "
+              f"Val early-exit rate: {exit_rate * 100:.1f}%")
+
+    # 5. Save
+    os.makedirs(cfg['project']['output_dir'], exist_ok=True)
+    save_path = os.path.join(cfg['project']['output_dir'], "exit_heads.pt")
+    gate.save(save_path)
+    print(f"💾 [Gate] Saved exit heads to: {save_path}")
+
+if __name__ == "__main__":
+    train()
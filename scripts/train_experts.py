@@ -0,0 +1,142 @@
+import argparse
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from contextlib import contextmanager, nullcontext
+from torch.utils.data import DataLoader
+import sys
+import os
+import shutil
+from tqdm import tqdm
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.dataset import RobustDataset, MultiDomainDataset, DomainBatchSampler
+from core.augment import BatchAugment
+from core.backbone import routed_adapters
+
+DEFAULT_CONFIGS = ["configs/adapters/sunny.yaml", "configs/adapters/rain.yaml", "configs/adapters/night.yaml"]
+
+@contextmanager
+def domain_batch_norm(model, segments):
+    """
+    BatchNorm statistics per domain block of the mixed batch, as each expert
+    sees them when trained alone (night frames never normalize sunny ones).
+    """
+    bns = [m for m in model.modules() if isinstance(m, nn.BatchNorm2d)]
+    for bn in bns:
+        bn.forward = lambda x, f=bn.forward: torch.cat([f(x[a:b]) for a, b in segments])
+    try:
+        yield
+    finally:
+        for bn in bns:
+            del bn.forward
+
+def save_adapter(model, name, output_dir):
+    """<output_dir>/adapter_final, same layout as train_modular.py."""
+    save_path = os.path.join(output_dir, "adapter_final")
+    model.save_pretrained(output_dir, selected_adapters=[name])  # PEFT writes <output_dir>/<name>
+    if os.path.exists(save_path):
+        shutil.rmtree(save_path)
+    os.replace(os.path.join(output_dir, name), save_path)
+    card = os.path.join(output_dir, "README.md")
+    if os.path.exists(card):
+        os.replace(card, os.path.join(save_path, "README.md"))
+    return save_path
+
+def train():
+    parser = argparse.ArgumentParser(description="Train every domain expert in one run on a shared backbone")
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS,
+                        help="One adapter YAML per expert; the file name is the domain folder (sunny.yaml -> sunny/)")
+    parser.add_argument("--data_dir", type=str, default="data/bdd_scenes", help="Domain folders (or per-domain shard dirs)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # 1. One backbone, one adapter per config
+    names = [os.path.splitext(os.path.basename(p))[0] for p in args.configs]
+    model, cfgs = AdapterFactory.create_multi_model(dict(zip(names, args.configs)))
+    tcfgs = [cfgs[n]['training'] for n in names]
+    device = tcfgs[0]['device'] if torch.cuda.is_available() else "cpu"
+    model.to(device)
+
+    batch_augment = {t.get('batch_augment', False) for t in tcfgs}
+    if len(batch_augment) > 1:
+        raise ValueError("All experts must agree on training.batch_augment (they share one batch)")
+    batch_augment = batch_augment.pop()
+    if any(t.get('memory_budget_mb') for t in tcfgs):
+        print("⚠️ [Trainer] training.memory_budget_mb is only applied by train_modular.py: "
+              "every step here holds the full batch_size of each expert")
+
+    # 2. One dataset / loader over all domains, mixed batches of per-expert batch sizes
+    datasets = {}
+    for name in names:
+        folder = os.path.join(args.data_dir, name)
+        print(f"📂 [Trainer] {name}: {folder}")
+        datasets[name] = RobustDataset(folder, is_training=True, raw=batch_augment)
+        if len(datasets[name]) == 0:
+            print(f"❌ Error: No images found for '{name}'. Check your folder structure.")
+            return
+    dataset = MultiDomainDataset(datasets)
+    sampler = DomainBatchSampler(dataset, [t['batch_size'] for t in tcfgs], [t['epochs'] for t in tcfgs], args.seed)
+    loader = DataLoader(dataset, batch_sampler=sampler)
+    augment = BatchAugment() if batch_augment else None
+    steps_per_epoch = [sampler.steps(d) // tcfgs[d]['epochs'] for d in range(len(names))]
+    print(f"📊 [Trainer] {len(loader)} mixed steps | Steps per epoch: {dict(zip(names, steps_per_epoch))}")
+
+    # 3. Each expert keeps its own learning rate
+    groups = [
+        {"params": [p for n, p in model.named_parameters() if f".{name}." in n], "lr": t['learning_rate']}
+        for name, t in zip(names, tcfgs)
+    ]
+    optimizer = optim.AdamW(groups)
+    criterion = nn.CrossEntropyLoss()
+
+    # 4. Training Loop: each row goes through its own domain's adapter
+    model.train()
+    print("🚀 [Trainer] Starting Multi-Expert Training Loop...")
+    steps = [0] * len(names)
+    epoch_loss = [0.0] * len(names)
+    progress_bar = tqdm(loader, desc="Experts")
+
+    for images, labels, domains in progress_bar:
+        images, labels, domains = images.to(device), labels.to(device), domains.to(device)
+        if augment is not None:
+            images = augment(images)
+
+        # Rows arrive grouped by domain
+        present = torch.unique_consecutive(domains).tolist()
+        counts = torch.bincount(domains, minlength=len(names)).tolist()
+        bounds, start = [], 0
+        for d in present:
+            bounds.append((start, start + counts[d]))
+            start += counts[d]
+        routing = nn.functional.one_hot(domains, len(names)).float()
+        norm = domain_batch_norm(model, bounds) if len(bounds) > 1 else nullcontext()
+
+        optimizer.zero_grad()
+        with routed_adapters(model, names, routing, trainable=True), norm:
+            outputs = model(images).logits
+        # Sum of per-expert mean losses: each adapter gets exactly its own gradient
+        losses = [criterion(outputs[a:b], labels[a:b]) for a, b in bounds]
+        sum(losses).backward()
+        optimizer.step()
+
+        for d, loss in zip(present, losses):
+            steps[d] += 1
+            epoch_loss[d] += loss.item()
+            if steps[d] % steps_per_epoch[d] == 0:
+                epoch = steps[d] // steps_per_epoch[d]
+                print(f"   ✅ {names[d]} Epoch {epoch}/{tcfgs[d]['epochs']} Complete | "
+                      f"Avg Loss: {epoch_loss[d] / steps_per_epoch[d]:.4f}")
+                epoch_loss[d] = 0.0
+                if epoch == tcfgs[d]['epochs']:
+                    # 5. Done: save this expert now, the others keep training
+                    save_path = save_adapter(model, names[d], cfgs[names[d]]['project']['output_dir'])
+                    print(f"💾 [Trainer] Saved '{names[d]}' to: {save_path}")
+        progress_bar.set_postfix({names[d]: f"{l.item():.3f}" for d, l in zip(present, losses)})
+
+    print("✨ Training Complete.")
+
+if __name__ == "__main__":
+    train()
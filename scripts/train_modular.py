@@ -2,74 +2,279 @@ import argparse
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader
+from contextlib import nullcontext
+from torch.utils.data import DataLoader, Subset, default_collate
 import sys
 import os
+import time
 from tqdm import tqdm
 
 # Add root to path so we can import 'core'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.factory import AdapterFactory
 from core.dataset import RobustDataset
+from core.augment import BatchAugment
+from core.backbone import first_adapted_stage, resnet_head, resnet_stages
+from core.cache import CachedActivations, cache_activations
+from core.checkpoint import AsyncCheckpointer, adapter_snapshot, load_checkpoint, restore_adapter
+from core.memory import autocast, checkpointed, peak_memory_mb, plan_micro_batch, reset_peak_memory
+from core import distributed
+
+def activation_cut(model, cache_cfg):
+    """Stage index to cache activations at (None = train end to end)."""
+    if not cache_cfg or not cache_cfg.get('enabled'):
+        return None
+    names = [name for name, _ in resnet_stages(model)]
+    adapted = first_adapted_stage(model)
+    cut = names.index(cache_cfg['cut']) if cache_cfg.get('cut') else adapted
+    if cut > adapted:
+        raise ValueError(f"activation_cache.cut '{names[cut]}' is after the first adapted stage '{names[adapted]}'")
+    if cut == 0:
+        print("⚠️ [Trainer] Adapters start at the stem: no frozen prefix to cache, training end to end")
+        return None
+    print(f"🧊 [Trainer] Activation cache at '{names[cut]}': frozen {names[:cut]} run once")
+    return cut
+
+@torch.inference_mode()
+def evaluate(forward, loader, device, bf16=False):
+    """Held-out (loss, accuracy) in large no-grad batches, BatchNorm on running stats; summed over ranks."""
+    totals = torch.zeros(3, dtype=torch.float64)
+    for images, labels in loader:
+        images, labels = images.to(device), labels.to(device)
+        with autocast(device, bf16):
+            logits = forward(images).float()
+        totals += torch.tensor([
+            nn.functional.cross_entropy(logits, labels, reduction="sum").item(),
+            (logits.argmax(dim=1) == labels).sum().item(),
+            len(labels),
+        ], dtype=torch.float64)
+    if torch.distributed.is_initialized():
+        torch.distributed.all_reduce(totals)
+    return (totals[0] / totals[2]).item(), (totals[1] / totals[2]).item()
 
 def train():
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", type=str, required=True, help="Path to YAML config")
-    parser.add_argument("--data_dir", type=str, required=True, help="Path to training data folder")
+    parser.add_argument("--data_dir", type=str, required=True, help="Path to training data folder (or a shard dir from scripts/pack_shards.py)")
+    parser.add_argument("--distributed", action="store_true",
+                        help="CPU data parallel over gloo; launch with torchrun (see core/distributed.py)")
+    parser.add_argument("--seed", type=int, default=42, help="Shuffling / validation split seed (shared by all ranks)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the latest checkpoint (adapter, optimizer, epoch, early-stopping state)")
     args = parser.parse_args()
 
     # 1. Build Model via Factory
+    rank, world_size = distributed.init_distributed() if args.distributed else (0, 1)
     model, cfg = AdapterFactory.create_model(args.config)
-    device = cfg['training']['device'] if torch.cuda.is_available() else "cpu"
+    device = "cpu" if args.distributed else (cfg['training']['device'] if torch.cuda.is_available() else "cpu")
     model.to(device)
 
     # 2. Prepare Data
     print(f"📂 [Trainer] Loading data from: {args.data_dir}")
-    train_dataset = RobustDataset(args.data_dir, is_training=True)
+    stages = resnet_stages(model)
+    cut = activation_cut(model, cfg['training'].get('activation_cache'))
+    if cut:
+        # Frozen stages run once; epochs only see the adapted tail (deterministic transforms + exact flips)
+        cache_cfg = cfg['training']['activation_cache']
+        if args.distributed and not distributed.is_main():
+            torch.distributed.barrier()  # Rank 0 builds the cache, the others map it
+        train_dataset = cache_activations(
+            model, cut, RobustDataset(args.data_dir, is_training=False),
+            root=cache_cfg.get('dir', "./cache/activations"),
+            batch_size=cfg['training']['batch_size'],
+            device=device,
+            fp16=cache_cfg.get('fp16', True),
+            flip=cache_cfg.get('flip', True),
+        )
+        if args.distributed and distributed.is_main():
+            torch.distributed.barrier()
+        augment = None
+    else:
+        # batch_augment: workers only decode (or slice shards); the policy runs per batch on-device
+        batch_augment = cfg['training'].get('batch_augment', False)
+        train_dataset = RobustDataset(args.data_dir, is_training=True, raw=batch_augment)
+        augment = BatchAugment() if batch_augment else None
     
     if len(train_dataset) == 0:
         print("❌ Error: No images found. Check your folder structure.")
         return
 
-    train_loader = DataLoader(
-        train_dataset, 
-        batch_size=cfg['training']['batch_size'], 
-        shuffle=True
-    )
+    # Held-out split (seeded, identical on every rank), seen through clean transforms only
+    n_val = int(len(train_dataset) * cfg['training'].get('val_split', 0))
+    val_dataset = None
+    if n_val:
+        order = torch.randperm(len(train_dataset), generator=torch.Generator().manual_seed(args.seed)).tolist()
+        if cut:
+            clean = CachedActivations(train_dataset.dir, random_flip=False)
+        else:
+            clean = RobustDataset(args.data_dir, is_training=False)
+        val_dataset = Subset(clean, order[:n_val][rank::world_size])
+        train_dataset = Subset(train_dataset, order[n_val:])
+        print(f"🧪 [Trainer] Validation split: {n_val} held out | {len(train_dataset)} for training")
+
+    if args.distributed:
+        # Same global batches as one process, each rank gets a slice (possibly empty on the last one)
+        sampler = distributed.ShardedBatchSampler(
+            len(train_dataset), cfg['training']['batch_size'], rank, world_size, args.seed
+        )
+        train_loader = DataLoader(
+            train_dataset,
+            batch_sampler=sampler,
+            collate_fn=lambda batch: default_collate(batch) if batch else None
+        )
+        empty = [t[:0] for t in default_collate([train_dataset[0]])]
+        # Sum over the slice / global batch size: the all-reduced gradient is the global mean's
+        criterion = nn.CrossEntropyLoss(reduction="sum")
+        print(f"🌐 [Trainer] Rank {rank}/{world_size} | Global batch: {cfg['training']['batch_size']} | "
+              f"Threads: {torch.get_num_threads()}")
+    else:
+        train_loader = DataLoader(
+            train_dataset, 
+            batch_size=cfg['training']['batch_size'], 
+            shuffle=True
+        )
+        criterion = nn.CrossEntropyLoss()
     
     print(f"📊 [Trainer] Batches per epoch: {len(train_loader)}")
     optimizer = optim.AdamW(model.parameters(), lr=cfg['training']['learning_rate'])
-    criterion = nn.CrossEntropyLoss()
 
+    def forward(images):
+        if cut:
+            hidden = images
+            for _, stage in stages[cut:]:
+                hidden = stage(hidden)
+            return resnet_head(model, hidden)
+        return model(images).logits
+
+    # 3. Memory Budget: batch_size is the effective batch, reached by accumulating micro-batches
+    micro_batch, bf16, checkpointing = cfg['training']['batch_size'], False, False
+    budget = cfg['training'].get('memory_budget_mb')
+    trainable_stages = stages[max(cut or 0, first_adapted_stage(model)):]
+    if budget:
+        if args.distributed:
+            raise ValueError("training.memory_budget_mb is not supported with --distributed (BatchNorm syncs per step)")
+        sample = train_dataset[0][0]
+        if augment is not None:
+            sample = augment(sample.unsqueeze(0))[0]
+        plan = plan_micro_batch(
+            model, forward, sample, cfg['training']['batch_size'], budget, trainable_stages, device
+        )
+        bf16, checkpointing = plan['bf16'], plan['checkpointing']
+        # Same number of steps, evenly sized chunks (16 at a limit of 15 -> 8 + 8, not 15 + 1)
+        accumulation = -(-cfg['training']['batch_size'] // plan['micro_batch'])
+        micro_batch = -(-cfg['training']['batch_size'] // accumulation)
+        print(f"🧮 [Trainer] Budget {budget} MB -> micro-batch {micro_batch} x {accumulation} accumulation step(s) | "
+              f"bf16: {bf16} | checkpointing: {checkpointing} | measured {plan['measured_mb']:.0f} MB")
+    ckpt = (lambda: checkpointed(trainable_stages)) if checkpointing else nullcontext
+    if val_dataset is not None:
+        val_loader = DataLoader(val_dataset, batch_size=cfg['training'].get('val_batch_size') or 2 * micro_batch)
+
+    # Early stopping on validation loss; adapter + optimizer checkpoints written in the background
+    stop_cfg = cfg['training'].get('early_stopping') or {}
+    patience, min_delta = stop_cfg.get('patience'), stop_cfg.get('min_delta', 0.0)
+    checkpoint_dir = cfg['training'].get('checkpoint_dir') or os.path.join(cfg['project']['output_dir'], "checkpoints")
+    state = {"epoch": 0, "best_val_loss": float("inf"), "best_epoch": 0, "bad_epochs": 0}
+    best_adapter = None
+    if args.resume:
+        restored = load_checkpoint(checkpoint_dir, model, optimizer)
+        if restored:
+            best_adapter = restored.pop("best_adapter", None)
+            state.update(restored)
+            print(f"⏯️ [Trainer] Resuming after epoch {state['epoch']} from {checkpoint_dir}")
+        else:
+            print(f"⚠️ [Trainer] No checkpoint in {checkpoint_dir}, starting fresh")
+    last_epoch = cfg['training']['epochs']
+    if patience is not None and state['bad_epochs'] >= patience:
+        last_epoch = state['epoch']  # Resumed a run that had already stopped early
+    checkpointer = AsyncCheckpointer(checkpoint_dir) if distributed.is_main() else None
 
     # 4. Training Loop
     model.train()
     print("🚀 [Trainer] Starting Training Loop...")
     
-    for epoch in range(cfg['training']['epochs']):
+    # Frozen BatchNorm layers still normalize with batch stats in train mode: sync them over the global batch
+    norm = (lambda: distributed.synced_batch_norm(model)) if args.distributed else nullcontext
+    for epoch in range(state['epoch'], last_epoch):
         total_loss = 0
-        progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}/{cfg['training']['epochs']}")
+        if args.distributed:
+            sampler.set_epoch(epoch)
+        progress_bar = tqdm(train_loader, desc=f"Epoch {epoch+1}/{cfg['training']['epochs']}",
+                            disable=not distributed.is_main())
+        reset_peak_memory(device)
+        start = time.perf_counter()
         
-        for images, labels in progress_bar:
+        for step, batch in enumerate(progress_bar):
+            images, labels = batch if batch is not None else empty
             images, labels = images.to(device), labels.to(device)
+            if augment is not None:
+                images = augment(images)
             
             optimizer.zero_grad()
-            outputs = model(images).logits
-            loss = criterion(outputs, labels)
-            loss.backward()
+            # One chunk unless a memory budget split the batch (BatchNorm then sees micro-batch stats)
+            chunks = zip(images.split(micro_batch), labels.split(micro_batch)) if len(labels) else [(images, labels)]
+            loss = 0
+            for x, y in chunks:
+                with norm(), ckpt(), autocast(device, bf16):
+                    outputs = forward(x)
+                micro_loss = criterion(outputs.float(), y)
+                if args.distributed:
+                    micro_loss = micro_loss / sampler.global_size(step)
+                else:
+                    micro_loss = micro_loss * (len(y) / len(labels))
+                micro_loss.backward()
+                loss = loss + micro_loss.detach()
+            if args.distributed:
+                # Only the adapter gradients (+ the loss for logging) go over the wire
+                loss = distributed.all_reduce_adapter_grads(model, loss)
             optimizer.step()
             
             total_loss += loss.item()
             progress_bar.set_postfix(loss=loss.item())
             
         avg_loss = total_loss / len(train_loader)
-        print(f"   ✅ Epoch {epoch+1} Complete | Avg Loss: {avg_loss:.4f}")
+        throughput = len(train_dataset) / (time.perf_counter() - start)
+        if distributed.is_main():
+            print(f"   ✅ Epoch {epoch+1} Complete | Avg Loss: {avg_loss:.4f} | "
+                  f"{throughput:.1f} samples/s | Peak mem: {peak_memory_mb(device):.0f} MB")
+
+        state['epoch'] = epoch + 1
+        stop = False
+        if val_dataset is not None:
+            model.eval()
+            val_loss, val_acc = evaluate(forward, val_loader, device, bf16)
+            model.train()
+            if val_loss < state['best_val_loss'] - min_delta:
+                state.update(best_val_loss=val_loss, best_epoch=epoch + 1, bad_epochs=0)
+                best_adapter = adapter_snapshot(model)
+                if checkpointer:
+                    checkpointer.save_best(best_adapter, model)
+            else:
+                state['bad_epochs'] += 1
+            stop = patience is not None and state['bad_epochs'] >= patience
+            if distributed.is_main():
+                print(f"   🧪 Val Loss: {val_loss:.4f} | Val Acc: {val_acc:.2%} | "
+                      f"Best: epoch {state['best_epoch']} ({state['best_val_loss']:.4f})")
+        if checkpointer:
+            checkpointer.save(model, optimizer, state)
+        if stop:
+            if distributed.is_main():
+                print(f"⏹️ [Trainer] No val improvement for {patience} epoch(s): stopping after epoch {epoch+1}")
+            break
+
+    if checkpointer:
+        checkpointer.close()
+    if best_adapter is not None:
+        restore_adapter(model, best_adapter)
+        if distributed.is_main():
+            print(f"🏆 [Trainer] Keeping epoch {state['best_epoch']} (val loss {state['best_val_loss']:.4f})")
 
-    # 5. Save Adapter
-    save_path = os.path.join(cfg['project']['output_dir'], "adapter_final")
-    print(f"💾 [Trainer] Saving adapter to: {save_path}")
-    model.save_pretrained(save_path)
-    print("✨ Training Complete.")
+    # 5. Save Adapter (ranks hold identical weights: rank 0 writes)
+    if distributed.is_main():
+        save_path = os.path.join(cfg['project']['output_dir'], "adapter_final")
+        print(f"💾 [Trainer] Saving adapter to: {save_path}")
+        model.save_pretrained(save_path)
+        print("✨ Training Complete.")
+    distributed.cleanup()
 
 if __name__ == "__main__":
     train()
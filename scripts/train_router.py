@@ -0,0 +1,129 @@
+import argparse
+import math
+import time
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+import sys
+import os
+from transformers import AutoImageProcessor, ResNetForImageClassification
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.dataset import RobustDataset
+from core.gate.router import DomainRouter
+from core.preprocess import TensorPreprocessor, load_image
+
+def collect_features(router, preprocessor, paths, batch_size):
+    """One cheap pass: image statistics of every image (the router trains on these)."""
+    feats = []
+    with torch.no_grad():
+        for i in range(0, len(paths), batch_size):
+            pixel_values = preprocessor([load_image(p) for p in paths[i:i + batch_size]])
+            feats.append(router.features(pixel_values).cpu())
+    return torch.cat(feats)
+
+def evaluate(router, feats, labels):
+    with torch.no_grad():
+        probs = torch.softmax(router.classify(feats), dim=-1)
+    confidence, pred = probs.max(dim=-1)
+    confident = confidence >= router.min_confidence
+    correct = pred == labels
+
+    print(f"\n📊 [Router] Val accuracy: {correct.float().mean().item() * 100:.1f}% on {len(labels)} images")
+    print(f"   Routed without base pass (conf >= {router.min_confidence}): {confident.float().mean().item() * 100:.1f}% "
+          f"| Accuracy on those: {correct[confident].float().mean().item() * 100 if confident.any() else 0:.1f}%")
+    header = " ".join(f"{d[:8]:>8}" for d in router.domains)
+    print(f"   {'true/pred':<12} {header}")
+    for t, domain in enumerate(router.domains):
+        counts = torch.bincount(pred[labels == t], minlength=len(router.domains)).tolist()
+        print(f"   {domain:<12} " + " ".join(f"{c:>8}" for c in counts))
+
+def latency(router, model_id, preprocessor, path, device, iterations=20):
+    """Router vs one base ResNet forward, batch 1."""
+    x = preprocessor(load_image(path)).to(device)
+    model = ResNetForImageClassification.from_pretrained(model_id).to(device).eval()
+    timings = {}
+    for label, fn in [("Router", router), ("Base forward", lambda t: model(t).logits)]:
+        with torch.no_grad():
+            fn(x)  # Pre-warm
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn(x)
+        timings[label] = (time.perf_counter() - start) / iterations * 1000
+    print(f"\n⏱️  [Router] {timings['Router']:.2f} ms vs base forward {timings['Base forward']:.2f} ms "
+          f"({timings['Base forward'] / timings['Router']:.0f}x cheaper)")
+
+def train():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/gate/router.yaml", help="Path to YAML config")
+    parser.add_argument("--data_dir", type=str, default="data/bdd_scenes", help="Domain folders: sunny/ rain/ night/")
+    parser.add_argument("--eval_only", action="store_true", help="Evaluate the saved router on data_dir")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    tcfg, rcfg = cfg['training'], cfg['router']
+    device = tcfg['device'] if torch.cuda.is_available() else "cpu"
+    save_path = os.path.join(cfg['project']['output_dir'], "router.pt")
+
+    # 1. Domain labels come from the top-level folders (scripts/prep_bdd.py layout)
+    dataset = RobustDataset(args.data_dir, is_training=False, recursive=True)
+    if len(dataset) == 0:
+        print("❌ Error: No images found. Check your folder structure.")
+        return
+    processor = AutoImageProcessor.from_pretrained(cfg['model']['base_model'])
+    preprocessor = TensorPreprocessor.from_processor(processor)
+    labels = torch.tensor(dataset.labels)
+
+    if args.eval_only:
+        router = DomainRouter.load(save_path)
+        feats = collect_features(router, preprocessor, dataset.image_paths, tcfg['batch_size'])
+        evaluate(router, feats, labels)
+        latency(router, cfg['model']['base_model'], preprocessor, dataset.image_paths[0], "cpu")
+        return
+
+    router = DomainRouter(
+        dataset.classes,
+        hidden=rcfg['hidden'],
+        min_confidence=rcfg['min_confidence'],
+        bins=rcfg['bins'],
+        mean=processor.image_mean,
+        std=processor.image_std,
+    )
+    feats = collect_features(router, preprocessor, dataset.image_paths, tcfg['batch_size'])
+
+    # 2. Seeded train / val split
+    order = torch.randperm(len(labels), generator=torch.Generator().manual_seed(tcfg['seed']))
+    n_val = math.ceil(tcfg['val_fraction'] * len(labels))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+
+    # 3. Train the MLP on the cached statistics
+    router.fit_normalizer(feats[train_idx])
+    router.to(device).train()
+    optimizer = optim.AdamW(router.mlp.parameters(), lr=tcfg['learning_rate'])
+    criterion = nn.CrossEntropyLoss()
+    loader = DataLoader(TensorDataset(feats[train_idx], labels[train_idx]), batch_size=tcfg['batch_size'], shuffle=True)
+    for epoch in range(tcfg['epochs']):
+        total_loss = 0
+        for x, y in loader:
+            x, y = x.to(device), y.to(device)
+            optimizer.zero_grad()
+            loss = criterion(router.classify(x), y)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item()
+    print(f"   ✅ Router trained | Final loss: {total_loss / len(loader):.4f}")
+
+    # 4. Evaluate + save
+    router.cpu().eval()
+    evaluate(router, feats[val_idx], labels[val_idx])
+    latency(router, cfg['model']['base_model'], preprocessor, dataset.image_paths[0], "cpu")
+    os.makedirs(cfg['project']['output_dir'], exist_ok=True)
+    router.save(save_path)
+    print(f"\n💾 Router saved to: {save_path}")
+    print(f"   Use it with: system.load_router('{save_path}')")
+
+if __name__ == "__main__":
+    train()
@@ -0,0 +1,126 @@
+import argparse
+import math
+import sys
+import os
+import torch
+
+# Add root to path so we can import 'core'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from core.factory import AdapterFactory
+from core.cache import FeatureCache, read_through_engine
+from core.dataset import RobustDataset
+from core.inference import DynamicEdgeSystem
+from core.constants import BASE
+from core.gate.scores import uncertainty_scores
+from core.gate.tuning import (
+    candidate_thresholds, pareto_front, pick_threshold, stage_costs, sweep_thresholds, tail_fraction,
+)
+from core.preprocess import load_image
+
+def validation_split(image_dir, fraction, seed):
+    """Seeded per-domain subset: (paths, labels, domain index) + domain names + class names."""
+    paths, labels, domains = [], [], []
+    names = sorted(d for d in os.listdir(image_dir) if os.path.isdir(os.path.join(image_dir, d)))
+    generator = torch.Generator().manual_seed(seed)
+    classes = None
+    for d, domain in enumerate(names):
+        ds = RobustDataset(os.path.join(image_dir, domain), is_training=False, recursive=True)
+        if classes is not None and ds.classes != classes:
+            raise ValueError(f"Domain '{domain}' has classes {ds.classes}, expected {classes} (labels would not line up)")
+        classes = ds.classes
+        keep = torch.randperm(len(ds), generator=generator)[:math.ceil(fraction * len(ds))].tolist()
+        paths += [ds.image_paths[i] for i in sorted(keep)]
+        labels += [ds.labels[i] for i in sorted(keep)]
+        domains += [d] * len(keep)
+    return paths, torch.tensor(labels), torch.tensor(domains), names, classes
+
+def report(label, thresholds, accuracy, compute, rate, chosen):
+    print(f"\n--- Pareto front: {label} ---")
+    print(f"{'threshold':>10} | {'accuracy':>8} | {'compute':>7} | {'expert calls':>12}")
+    for i in pareto_front(accuracy, compute):
+        mark = "  <- chosen" if i == chosen else ""
+        print(f"{thresholds[i].item():>10.4f} | {accuracy[i].item():>8.2%} | "
+              f"{compute[i].item():>6.2f}x | {rate[i].item():>12.1%}{mark}")
+
+def tune():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", type=str, default="configs/gate/thresholds.yaml", help="Path to YAML config")
+    args = parser.parse_args()
+
+    cfg = AdapterFactory.load_config(args.config)
+    tcfg = cfg['tuning']
+    score = cfg['gate']['score']
+
+    # 1. Engine + labeled validation split
+    system = DynamicEdgeSystem(cfg['model']['base_model'])
+    for name, path in cfg['experts'].items():
+        system.load_adapter(path, name)
+    if not system.experts:
+        print("❌ [Tuner] No experts loaded: nothing to gate.")
+        return
+    paths, labels, domains, domain_names, classes = validation_split(tcfg['image_dir'], tcfg['val_fraction'], tcfg['seed'])
+
+    # Accuracy compares argmax indices with class-folder indices: the head must be trained on exactly these classes
+    # (the ImageNet head of a stock backbone is not, and the adapters carry no classifier of their own)
+    if len(system.id2label) != len(classes):
+        raise ValueError(
+            f"{cfg['model']['base_model']} has a {len(system.id2label)}-way head but {tcfg['image_dir']} has "
+            f"{len(classes)} classes {classes}: set model.base_model to a checkpoint fine-tuned on these classes"
+        )
+
+    # 2. Logits: at most one network pass per image, cached for every later sweep
+    print(f"🚀 [Tuner] Base + {len(system.experts)} experts on {len(paths)} validation images")
+    outputs = read_through_engine(
+        system, FeatureCache(tcfg['cache_dir']), cfg['model']['base_model'], cfg['experts'], paths, tcfg['batch_size'],
+    )
+    base_logits = outputs[BASE][0]
+    expert_logits = torch.stack([outputs[name][0] for name in system.experts], dim=1)
+
+    # 3. Per-image outcomes (engine rule: the lowest-entropy expert answers)
+    scores = uncertainty_scores(base_logits)[score]
+    base_correct = base_logits.argmax(dim=-1) == labels
+    best = uncertainty_scores(expert_logits)["entropy"].argmin(dim=-1)
+    picked = expert_logits[torch.arange(len(best)), best]
+    expert_correct = picked.argmax(dim=-1) == labels
+
+    backend = system.backend
+    costs = stage_costs(backend, system.preprocessor(load_image(paths[0])))
+    tail = tail_fraction(costs, backend.stage_names, backend.cut)
+    print(f"⚖️  [Tuner] Expert tail = {tail:.1%} of a base pass x {len(system.experts)} experts")
+
+    # 4. Sweep: every threshold at once, globally and per domain
+    def sweep(mask):
+        thresholds = candidate_thresholds(scores[mask])
+        accuracy, compute, rate = sweep_thresholds(
+            scores[mask], base_correct[mask], expert_correct[mask], thresholds,
+            score, len(system.experts), tail,
+        )
+        chosen = pick_threshold(accuracy, compute, tcfg['compute_budget'])
+        return thresholds, accuracy, compute, rate, chosen
+
+    thresholds, accuracy, compute, rate, chosen = sweep(torch.ones_like(labels, dtype=torch.bool))
+    report("all domains", thresholds, accuracy, compute, rate, chosen)
+    global_threshold = round(thresholds[chosen].item(), 4)
+
+    per_domain = {}
+    for d, domain in enumerate(domain_names):
+        mask = domains == d
+        if not mask.any():
+            continue
+        t, a, c, r, i = sweep(mask)
+        report(domain, t, a, c, r, i)
+        per_domain[domain] = round(t[i].item(), 4)
+
+    # 5. Write back
+    AdapterFactory.update_config(args.config, {"gate.threshold": global_threshold, "gate.per_domain": per_domain})
+    print(f"\n✅ [Tuner] {score} threshold {global_threshold} | Per domain: {per_domain} -> {args.config}")
+    if score != "entropy":
+        print("   (Other configs take entropy thresholds: write_to skipped)")
+        return
+    for target in tcfg.get('write_to') or []:
+        path, key = target.rsplit(":", 1)
+        AdapterFactory.update_config(path, {key: global_threshold})
+        print(f"   {key} -> {path}")
+
+if __name__ == "__main__":
+    tune()